@@ -272,7 +272,7 @@ def teacher_dashboard(request):
             for attempt in recent_attempts:
                 # Check if this attempt has any answers that need manual grading
                 pending_grading = QuizAnswer.objects.filter(
-                    attempt=attempt
+                    quiz_attempt=attempt
                 ).filter(
                     Q(text_answer__isnull=False) | 
                     Q(file_answer__isnull=False) | 
@@ -494,8 +494,8 @@ def calculate_quiz_stats(student_ids, courses):
     """
     Helper function to calculate quiz statistics for the teacher dashboard
     """
-    from django.db.models import Avg, Count, Q
-    from quizzes.models import Quiz, QuizAttempt, Question
+    from django.db.models import Avg, Count, Q, Sum
+    from quizzes.models import Quiz, QuizAttempt, Question, QuestionStats
     
     # Initialize stats dictionaries
     quiz_stats = {
@@ -534,7 +534,7 @@ def calculate_quiz_stats(student_ids, courses):
     course_quizzes = Quiz.objects.filter(course__in=courses)
     
     # Then get questions for these quizzes
-    questions = Question.objects.filter(quiz__in=course_quizzes)
+    questions = Question.objects.filter(quizzes__in=course_quizzes).distinct()
     
     if questions.exists():
         question_stats['total'] = questions.count()
@@ -542,6 +542,17 @@ def calculate_quiz_stats(student_ids, courses):
             question_type__in=['multiple_choice', 'true_false', 'dropdown']
         ).count()
         question_stats['other'] = question_stats['total'] - question_stats['multiple_choice']
+        
+        # Answer totals come from the precomputed per-question stats rather than every QuizAnswer
+        answer_totals = QuestionStats.objects.filter(quiz__in=course_quizzes).aggregate(
+            answers=Sum('answer_count'),
+            correct=Sum('correct_count'),
+            time_taken=Sum('time_taken_sum'),
+        )
+        answers = answer_totals['answers'] or 0
+        question_stats['answers'] = answers
+        question_stats['correct_percentage'] = round(answer_totals['correct'] / answers * 100, 1) if answers else 0
+        question_stats['avg_time_taken'] = round(answer_totals['time_taken'] / answers, 1) if answers else 0
     
     return quiz_stats, question_stats
 
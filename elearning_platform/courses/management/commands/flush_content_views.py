@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.view_buffer import flush_content_views
+
+
+class Command(BaseCommand):
+    help = ("Write the buffered content views to the database. Requests flush the buffer as they go; "
+            "run this on a schedule with a cache shared between processes so views are written when traffic is quiet")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, flushing every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            written = flush_content_views()
+            self.stdout.write(f"Flushed {written} content views.")
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,75 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from courses.models import (
+    Assignment, AssignmentSubmission, CourseMaterial, CourseProgress, calculate_progress_percentage
+)
+from quizzes.models import Quiz, QuizAttempt
+
+
+class Command(BaseCommand):
+    help = "Recount the completed and total items behind every student's course progress and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help='Only process progress in this course ID')
+        parser.add_argument('--verify', action='store_true',
+                            help='Report progress rows that have drifted without fixing them')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        progresses = CourseProgress.objects.order_by('id')
+        if options['course']:
+            progresses = progresses.filter(course_id=options['course'])
+
+        # Count everything with a few grouped queries rather than per row
+        totals = Counter()
+        for model in (CourseMaterial, Assignment, Quiz):
+            totals.update(dict(model.objects.values_list('course_id').annotate(count=Count('id')).order_by()))
+
+        completed = Counter()
+        completed.update({
+            (student_id, course_id): count
+            for student_id, course_id, count in AssignmentSubmission.objects.filter(status='graded').values_list(
+                'student_id', 'assignment__course_id'
+            ).annotate(count=Count('id')).order_by()
+        })
+        completed.update({
+            (student_id, course_id): count
+            for student_id, course_id, count in QuizAttempt.objects.filter(completed=True).values_list(
+                'student_id', 'quiz__course_id'
+            ).annotate(count=Count('id')).order_by()
+        })
+
+        checked = 0
+        drifted = []
+        now = timezone.now()
+
+        for progress in progresses.iterator(chunk_size=options['batch_size']):
+            checked += 1
+            completed_items = completed[(progress.user_id, progress.course_id)]
+            total_items = totals[progress.course_id]
+            percentage = calculate_progress_percentage(completed_items, total_items)
+            expected = (completed_items, total_items, percentage)
+            if expected == (progress.completed_items, progress.total_items, progress.progress_percentage):
+                continue
+
+            progress.completed_items, progress.total_items, progress.progress_percentage = expected
+            if percentage == 100 and progress.status != 'completed':
+                progress.status = 'completed'
+                progress.completed_at = now
+            drifted.append(progress)
+
+        if options['verify']:
+            for progress in drifted:
+                self.stdout.write(f"Progress {progress.id}: counts out of date")
+            self.stdout.write(f"Checked {checked} progress rows, {len(drifted)} out of date.")
+            return
+
+        CourseProgress.objects.bulk_update(
+            drifted, ['completed_items', 'total_items', 'progress_percentage', 'status', 'completed_at'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} progress rows, rebuilt {len(drifted)}."))
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+def backfill_progress_counters(apps, schema_editor):
+    CourseProgress = apps.get_model('courses', 'CourseProgress')
+    CourseMaterial = apps.get_model('courses', 'CourseMaterial')
+    Assignment = apps.get_model('courses', 'Assignment')
+    AssignmentSubmission = apps.get_model('courses', 'AssignmentSubmission')
+    Quiz = apps.get_model('quizzes', 'Quiz')
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+
+    for progress in CourseProgress.objects.all():
+        progress.total_items = sum(
+            model.objects.filter(course_id=progress.course_id).count() for model in (CourseMaterial, Assignment, Quiz)
+        )
+        progress.completed_items = AssignmentSubmission.objects.filter(
+            student_id=progress.user_id, assignment__course_id=progress.course_id, status='graded'
+        ).count() + QuizAttempt.objects.filter(
+            student_id=progress.user_id, quiz__course_id=progress.course_id, completed=True
+        ).count()
+        if progress.total_items:
+            progress.progress_percentage = min(progress.completed_items * 100 // progress.total_items, 100)
+        progress.save(update_fields=['completed_items', 'total_items', 'progress_percentage'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_contentview'),
+        ('quizzes', '0023_quizanswer_submission_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courseprogress',
+            name='completed_items',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='courseprogress',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_progress_counters, migrations.RunPython.noop),
+    ]
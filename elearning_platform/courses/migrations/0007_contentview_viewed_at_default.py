@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_course_content_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contentview',
+            name='viewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,4 +1,10 @@
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
 
@@ -12,6 +18,8 @@ class Course(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped whenever the course's materials, assignments or quizzes change, so cached content snapshots are rebuilt
+    content_version = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.title
@@ -52,6 +60,10 @@ class CourseProgress(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_progresses')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
     progress_percentage = models.PositiveIntegerField(default=0)  # 0-100
+    # Counters behind the percentage, kept up to date by the signal handlers on course content,
+    # assignment grading and quiz attempt completion
+    completed_items = models.PositiveIntegerField(default=0, editable=False)
+    total_items = models.PositiveIntegerField(default=0, editable=False)
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
@@ -141,6 +153,13 @@ class AssignmentSubmission(models.Model):
         
     def __str__(self):
         return f"{self.student.username}'s submission for {self.assignment.title}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the status so the progress signal handlers can tell when the submission is graded
+        instance._loaded_status = dict(zip(field_names, values)).get('status')
+        return instance
         
     def is_late(self):
         """Check if the submission was late"""
@@ -167,11 +186,140 @@ class ContentView(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='content_views')
     content_type = models.CharField(max_length=20, choices=CONTENT_TYPES)
     content_id = models.PositiveIntegerField()  # ID of the material, assignment, or quiz
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    # Set when the view happened rather than when it's saved, since views are written in batches
+    viewed_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         unique_together = ['user', 'content_type', 'content_id']
         ordering = ['-viewed_at']
     
     def __str__(self):
-        return f"{self.user.username} viewed {self.content_type} {self.content_id}"
\ No newline at end of file
+        return f"{self.user.username} viewed {self.content_type} {self.content_id}"
+
+
+class ContentWatermark(models.Model):
+    """
+    How far a student has caught up with one type of content in a course: every item created
+    up to seen_until has been seen, so only newer items are checked against their ContentView rows
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='content_watermarks')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='content_watermarks')
+    content_type = models.CharField(max_length=20, choices=ContentView.CONTENT_TYPES)
+    seen_until = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['user', 'course', 'content_type']
+    
+    def __str__(self):
+        return f"{self.user.username} has seen {self.content_type} in {self.course.title} until {self.seen_until}"
+
+def calculate_progress_percentage(completed_items, total_items):
+    """Share of a course's items the student has completed, from 0 to 100"""
+    if not total_items:
+        return 0
+    return min(completed_items * 100 // total_items, 100)
+
+def count_course_items(course_id):
+    """Count the materials, assignments and quizzes that make up a course's progress"""
+    from quizzes.models import Quiz
+    return (
+        CourseMaterial.objects.filter(course_id=course_id).count()
+        + Assignment.objects.filter(course_id=course_id).count()
+        + Quiz.objects.filter(course_id=course_id).count()
+    )
+
+def count_completed_items(user_id, course_id):
+    """Count the graded assignments and completed quiz attempts of a student in a course"""
+    from quizzes.models import QuizAttempt
+    return (
+        AssignmentSubmission.objects.filter(
+            student_id=user_id, assignment__course_id=course_id, status='graded'
+        ).count()
+        + QuizAttempt.objects.filter(student_id=user_id, quiz__course_id=course_id, completed=True).count()
+    )
+
+def get_course_progress(user, course):
+    """Return the student's progress row for the course, counting it up from the database the first time"""
+    progress = CourseProgress.objects.filter(user=user, course=course).first()
+    if progress is None:
+        completed_items = count_completed_items(user.id, course.id)
+        total_items = count_course_items(course.id)
+        percentage = calculate_progress_percentage(completed_items, total_items)
+        progress, _ = CourseProgress.objects.get_or_create(user=user, course=course, defaults={
+            'completed_items': completed_items,
+            'total_items': total_items,
+            'progress_percentage': percentage,
+            'status': 'completed' if percentage == 100 else 'in_progress',
+            'completed_at': timezone.now() if percentage == 100 else None,
+        })
+    return progress
+
+def adjust_course_progress(progresses, completed=0, total=0):
+    """
+    Apply a change to the counters of the given CourseProgress rows with a single UPDATE,
+    recomputing the percentage and marking rows that reach 100% as completed
+    """
+    if not completed and not total:
+        return
+    completed_items = F('completed_items') + completed
+    total_items = F('total_items') + total
+    percentage = Case(
+        When(GreaterThan(total_items, 0), then=Least(completed_items * 100 / total_items, Value(100))),
+        default=Value(0),
+    )
+    finished = GreaterThanOrEqual(percentage, 100)
+    progresses.update(
+        completed_items=completed_items,
+        total_items=total_items,
+        progress_percentage=percentage,
+        status=Case(When(finished, then=Value('completed')), default=F('status')),
+        completed_at=Case(When(Q(finished, completed_at__isnull=True), then=Value(timezone.now())),
+                          default=F('completed_at')),
+    )
+
+def bump_content_version(course_ids):
+    """Mark the content of the given courses as changed in a single UPDATE"""
+    course_ids = {course_id for course_id in course_ids if course_id}
+    if course_ids:
+        Course.objects.filter(id__in=course_ids).update(content_version=F('content_version') + 1)
+
+# Signals to keep the CourseProgress counters up to date
+@receiver(post_save, sender=CourseMaterial)
+@receiver(post_save, sender=Assignment)
+def add_course_item(sender, instance, created, **kwargs):
+    """New content adds to the total of everyone taking the course"""
+    if created:
+        adjust_course_progress(CourseProgress.objects.filter(course_id=instance.course_id), total=1)
+
+@receiver(post_delete, sender=CourseMaterial)
+@receiver(post_delete, sender=Assignment)
+def remove_course_item(sender, instance, **kwargs):
+    adjust_course_progress(CourseProgress.objects.filter(course_id=instance.course_id), total=-1)
+
+@receiver(post_save, sender=CourseMaterial)
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=CourseMaterial)
+@receiver(post_delete, sender=Assignment)
+def update_content_version(sender, instance, **kwargs):
+    """Any change to a course's content invalidates its cached content snapshot"""
+    bump_content_version([instance.course_id])
+
+@receiver(post_save, sender=AssignmentSubmission)
+def update_progress_for_submission(sender, instance, created, **kwargs):
+    """A submission counts as completed while it's graded"""
+    was_graded = not created and getattr(instance, '_loaded_status', None) == 'graded'
+    is_graded = instance.status == 'graded'
+    if was_graded != is_graded:
+        adjust_course_progress(
+            CourseProgress.objects.filter(user_id=instance.student_id, course__assignments=instance.assignment_id),
+            completed=1 if is_graded else -1
+        )
+    instance._loaded_status = instance.status
+
+@receiver(post_delete, sender=AssignmentSubmission)
+def remove_submission_progress(sender, instance, **kwargs):
+    if getattr(instance, '_loaded_status', instance.status) == 'graded':
+        adjust_course_progress(
+            CourseProgress.objects.filter(user_id=instance.student_id, course__assignments=instance.assignment_id),
+            completed=-1
+        )
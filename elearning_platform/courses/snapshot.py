@@ -0,0 +1,186 @@
+import copy
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Value
+
+from quizzes.models import Quiz, QuizAttempt
+from .models import Assignment, AssignmentSubmission, ContentView, ContentWatermark, CourseMaterial
+
+# Snapshots are keyed on Course.content_version, so stale entries are never read
+# again once the version is bumped; the timeout only bounds how long they linger.
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+# A student's unread items are dropped whenever their views are flushed,
+# and ignored once the course's content version or the student's since moves on
+UNREAD_TIMEOUT = 60 * 60 * 24
+
+CONTENT_MODELS = (('material', CourseMaterial), ('assignment', Assignment), ('quiz', Quiz))
+
+
+class CourseContentSnapshot:
+    """
+    Read-only, versioned lists of a course's materials, assignments and quizzes in dashboard order.
+    Built once per content change and shared from the cache by every student enrolled in the course.
+    """
+
+    def __init__(self, course_id, version, materials, assignments, quizzes):
+        self.course_id = course_id
+        self.version = version
+        self.materials = tuple(materials)
+        self.assignments = tuple(assignments)
+        self.quizzes = tuple(quizzes)
+
+    def items(self):
+        """Every item of the course as (content type, item) pairs, using ContentView's content types"""
+        for content_type, items in (
+            ('material', self.materials), ('assignment', self.assignments), ('quiz', self.quizzes)
+        ):
+            for item in items:
+                yield content_type, item
+
+
+class StudentCourseContent:
+    """A course's content as one student sees it: which items are new, and their submissions and attempts"""
+
+    def __init__(self, snapshot, new_items, submissions, attempts):
+        self.materials = self._tag(snapshot.materials, new_items['material'])
+        self.assignments = self._tag(snapshot.assignments, new_items['assignment'])
+        self.quizzes = self._tag(snapshot.quizzes, new_items['quiz'])
+        self.new_materials_count = len(new_items['material'])
+        self.new_assignments_count = len(new_items['assignment'])
+        self.new_quizzes_count = len(new_items['quiz'])
+        self.submissions = submissions
+        self.attempts = attempts
+
+    @staticmethod
+    def _tag(items, new_ids):
+        # The snapshot is shared, so flag copies of its items rather than the items themselves
+        tagged = []
+        for item in items:
+            item = copy.copy(item)
+            item.is_new = item.id in new_ids
+            tagged.append(item)
+        return tagged
+
+
+def _snapshot_cache_key(course_id, version):
+    return f'course_content:{course_id}:{version}'
+
+
+def build_course_content_snapshot(course):
+    """Load the course's materials, assignments and quizzes from the database into a new snapshot"""
+    return CourseContentSnapshot(
+        course.id,
+        course.content_version,
+        course.materials.order_by('order'),
+        course.assignments.order_by('-due_date'),
+        Quiz.objects.filter(course=course).order_by('-created_at'),
+    )
+
+
+def get_course_content_snapshot(course):
+    """Return the current content snapshot for a course, building and caching it on a miss"""
+    key = _snapshot_cache_key(course.id, course.content_version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_course_content_snapshot(course)
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def _unread_cache_key(user_id, course_id):
+    return f'course_unread:{course_id}:{user_id}'
+
+
+def find_unread_items(user, course, since):
+    """
+    Work out which of the course's items the student hasn't seen, moving their watermarks past
+    every item they have. Only items newer than the watermarks are loaded, with a single query
+    that checks each against ContentView, so the cost doesn't grow with the student's view history.
+    since is the earliest watermark, e.g. the student's last login: as before watermarks existed,
+    nothing created before it counts as new.
+    Returns a dict of content type to the set of unread item IDs.
+    """
+    stored = dict(ContentWatermark.objects.filter(user=user, course=course).values_list(
+        'content_type', 'seen_until'
+    ))
+    watermarks = {
+        content_type: max(stored.get(content_type, since), since) for content_type, _ in CONTENT_MODELS
+    }
+
+    querysets = [
+        model.objects.filter(course=course, created_at__gt=watermarks[content_type]).annotate(
+            kind=Value(content_type),
+            viewed=Exists(ContentView.objects.filter(
+                user=user, content_type=content_type, content_id=OuterRef('pk')
+            )),
+        ).values_list('id', 'created_at', 'kind', 'viewed').order_by()
+        for content_type, model in CONTENT_MODELS
+    ]
+    # Unread items sort first among items created at the same moment, so the watermark stops before them
+    rows = sorted(querysets[0].union(*querysets[1:], all=True), key=lambda row: (row[1], row[3]))
+
+    unread = {content_type: set() for content_type, _ in CONTENT_MODELS}
+    for item_id, created_at, content_type, viewed in rows:
+        if not viewed:
+            unread[content_type].add(item_id)
+        elif not unread[content_type]:
+            # Everything up to here has been seen
+            watermarks[content_type] = created_at
+
+    changed = [
+        ContentWatermark(user=user, course=course, content_type=content_type, seen_until=seen_until)
+        for content_type, seen_until in watermarks.items() if stored.get(content_type) != seen_until
+    ]
+    if changed:
+        ContentWatermark.objects.bulk_create(
+            changed, update_conflicts=True,
+            unique_fields=['user', 'course', 'content_type'], update_fields=['seen_until'],
+        )
+    return unread
+
+
+def get_unread_items(user, course, since):
+    """Return the student's unread items in the course from the cache, working them out on a miss"""
+    key = _unread_cache_key(user.id, course.id)
+    cached = cache.get(key)
+    if cached is not None and cached[:2] == (course.content_version, since):
+        return cached[2]
+    unread = find_unread_items(user, course, since)
+    cache.set(key, (course.content_version, since, unread), UNREAD_TIMEOUT)
+    return unread
+
+
+def invalidate_unread_items(user_course_ids):
+    """Drop the cached unread items of the given (user ID, course ID) pairs, e.g. after their views are written"""
+    cache.delete_many([_unread_cache_key(user_id, course_id) for user_id, course_id in user_course_ids])
+
+
+def get_student_course_content(user, course, since, pending_views=None):
+    """
+    Return the course's content for a student, flagging the items they haven't seen yet.
+    pending_views, if given, takes the unread (content type, ID) pairs and returns those to count
+    as seen anyway because their views are buffered but not yet written.
+    Apart from rebuilding the shared snapshot or the student's unread items on a miss,
+    this takes two queries: their submissions and their attempts.
+    """
+    snapshot = get_course_content_snapshot(course)
+    new_items = get_unread_items(user, course, since)
+    unread_pairs = [(content_type, item_id) for content_type, ids in new_items.items() for item_id in ids]
+    if pending_views and unread_pairs:
+        seen = pending_views(unread_pairs)
+        # The unread items may be the cached dict, so build new sets rather than changing them
+        new_items = {
+            content_type: {item_id for item_id in ids if (content_type, item_id) not in seen}
+            for content_type, ids in new_items.items()
+        }
+
+    submissions = {
+        submission.assignment_id: submission
+        for submission in AssignmentSubmission.objects.filter(student=user, assignment__course=course)
+    }
+    attempts = {}
+    for attempt in QuizAttempt.objects.filter(student=user, quiz__course=course):
+        attempts[attempt.quiz_id] = attempt
+
+    return StudentCourseContent(snapshot, new_items, submissions, attempts)
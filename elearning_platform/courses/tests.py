@@ -1,3 +1,298 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User, PaymentProof, StudentProfile
+from quizzes.management.commands.expire_quiz_attempts import expire_overdue_attempts
+from quizzes.models import Quiz, QuizAttempt
+from .models import (
+    Assignment, AssignmentSubmission, ContentView, ContentWatermark, Course, CourseMaterial, CourseProgress,
+    get_course_progress
+)
+from .snapshot import find_unread_items, get_course_content_snapshot, get_student_course_content, get_unread_items
+from .view_buffer import flush_content_views, has_pending_views, record_content_views
+
+
+class CourseTestCase(TestCase):
+    """Shared fixture: a course with a material, an assignment and a quiz, and an enrolled student"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', password='pw', user_type='student')
+        StudentProfile.objects.create(user=cls.student)
+        cls.course = Course.objects.create(title='Course', description='', placement_test_price=0)
+        PaymentProof.objects.create(user=cls.student, course=cls.course, proof_image='proof.png', status='approved')
+        cls.material = CourseMaterial.objects.create(course=cls.course, title='Material', material_type='link')
+        cls.assignment = Assignment.objects.create(
+            course=cls.course, title='Assignment', description='', instructions='',
+            due_date=timezone.now() + timedelta(days=7), status='published'
+        )
+        cls.quiz = Quiz.objects.create(title='Quiz', course=cls.course)
+
+    def get_progress(self):
+        return CourseProgress.objects.get(user=self.student, course=self.course)
+
+    def counts(self):
+        progress = self.get_progress()
+        return progress.completed_items, progress.total_items, progress.progress_percentage
+
+
+class CourseProgressTests(CourseTestCase):
+    """CourseProgress counters are adjusted by signals instead of being recounted on every dashboard view"""
+
+    def setUp(self):
+        get_course_progress(self.student, self.course)
+
+    def test_new_progress_is_counted_from_the_database(self):
+        self.assertEqual(self.counts(), (0, 3, 0))
+
+    def test_content_changes_adjust_the_total(self):
+        material = CourseMaterial.objects.create(course=self.course, title='Another', material_type='link')
+        Quiz.objects.create(title='Another quiz', course=self.course)
+        self.assertEqual(self.counts(), (0, 5, 0))
+
+        material.delete()
+        self.assertEqual(self.counts(), (0, 4, 0))
+
+    def test_grading_and_finishing_attempts_complete_items(self):
+        submission = AssignmentSubmission.objects.create(assignment=self.assignment, student=self.student)
+        self.assertEqual(self.counts(), (0, 3, 0))
+
+        submission.status = 'graded'
+        submission.save()
+        self.assertEqual(self.counts(), (1, 3, 33))
+
+        attempt = QuizAttempt.objects.create(student=self.student, quiz=self.quiz)
+        attempt.complete()
+        attempt.save()  # saving a finished attempt again doesn't count it twice
+        self.assertEqual(self.counts(), (2, 3, 66))
+
+        submission = AssignmentSubmission.objects.get(id=submission.id)
+        submission.status = 'resubmit'
+        submission.save()
+        self.assertEqual(self.counts(), (1, 3, 33))
+
+    def test_completing_every_item_completes_the_course(self):
+        self.material.delete()
+        AssignmentSubmission.objects.create(assignment=self.assignment, student=self.student, status='graded')
+        QuizAttempt.objects.create(student=self.student, quiz=self.quiz).complete()
+
+        progress = self.get_progress()
+        self.assertEqual(progress.progress_percentage, 100)
+        self.assertEqual(progress.status, 'completed')
+        self.assertIsNotNone(progress.completed_at)
+
+    def test_expired_attempts_complete_items(self):
+        attempt = QuizAttempt.objects.create(student=self.student, quiz=self.quiz)
+        QuizAttempt.objects.filter(id=attempt.id).update(deadline=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(expire_overdue_attempts(), 1)
+        self.assertEqual(self.counts(), (1, 3, 33))
+
+    def test_dashboard_does_not_write_progress(self):
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student_course_dashboard', args=[self.course.slug]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['progress'], self.get_progress())
+        self.assertFalse([query for query in queries if 'UPDATE "courses_courseprogress"' in query['sql']])
+
+    def test_rebuild_fixes_drift(self):
+        AssignmentSubmission.objects.create(assignment=self.assignment, student=self.student, status='graded')
+        CourseProgress.objects.update(completed_items=0, total_items=9, progress_percentage=0)
+
+        out = StringIO()
+        call_command('rebuild_course_progress', '--verify', stdout=out)
+        self.assertIn('1 out of date', out.getvalue())
+
+        call_command('rebuild_course_progress', stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 3, 33))
+
+
+class CourseContentSnapshotTests(CourseTestCase):
+    """The dashboard's content lists come from a cached per-course snapshot plus a few queries per student"""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+        self.url = reverse('student_course_dashboard', args=[self.course.slug])
+
+    def test_new_items_exclude_viewed_ones(self):
+        since = timezone.now() - timedelta(days=1)
+        ContentView.objects.create(user=self.student, course=self.course, content_type='material',
+                                   content_id=self.material.id)
+        AssignmentSubmission.objects.create(assignment=self.assignment, student=self.student)
+
+        content = get_student_course_content(self.student, self.course, since)
+        self.assertEqual([item.is_new for item in content.materials], [False])
+        self.assertEqual([item.is_new for item in content.assignments], [True])
+        self.assertEqual(content.new_quizzes_count, 1)
+        self.assertEqual(list(content.submissions), [self.assignment.id])
+        self.assertEqual(content.attempts, {})
+
+        # Flags are set on copies, never on the shared snapshot
+        self.assertFalse(hasattr(get_course_content_snapshot(self.course).materials[0], 'is_new'))
+
+    def test_content_changes_rebuild_the_snapshot(self):
+        snapshot = get_course_content_snapshot(self.course)
+        CourseMaterial.objects.create(course=self.course, title='Another', material_type='link')
+        self.course.refresh_from_db()
+        self.assertGreater(self.course.content_version, snapshot.version)
+        self.assertEqual(len(get_course_content_snapshot(self.course).materials), 2)
+
+    def test_dashboard_query_count_does_not_grow_with_content(self):
+        # Auth, course access, enrolment and progress, then the student's submissions and attempts
+        for total in (11, 21):
+            for index in range(10):
+                CourseMaterial.objects.create(course=self.course, title=f'Material {index}', material_type='link')
+            self.client.get(self.url)  # rebuilds the snapshot
+            with self.assertNumQueries(10):
+                response = self.client.get(self.url)
+            self.assertEqual(response.context['materials_count'], total)
+            self.assertEqual(response.context['new_materials_count'], total - 1)
+            self.assertEqual(len(response.context['materials']), 5)
+
+
+class ContentWatermarkTests(CourseTestCase):
+    """Unread items are found from per-type watermarks and cached per student and course"""
+
+    def setUp(self):
+        cache.clear()
+        self.since = timezone.now() - timedelta(days=1)
+
+    def view(self, content_type, content_id):
+        ContentView.objects.create(user=self.student, course=self.course, content_type=content_type,
+                                   content_id=content_id)
+
+    def watermarks(self):
+        return dict(ContentWatermark.objects.filter(user=self.student, course=self.course).values_list(
+            'content_type', 'seen_until'
+        ))
+
+    def test_watermarks_move_past_seen_items(self):
+        later = CourseMaterial.objects.create(course=self.course, title='Later', material_type='link')
+        self.view('material', self.material.id)
+        self.view('quiz', self.quiz.id)
+
+        unread = find_unread_items(self.student, self.course, self.since)
+        self.assertEqual(unread, {'material': {later.id}, 'assignment': {self.assignment.id}, 'quiz': set()})
+        watermarks = self.watermarks()
+        self.assertEqual(watermarks['material'], self.material.created_at)
+        self.assertEqual(watermarks['assignment'], self.since)
+        self.assertEqual(watermarks['quiz'], self.quiz.created_at)
+
+        # Items behind the watermark aren't checked again, even without their views
+        ContentView.objects.filter(content_type='material').delete()
+        self.assertEqual(find_unread_items(self.student, self.course, self.since)['material'], {later.id})
+
+    def test_watermarks_never_lag_behind_since(self):
+        self.view('material', self.material.id)
+        find_unread_items(self.student, self.course, self.since)
+        later = CourseMaterial.objects.create(course=self.course, title='Later', material_type='link')
+
+        # As with last_login on its own, items created before since aren't new even if unread
+        since = timezone.now()
+        unread = find_unread_items(self.student, self.course, since)
+        self.assertNotIn(later.id, unread['material'])
+        self.assertEqual(self.watermarks()['material'], since)
+
+    def test_unread_items_are_cached_until_views_are_flushed(self):
+        get_unread_items(self.student, self.course, self.since)
+        with self.assertNumQueries(0):
+            get_unread_items(self.student, self.course, self.since)
+
+        record_content_views(self.student.id, self.course.id, [('assignment', self.assignment.id)])
+        flush_content_views()
+        unread = get_unread_items(self.student, self.course, self.since)
+        self.assertEqual(unread['assignment'], set())
+
+    def test_unread_items_are_worked_out_again_after_a_new_login(self):
+        self.assertIn(self.assignment.id, get_unread_items(self.student, self.course, self.since)['assignment'])
+        self.assertNotIn(self.assignment.id, get_unread_items(self.student, self.course, timezone.now())['assignment'])
+
+    def test_new_content_is_unread(self):
+        get_unread_items(self.student, self.course, self.since)
+        assignment = Assignment.objects.create(
+            course=self.course, title='Another', description='', instructions='',
+            due_date=timezone.now() + timedelta(days=7), status='published'
+        )
+        self.course.refresh_from_db()
+        self.assertIn(assignment.id, get_unread_items(self.student, self.course, self.since)['assignment'])
+
+
+class ContentViewBufferTests(CourseTestCase):
+    """mark_content_viewed buffers views in the cache and they're written with one upsert"""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+        self.url = reverse('mark_content_viewed')
+
+    def post(self, data):
+        return self.client.post(self.url, {'course_id': self.course.id, **data},
+                                headers={'X-Requested-With': 'XMLHttpRequest'})
+
+    def test_views_are_buffered_until_flushed(self):
+        with self.assertNumQueries(4):  # session, user, the profile middleware and enrolment, nothing for the views
+            response = self.post({'items': json.dumps([
+                {'content_type': 'material', 'content_id': self.material.id},
+                {'content_type': 'quiz', 'content_id': self.quiz.id},
+            ])})
+        self.assertEqual(response.json(), {'status': 'success', 'count': 2})
+        self.assertFalse(ContentView.objects.exists())
+        self.assertTrue(has_pending_views())
+
+        self.post({'content_type': 'material', 'content_id': self.material.id})
+        with self.assertNumQueries(3):  # courses, users, then the upsert
+            self.assertEqual(flush_content_views(), 2)
+        self.assertFalse(has_pending_views())
+        self.assertEqual(
+            set(ContentView.objects.values_list('content_type', 'content_id')),
+            {('material', self.material.id), ('quiz', self.quiz.id)}
+        )
+
+    def test_flush_updates_existing_views(self):
+        view = ContentView.objects.create(user=self.student, course=self.course, content_type='material',
+                                          content_id=self.material.id, viewed_at=timezone.now() - timedelta(days=1))
+        self.post({'content_type': 'material', 'content_id': self.material.id})
+        flush_content_views()
+        view.refresh_from_db()
+        self.assertGreater(view.viewed_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(ContentView.objects.count(), 1)
+
+    def test_invalid_items_are_rejected(self):
+        for data in ({'content_type': 'video', 'content_id': 1}, {'content_type': 'quiz'},
+                     {'items': 'not json'}, {'items': json.dumps([{'content_type': 'quiz'}])}):
+            self.assertEqual(self.post(data).status_code, 400)
+        self.assertFalse(has_pending_views())
+
+    def test_views_need_an_enrolment(self):
+        other_course = Course.objects.create(title='Other', description='', placement_test_price=0)
+        for course_id in (other_course.id, 0):
+            response = self.client.post(self.url, {'course_id': course_id, 'content_type': 'material',
+                                                   'content_id': self.material.id},
+                                        headers={'X-Requested-With': 'XMLHttpRequest'})
+            self.assertEqual(response.status_code, 403)
+        self.assertFalse(has_pending_views())
+
+    def test_dashboard_counts_the_students_buffered_views_as_seen(self):
+        User.objects.filter(id=self.student.id).update(last_login=timezone.now() - timedelta(days=1))
+        url = reverse('student_course_dashboard', args=[self.course.slug])
+        self.assertTrue(self.client.get(url).context['materials'][0].is_new)
 
-# Create your tests here.
+        self.post({'content_type': 'material', 'content_id': self.material.id})
+        other = User.objects.create_user('other', password='pw', user_type='student')
+        record_content_views(other.id, self.course.id, [('quiz', self.quiz.id)])
+        response = self.client.get(url)
+        self.assertFalse(response.context['materials'][0].is_new)
+        self.assertEqual(response.context['new_quizzes_count'], 1)
+        # Nothing is flushed for the dashboard, this student's views or anyone else's
+        self.assertFalse(ContentView.objects.exists())
+        self.assertTrue(has_pending_views())
@@ -0,0 +1,152 @@
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from accounts.models import User
+from .models import ContentView, Course
+from .snapshot import invalidate_unread_items
+
+# Buffered view events are written to numbered cache slots and upserted into ContentView in bulk.
+# This is best effort: a slot evicted from the cache, or written while a flush is reading past it,
+# is dropped, which at worst leaves a "New" badge showing until the student views the item again.
+SLOT_TIMEOUT = 60 * 60
+# The longest a buffered view waits before a request flushes it
+FLUSH_INTERVAL = 30
+FLUSH_LOCK_TIMEOUT = 60
+
+TAIL_KEY = 'content_view_buffer:tail'
+HEAD_KEY = 'content_view_buffer:head'
+FLUSH_DUE_KEY = 'content_view_buffer:flush_due'
+FLUSH_LOCK_KEY = 'content_view_buffer:flushing'
+
+CONTENT_TYPES = frozenset(content_type for content_type, _ in ContentView.CONTENT_TYPES)
+
+
+def _slot_key(slot):
+    return f'content_view_buffer:{slot}'
+
+
+def _pending_key(user_id, course_id, content_type, content_id):
+    return f'content_view_pending:{course_id}:{user_id}:{content_type}:{content_id}'
+
+
+def _next_slot():
+    cache.add(TAIL_KEY, 0, None)
+    try:
+        return cache.incr(TAIL_KEY)
+    except ValueError:
+        # The counter was evicted between the add and the incr
+        cache.add(TAIL_KEY, 0, None)
+        return cache.incr(TAIL_KEY)
+
+
+def parse_view_items(items):
+    """
+    Validate (content type, content ID) pairs sent by a client, dropping duplicates.
+    Raises ValueError if any pair is malformed.
+    """
+    parsed = []
+    for content_type, content_id in items:
+        if content_type not in CONTENT_TYPES:
+            raise ValueError(f"Unknown content type: {content_type}")
+        content_id = int(content_id)
+        if content_id <= 0:
+            raise ValueError(f"Invalid content ID: {content_id}")
+        if (content_type, content_id) not in parsed:
+            parsed.append((content_type, content_id))
+    return parsed
+
+
+def record_content_views(user_id, course_id, items, viewed_at=None):
+    """Buffer a student's views of (content type, content ID) pairs in a course, without touching the database"""
+    if not items:
+        return
+    viewed_at = viewed_at or timezone.now()
+    events = [(user_id, course_id, content_type, content_id, viewed_at) for content_type, content_id in items]
+    cache.set(_slot_key(_next_slot()), events, SLOT_TIMEOUT)
+    # Also flagged item by item, so the student's dashboard can treat them as read before the flush
+    # without concurrent batches overwriting each other. Flags outlive the flush until they time out,
+    # which is harmless once the views are written.
+    cache.set_many({
+        _pending_key(user_id, course_id, content_type, content_id): True for content_type, content_id in items
+    }, SLOT_TIMEOUT)
+    # Only the first view since the last flush sets when the next one is due
+    cache.add(FLUSH_DUE_KEY, time.time() + FLUSH_INTERVAL, None)
+
+
+def get_pending_views(user_id, course_id, items):
+    """Which of the (content type, content ID) pairs the student has viewed in the course, but may not be written yet"""
+    keys = {_pending_key(user_id, course_id, *item): item for item in items}
+    return {keys[key] for key in cache.get_many(list(keys))}
+
+
+def has_pending_views():
+    """Whether any buffered views are waiting to be flushed"""
+    positions = cache.get_many([HEAD_KEY, TAIL_KEY])
+    return positions.get(TAIL_KEY, 0) != positions.get(HEAD_KEY, 0)
+
+
+def flush_content_views():
+    """
+    Write every buffered view to ContentView with a single upsert on (user, content type, content ID),
+    keeping the latest view of each item. Returns the number of items written, or 0 if another
+    flush is already running.
+    """
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return 0
+    try:
+        cache.delete(FLUSH_DUE_KEY)
+        positions = cache.get_many([HEAD_KEY, TAIL_KEY])
+        head = positions.get(HEAD_KEY, 0)
+        tail = positions.get(TAIL_KEY, 0)
+        if tail < head:
+            # The slot counter was evicted and started again from 1
+            head = 0
+        if tail == head:
+            return 0
+        keys = [_slot_key(slot) for slot in range(head + 1, tail + 1)]
+        slots = cache.get_many(keys)
+
+        latest = {}
+        for events in slots.values():
+            for user_id, course_id, content_type, content_id, viewed_at in events:
+                key = (user_id, content_type, content_id)
+                if key not in latest or latest[key][1] < viewed_at:
+                    latest[key] = (course_id, viewed_at)
+
+        written = 0
+        if latest:
+            # Views of deleted courses or by deleted users would break the foreign keys of the whole upsert
+            course_ids = set(Course.objects.filter(
+                id__in={course_id for course_id, _ in latest.values()}
+            ).values_list('id', flat=True))
+            user_ids = set(User.objects.filter(
+                id__in={user_id for user_id, _, _ in latest}
+            ).values_list('id', flat=True))
+            views = [
+                ContentView(user_id=user_id, course_id=course_id, content_type=content_type,
+                            content_id=content_id, viewed_at=viewed_at)
+                for (user_id, content_type, content_id), (course_id, viewed_at) in latest.items()
+                if user_id in user_ids and course_id in course_ids
+            ]
+            ContentView.objects.bulk_create(
+                views, update_conflicts=True,
+                unique_fields=['user', 'content_type', 'content_id'], update_fields=['viewed_at'],
+            )
+            written = len(views)
+            invalidate_unread_items({(view.user_id, view.course_id) for view in views})
+
+        cache.set(HEAD_KEY, tail, None)
+        cache.delete_many(keys)
+        return written
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def flush_content_views_if_due():
+    """Flush the buffer once its oldest view has waited FLUSH_INTERVAL seconds, from whichever request gets there"""
+    due = cache.get(FLUSH_DUE_KEY)
+    if due is not None and due <= time.time():
+        return flush_content_views()
+    return 0
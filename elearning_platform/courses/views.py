@@ -6,17 +6,21 @@ from django.utils import timezone
 
 from django.db.models import Q
 from django.contrib.auth.decorators import login_required, user_passes_test
-from quizzes.models import Quiz, QuizAttempt
+from quizzes.models import Quiz
 
-from .models import Assignment, AssignmentSubmission, Course, CourseLevel, CourseProgress, CourseMaterial
+from .models import Assignment, AssignmentSubmission, Course, CourseLevel, CourseMaterial, get_course_progress
 from .forms import CourseForm, CourseLevelForm, AssignmentForm, AssignmentSubmissionForm, GradeSubmissionForm, CourseMaterialForm
 from accounts.models import PaymentProof, StudentProfile, User
 from accounts.forms import PaymentProofForm
 
 from django.http import JsonResponse
-from .models import ContentView
+from .snapshot import get_student_course_content
+from .view_buffer import (
+    flush_content_views_if_due, get_pending_views, parse_view_items, record_content_views
+)
 from django.db.models import Max
 from datetime import timedelta
+import json
 
 
 def is_admin(user):
@@ -205,100 +209,25 @@ def student_course_dashboard(request, slug):
     # Verify the student is enrolled in this course
     payment = get_object_or_404(PaymentProof, user=request.user, course=course, status='approved')
     
-    # Get or create course progress
-    progress, created = CourseProgress.objects.get_or_create(
-        user=request.user,
-        course=course
-    )
+    # Get the course progress, which the signal handlers keep up to date as content changes and work is graded
+    progress = get_course_progress(request.user, course)
     
-    # Get the last login time to determine new content
-    # If not available, use 7 days ago as default
+    # The last login time is where the student's "new" content watermarks start
+    # If not available, use 2 days ago as default
     last_login = request.user.last_login or (timezone.now() - timedelta(days=2))
     
-    # Get course materials with "new" flag
-    all_materials = course.materials.all().order_by('order')
-    materials_count = all_materials.count()
-    
-    # Get viewed content
-    viewed_material_ids = ContentView.objects.filter(
-        user=request.user,
-        course=course,
-        content_type='material'
-    ).values_list('content_id', flat=True)
-    
-    # Mark materials as new if created after last login and not viewed
-    for material in all_materials:
-        material.is_new = (
-            material.created_at > last_login and 
-            material.id not in viewed_material_ids
-        )
-    
-    # Count new materials
-    new_materials_count = sum(1 for m in all_materials if getattr(m, 'is_new', False))
-    
-    # Get assignments with "new" flag
-    all_assignments = course.assignments.all().order_by('-due_date')
-    assignments_count = all_assignments.count()
-    
-    # Get viewed assignments
-    viewed_assignment_ids = ContentView.objects.filter(
-        user=request.user,
-        course=course,
-        content_type='assignment'
-    ).values_list('content_id', flat=True)
-    
-    # Mark assignments as new
-    for assignment in all_assignments:
-        assignment.is_new = (
-            assignment.created_at > last_login and 
-            assignment.id not in viewed_assignment_ids
-        )
-    
-    # Count new assignments
-    new_assignments_count = sum(1 for a in all_assignments if getattr(a, 'is_new', False))
-    
-    # Get assignment submissions for this user
-    assignment_submissions = AssignmentSubmission.objects.filter(
-        student=request.user,
-        assignment__course=course
-    ).select_related('assignment')
-    
-    # Create a dictionary that maps assignment IDs to their submissions
-    submissions_dict = {}
-    for submission in assignment_submissions:
-        submissions_dict[submission.assignment_id] = submission
-    
-    # Get quizzes related to this course with "new" flag
-    all_quizzes = Quiz.objects.filter(course=course).order_by('-created_at')
-    quizzes_count = all_quizzes.count()
-    
-    # Get viewed quizzes
-    viewed_quiz_ids = ContentView.objects.filter(
-        user=request.user,
-        course=course,
-        content_type='quiz'
-    ).values_list('content_id', flat=True)
-    
-    # Mark quizzes as new
-    for quiz in all_quizzes:
-        quiz.is_new = (
-            quiz.created_at > last_login and 
-            quiz.id not in viewed_quiz_ids
-        )
-    
-    # Count new quizzes
-    new_quizzes_count = sum(1 for q in all_quizzes if getattr(q, 'is_new', False))
-    
-    # Get quiz attempts and organize them by quiz ID - Here's the fix!
-    # Changed 'user' to 'student' to match the database field name
-    quiz_attempts = QuizAttempt.objects.filter(
-        student=request.user,  # Changed from user=request.user
-        quiz__in=all_quizzes
-    ).select_related('quiz')
-    
-    attempts_dict = {}
-    for attempt in quiz_attempts:
-        attempts_dict[attempt.quiz_id] = attempt
+    # Materials, assignments and quizzes come from a snapshot shared by everyone in the course;
+    # only the "new" flags, submissions and attempts are looked up for this student.
+    # Items they've just opened count as seen even while their views are still buffered.
+    content = get_student_course_content(
+        request.user, course, last_login,
+        pending_views=lambda items: get_pending_views(request.user.id, course.id, items)
+    )
+    all_materials = content.materials
+    all_assignments = content.assignments
+    all_quizzes = content.quizzes
+    submissions_dict = content.submissions
+    attempts_dict = content.attempts
     
     # Pagination for materials
     materials_paginator = Paginator(all_materials, 5)
@@ -333,44 +262,22 @@ def student_course_dashboard(request, slug):
     except EmptyPage:
         quizzes = quizzes_paginator.page(quizzes_paginator.num_pages)
     
-    # Calculate overall progress
-    total_items = materials_count + assignments_count + quizzes_count
-    completed_items = 0
-    
-    # Count completed assignments
-    completed_items += assignment_submissions.filter(status='graded').count()
-    
-    # Count completed quizzes - Using 'completed' field instead of 'status'
-    completed_items += quiz_attempts.filter(completed=True).count()
-    
-    if total_items > 0:
-        progress_percentage = int((completed_items / total_items) * 100)
-        if progress_percentage != progress.progress_percentage:
-            progress.progress_percentage = progress_percentage
-            
-            # Mark as completed if 100%
-            if progress_percentage == 100 and progress.status != 'completed':
-                progress.status = 'completed'
-                progress.completed_at = timezone.now()
-            
-            progress.save()
-    
     context = {
         'course': course,
         'progress': progress,
         'materials': materials,
         'materials_paginator': materials_paginator,
-        'materials_count': materials_count,
-        'new_materials_count': new_materials_count,
+        'materials_count': len(all_materials),
+        'new_materials_count': content.new_materials_count,
         'assignments': assignments,
         'assignments_paginator': assignments_paginator,
-        'assignments_count': assignments_count,
-        'new_assignments_count': new_assignments_count,
+        'assignments_count': len(all_assignments),
+        'new_assignments_count': content.new_assignments_count,
         'submissions_dict': submissions_dict,
         'quizzes': quizzes,
         'quizzes_paginator': quizzes_paginator,
-        'quizzes_count': quizzes_count,
-        'new_quizzes_count': new_quizzes_count,
+        'quizzes_count': len(all_quizzes),
+        'new_quizzes_count': content.new_quizzes_count,
         'attempts_dict': attempts_dict
     }
 
@@ -782,32 +689,30 @@ def submission_detail(request, submission_id):
 @login_required
 def mark_content_viewed(request):
     """
-    AJAX endpoint to mark content as viewed by the student
+    AJAX endpoint to mark content as viewed by the student.
+    Takes a single content_type and content_id, or a JSON list of items with both, so a page
+    can report every visible item at once. Views are buffered and written to the database in bulk.
     """
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        content_type = request.POST.get('content_type')
-        content_id = request.POST.get('content_id')
         course_id = request.POST.get('course_id')
+        items = request.POST.get('items')
         
-        if not all([content_type, content_id, course_id]):
+        try:
+            if items:
+                items = [(item['content_type'], item['content_id']) for item in json.loads(items)]
+            else:
+                items = [(request.POST.get('content_type'), request.POST.get('content_id'))]
+            items = parse_view_items(items)
+            course_id = int(course_id)
+        except (TypeError, ValueError, KeyError):
             return JsonResponse({'status': 'error', 'message': 'Missing parameters'}, status=400)
         
-        try:
-            course = Course.objects.get(id=course_id)
-            content_view, created = ContentView.objects.get_or_create(
-                user=request.user,
-                course=course,
-                content_type=content_type,
-                content_id=content_id
-            )
-            
-            if not created:
-                # Update the timestamp if it already exists
-                content_view.viewed_at = timezone.now()
-                content_view.save()
-                
-            return JsonResponse({'status': 'success'})
-        except Exception as e:
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+        # Only views of courses the student is enrolled in are recorded
+        if not PaymentProof.objects.filter(user=request.user, course_id=course_id, status='approved').exists():
+            return JsonResponse({'status': 'error', 'message': 'Not enrolled in this course'}, status=403)
+        
+        record_content_views(request.user.id, course_id, items)
+        flush_content_views_if_due()
+        return JsonResponse({'status': 'success', 'count': len(items)})
     
     return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
\ No newline at end of file
@@ -78,6 +78,17 @@ DATABASES = {
     }
 }
 
+# Cache
+# Required to be shared by every worker process: quiz timers and navigation state are written
+# through it, and content views are buffered in it until they're flushed (see courses.view_buffer).
+# The per-process local-memory default would give each worker its own copy.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,153 @@
+import math
+from collections import namedtuple
+
+from .grading import AUTO_GRADED_QUESTION_TYPES
+
+# Abilities the estimate is worked out over, in standard deviations of past test takers
+ABILITY_GRID = tuple(step / 10 for step in range(-40, 41))
+ABILITY_PRIOR = tuple(math.exp(-ability * ability / 2) for ability in ABILITY_GRID)
+
+# Item parameters for questions that haven't been fitted yet
+DEFAULT_DISCRIMINATION = 1.0
+DEFAULT_DIFFICULTY = 0.0
+
+# Stop once one level is this likely, or once the next question would shrink the standard deviation
+# of the ability estimate by less than this, but never before asking this many questions
+ADAPTIVE_CONFIDENCE = 0.9
+ADAPTIVE_MIN_SD_REDUCTION = 0.025
+ADAPTIVE_MIN_QUESTIONS = 5
+
+# The fixed score thresholds of QuizAttempt.determine_result(), as fractions of the bank answered correctly
+LEVEL_THRESHOLDS = (('beginner', 0.40), ('intermediate', 0.75), ('advanced', None))
+
+AdaptiveStep = namedtuple('AdaptiveStep', ['question', 'ability', 'level', 'confidence'])
+
+
+def item_parameters(question):
+    """The question's (discrimination, difficulty), falling back to defaults if it hasn't been fitted"""
+    discrimination = question.discrimination if question.discrimination is not None else DEFAULT_DISCRIMINATION
+    difficulty = question.difficulty if question.difficulty is not None else DEFAULT_DIFFICULTY
+    return discrimination, difficulty
+
+
+def probability_correct(ability, discrimination, difficulty):
+    """Chance that a student of the given ability answers the question correctly (two-parameter logistic)"""
+    return 1 / (1 + math.exp(-discrimination * (ability - difficulty)))
+
+
+def adaptive_pool(snapshot):
+    """The quiz's questions an adaptive test can choose from: those graded as soon as they're answered"""
+    return tuple(question for question in snapshot.questions if question.question_type in AUTO_GRADED_QUESTION_TYPES)
+
+
+def level_cutpoints(pool):
+    """
+    Abilities at which a student is expected to answer 40% and 75% of the pool correctly,
+    so the adaptive levels line up with the score thresholds of a full placement test.
+    """
+    parameters = [item_parameters(question) for question in pool]
+
+    def expected_fraction(ability):
+        return sum(probability_correct(ability, *item) for item in parameters) / len(parameters)
+
+    cutpoints = []
+    for _, threshold in LEVEL_THRESHOLDS[:-1]:
+        low, high = ABILITY_GRID[0], ABILITY_GRID[-1]
+        for _ in range(30):
+            middle = (low + high) / 2
+            if expected_fraction(middle) < threshold:
+                low = middle
+            else:
+                high = middle
+        cutpoints.append((low + high) / 2)
+    return cutpoints
+
+
+def estimate_ability(responses):
+    """
+    Posterior over ABILITY_GRID given (discrimination, difficulty, is_correct) responses.
+    Returns the expected ability and the posterior weights.
+    """
+    total = sum(ABILITY_PRIOR)
+    posterior = [weight / total for weight in ABILITY_PRIOR]
+    for discrimination, difficulty, is_correct in responses:
+        for index, ability in enumerate(ABILITY_GRID):
+            p = probability_correct(ability, discrimination, difficulty)
+            posterior[index] *= p if is_correct else 1 - p
+        # Normalise after every answer so long tests can't underflow
+        total = sum(posterior)
+        posterior = [weight / total for weight in posterior]
+
+    return sum(ability * weight for ability, weight in zip(ABILITY_GRID, posterior)), posterior
+
+
+def posterior_sd(posterior):
+    """Standard deviation of a posterior over ABILITY_GRID"""
+    mean = sum(ability * weight for ability, weight in zip(ABILITY_GRID, posterior))
+    return math.sqrt(sum((ability - mean) ** 2 * weight for ability, weight in zip(ABILITY_GRID, posterior)))
+
+
+def predicted_sd_reduction(posterior, discrimination, difficulty):
+    """
+    How much asking a question is expected to shrink the posterior's standard deviation,
+    averaged over the chances of a right and a wrong answer.
+    """
+    probabilities = [probability_correct(ability, discrimination, difficulty) for ability in ABILITY_GRID]
+    p_correct = sum(weight * p for weight, p in zip(posterior, probabilities))
+    if p_correct <= 0 or p_correct >= 1:
+        return 0.0
+    if_correct = [weight * p / p_correct for weight, p in zip(posterior, probabilities)]
+    if_wrong = [weight * (1 - p) / (1 - p_correct) for weight, p in zip(posterior, probabilities)]
+    expected = p_correct * posterior_sd(if_correct) + (1 - p_correct) * posterior_sd(if_wrong)
+    return posterior_sd(posterior) - expected
+
+
+def level_probabilities(posterior, cutpoints):
+    """How likely the student is to be at each level, given the posterior over abilities"""
+    probabilities = dict.fromkeys((level for level, _ in LEVEL_THRESHOLDS), 0.0)
+    for ability, weight in zip(ABILITY_GRID, posterior):
+        level = LEVEL_THRESHOLDS[sum(1 for cutpoint in cutpoints if ability >= cutpoint)][0]
+        probabilities[level] += weight
+    return probabilities
+
+
+def next_adaptive_step(snapshot, asked_ids, answers, max_questions=0):
+    """
+    Decide what an adaptive placement test does next, given the IDs of the questions asked so far
+    and a {question_id: is_correct} map of the answers to them.
+    Returns an AdaptiveStep whose question is the most informative question left at the current
+    ability estimate, or None once the level is clear, the questions left can barely sharpen
+    the estimate, or there is nothing left to ask.
+    """
+    pool = adaptive_pool(snapshot)
+    if not pool:
+        return AdaptiveStep(None, None, None, 0.0)
+
+    responses = [
+        (*item_parameters(snapshot.questions_by_id[question_id]), answers[question_id])
+        for question_id in asked_ids
+        if question_id in answers and question_id in snapshot.questions_by_id
+    ]
+    ability, posterior = estimate_ability(responses)
+    probabilities = level_probabilities(posterior, level_cutpoints(pool))
+    level, confidence = max(probabilities.items(), key=lambda item: item[1])
+
+    asked = set(asked_ids)
+    remaining = [question for question in pool if question.id not in asked]
+    max_questions = min(max_questions or len(pool), len(pool))
+    confident = confidence >= ADAPTIVE_CONFIDENCE and len(asked_ids) >= ADAPTIVE_MIN_QUESTIONS
+    if confident or not remaining or len(asked_ids) >= max_questions:
+        return AdaptiveStep(None, ability, level, confidence)
+
+    def information(question):
+        discrimination, difficulty = item_parameters(question)
+        p = probability_correct(ability, discrimination, difficulty)
+        return discrimination * discrimination * p * (1 - p)
+
+    question = max(remaining, key=information)
+    # Unfitted questions all look alike, so a clear-cut student could otherwise be asked the whole pool
+    if (len(asked_ids) >= ADAPTIVE_MIN_QUESTIONS
+            and predicted_sd_reduction(posterior, *item_parameters(question)) < ADAPTIVE_MIN_SD_REDUCTION):
+        return AdaptiveStep(None, ability, level, confidence)
+
+    return AdaptiveStep(question, ability, level, confidence)
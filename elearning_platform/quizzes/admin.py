@@ -1,35 +1,91 @@
-from django.contrib import admin
-from .models import Quiz, Question, Choice, QuizAttempt, QuizAnswer, TextAnswer, FileAnswer, VoiceRecording, QuizQuestion
+from django import forms
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import path, reverse
+from .models import Quiz, Question, Choice, QuizAttempt, QuizAnswer, TextAnswer, FileAnswer, VoiceRecording, QuizQuestion, QuestionStats, ItemAnalysis
+from .snapshot import invalidate_quiz_snapshot, invalidate_quiz_snapshots
+from .transfer import QuizImportError, export_quiz, import_quiz
 
 class ChoiceInline(admin.TabularInline):
     model = Choice
     extra = 4
 
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('text', 'quiz', 'question_type', 'points', 'order')
-    list_filter = ('quiz', 'question_type')
+    list_display = ('text', 'question_type', 'points')
+    list_filter = ('quizzes', 'question_type')
     search_fields = ('text',)
     inlines = [ChoiceInline]
-
-class QuestionInline(admin.TabularInline):
-    model = Question
-    extra = 1
-    show_change_link = True
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        invalidate_quiz_snapshots(form.instance.quizzes.values_list('id', flat=True))
 
 class QuizQuestionInline(admin.TabularInline):
     model = QuizQuestion
     extra = 1
+    # A select of every question per row doesn't scale to imported question banks
+    raw_id_fields = ('question',)
     show_change_link = True
 
+class QuizImportForm(forms.Form):
+    file = forms.FileField(help_text="Newline-delimited JSON written by the quiz export")
+
 class QuizAdmin(admin.ModelAdmin):
     list_display = ('title', 'course', 'is_active', 'is_placement_test', 'max_points', 'get_question_count')
     list_filter = ('course', 'is_active', 'is_placement_test')
     search_fields = ('title', 'description')
-    inlines = [QuestionInline, QuizQuestionInline]
+    inlines = [QuizQuestionInline]
     
     def get_question_count(self, obj):
         return obj.get_question_count()
     get_question_count.short_description = 'Questions'
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        invalidate_quiz_snapshot(form.instance)
+    
+    def get_urls(self):
+        return [
+            path('<int:quiz_id>/export/', self.admin_site.admin_view(self.export_view), name='quizzes_quiz_export'),
+            path('<int:quiz_id>/import/', self.admin_site.admin_view(self.import_view), name='quizzes_quiz_import'),
+        ] + super().get_urls()
+    
+    def export_view(self, request, quiz_id):
+        """Stream the quiz's questions as an NDJSON download"""
+        quiz = get_object_or_404(Quiz, id=quiz_id)
+        if not self.has_view_permission(request, quiz):
+            return redirect('admin:index')
+        response = StreamingHttpResponse(export_quiz(quiz), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="quiz_{quiz.id}.ndjson"'
+        return response
+    
+    def import_view(self, request, quiz_id):
+        """Append the questions from an uploaded NDJSON export to the quiz"""
+        quiz = get_object_or_404(Quiz, id=quiz_id)
+        if not self.has_change_permission(request, quiz):
+            return redirect('admin:index')
+        
+        form = QuizImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                quiz, report = import_quiz(form.cleaned_data['file'], quiz=quiz)
+            except QuizImportError as e:
+                form.add_error('file', str(e))
+            else:
+                messages.success(request, (
+                    f"Imported {report['questions']} questions and {report['choices']} choices "
+                    f"in {report['seconds']:.2f}s ({report['questions_per_second']:.0f} questions/s)."
+                ))
+                return redirect(reverse('admin:quizzes_quiz_change', args=[quiz.id]))
+        
+        return render(request, 'admin/quizzes/quiz/import_questions.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'original': quiz,
+            'form': form,
+            'title': f'Import questions into {quiz}',
+        })
 
 class QuizAnswerInline(admin.TabularInline):
     model = QuizAnswer
@@ -46,10 +102,42 @@ class QuizAttemptAdmin(admin.ModelAdmin):
     readonly_fields = ('student', 'user', 'quiz', 'start_time', 'end_time', 'score', 'result', 'completed', 'status')
     inlines = [QuizAnswerInline]
 
+class QuestionStatsAdmin(admin.ModelAdmin):
+    list_display = ('question', 'quiz', 'answer_count', 'correct_count', 'get_correct_percentage', 'get_avg_time_taken')
+    list_filter = ('quiz',)
+    search_fields = ('question__text', 'quiz__title')
+    list_select_related = ('question', 'quiz')
+    readonly_fields = [field.name for field in QuestionStats._meta.fields]
+    
+    def get_correct_percentage(self, obj):
+        return round(obj.get_correct_percentage(), 1)
+    get_correct_percentage.short_description = 'Correct %'
+    
+    def get_avg_time_taken(self, obj):
+        return round(obj.get_avg_time_taken(), 1)
+    get_avg_time_taken.short_description = 'Avg time (s)'
+    
+    # Maintained by QuizAnswer.save(); use the rebuild_question_stats command to recompute
+    def has_add_permission(self, request):
+        return False
+
+class ItemAnalysisAdmin(admin.ModelAdmin):
+    list_display = ('question', 'quiz', 'respondents', 'difficulty', 'discrimination', 'analysed_at')
+    list_filter = ('quiz',)
+    search_fields = ('question__text', 'quiz__title')
+    list_select_related = ('question', 'quiz')
+    readonly_fields = [field.name for field in ItemAnalysis._meta.fields]
+    
+    # Written by the analyse_items command
+    def has_add_permission(self, request):
+        return False
+
 admin.site.register(Quiz, QuizAdmin)
 admin.site.register(Question, QuestionAdmin)
 admin.site.register(QuizQuestion)
 admin.site.register(QuizAttempt, QuizAttemptAdmin)
 admin.site.register(TextAnswer)
 admin.site.register(FileAnswer)
-admin.site.register(VoiceRecording)
\ No newline at end of file
+admin.site.register(VoiceRecording)
+admin.site.register(QuestionStats, QuestionStatsAdmin)
+admin.site.register(ItemAnalysis, ItemAnalysisAdmin)
\ No newline at end of file
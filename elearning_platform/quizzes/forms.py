@@ -1,29 +1,34 @@
 from django import forms
-from django.forms import inlineformset_factory, BaseInlineFormSet
+from django.forms import inlineformset_factory, modelformset_factory, BaseInlineFormSet, BaseModelFormSet
 from django.core.exceptions import ValidationError
-from .models import Quiz, Question, Choice, QuizAnswer, TextAnswer, FileAnswer, VoiceRecording
+from .models import Quiz, Question, QuizQuestion, Choice, QuizAnswer, TextAnswer, FileAnswer, VoiceRecording
 
 class QuizForm(forms.ModelForm):
     """Form for creating and editing quizzes"""
     
     class Meta:
         model = Quiz
-        fields = ['title', 'description', 'course', 'is_active', 'is_placement_test', 'max_points']
+        fields = ['title', 'description', 'course', 'is_active', 'is_placement_test', 'is_adaptive', 'max_points', 'draw_count']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'course': forms.Select(attrs={'class': 'form-control'}),
             'max_points': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
+            'draw_count': forms.NumberInput(attrs={'class': 'form-control', 'min': 0}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'is_placement_test': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'is_adaptive': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
 
 class QuestionForm(forms.ModelForm):
     """Form for creating and editing questions"""
+    # Stored on the question's QuizQuestion row rather than on the question itself
+    order = forms.IntegerField(min_value=0, initial=0, help_text="Order in the quiz",
+                               widget=forms.NumberInput(attrs={'class': 'form-control', 'min': 0}))
     
     class Meta:
         model = Question
-        fields = ['text', 'question_type', 'image', 'audio', 'time_limit', 'points', 'order']
+        fields = ['text', 'question_type', 'image', 'audio', 'time_limit', 'points']
         widgets = {
             'text': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'question_type': forms.Select(attrs={'class': 'form-control'}),
@@ -31,11 +36,33 @@ class QuestionForm(forms.ModelForm):
             'audio': forms.ClearableFileInput(attrs={'class': 'form-control'}),
             'time_limit': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
             'points': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
-            'order': forms.NumberInput(attrs={'class': 'form-control', 'min': 0}),
         }
 
-class BaseQuestionFormSet(BaseInlineFormSet):
-    """Base formset for questions with validation"""
+class BaseQuestionFormSet(BaseModelFormSet):
+    """Base formset for a quiz's questions with validation"""
+    
+    def __init__(self, *args, quiz, **kwargs):
+        self.quiz = quiz
+        kwargs.setdefault('queryset', quiz.questions.order_by('quizquestion__order'))
+        super().__init__(*args, **kwargs)
+        self.question_orders = dict(
+            QuizQuestion.objects.filter(quiz=quiz).values_list('question_id', 'order')
+        )
+    
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if form.instance.pk:
+            form.fields['order'].initial = self.question_orders.get(form.instance.pk, 0)
+        return form
+    
+    def save_question_order(self):
+        """Save the order of each saved question on its QuizQuestion row"""
+        for form in self.saved_forms:
+            QuizQuestion.objects.update_or_create(
+                quiz=self.quiz,
+                question=form.instance,
+                defaults={'order': form.cleaned_data.get('order') or 0}
+            )
     
     def clean(self):
         """Validate the formset as a whole"""
@@ -56,12 +83,11 @@ class BaseQuestionFormSet(BaseInlineFormSet):
             raise ValidationError("At least one question is required.")
 
 # Create the formset with proper configuration - KEEP ONLY THIS ONE DEFINITION
-QuestionFormSet = inlineformset_factory(
-    Quiz, 
+QuestionFormSet = modelformset_factory(
     Question, 
     form=QuestionForm,
     formset=BaseQuestionFormSet,
-    fields=['text', 'question_type', 'image', 'audio', 'time_limit', 'points', 'order'],
+    fields=['text', 'question_type', 'image', 'audio', 'time_limit', 'points'],
     extra=1,  # Start with one empty form
     can_delete=True,
     max_num=50,  # Set a reasonable maximum
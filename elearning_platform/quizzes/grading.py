@@ -0,0 +1,55 @@
+from .models import QuizAnswer
+
+# Question types whose answers can be graded from the quiz snapshot alone
+CHOICE_QUESTION_TYPES = ('multiple_choice', 'true_false', 'dropdown')
+
+# Question types that are graded automatically as they're answered
+AUTO_GRADED_QUESTION_TYPES = CHOICE_QUESTION_TYPES + ('multi_select',)
+
+# Question types that are stored for the teacher to grade later
+TEXT_QUESTION_TYPES = ('short_answer', 'long_answer')
+
+# Question types that need an uploaded file and can't be sent in a batch
+UPLOAD_QUESTION_TYPES = ('file_upload', 'voice_record')
+
+
+def grade_answer(snapshot, question, data):
+    """
+    Grade a submitted answer in memory against the quiz snapshot.
+    Returns an unsaved QuizAnswer and the IDs to store in selected_choices.
+    """
+    answer = QuizAnswer(question=question)
+    selected_choice_ids = []
+
+    if question.question_type in CHOICE_QUESTION_TYPES:
+        selected_choice = snapshot.get_choice(question.id, data.get('choice'))
+        if selected_choice:
+            answer.selected_choice = selected_choice
+            if selected_choice.id in snapshot.correct_choice_ids[question.id]:
+                answer.is_correct = True
+                answer.points_earned = question.points
+
+    elif question.question_type == 'multi_select':
+        for choice_id in data.get('choices') or []:
+            choice = snapshot.get_choice(question.id, choice_id)
+            if choice and choice.id not in selected_choice_ids:
+                selected_choice_ids.append(choice.id)
+
+        # Must select ALL correct choices and NO incorrect choices
+        if selected_choice_ids and set(selected_choice_ids) == snapshot.correct_choice_ids[question.id]:
+            answer.is_correct = True
+            answer.points_earned = question.points
+
+    elif question.question_type in TEXT_QUESTION_TYPES:
+        # Teacher will evaluate later
+        answer.text_answer = data.get('text_answer', '')
+
+    elif question.question_type == 'star_rating':
+        rating = data.get('rating')
+        if rating:
+            # Star ratings are always "correct" and get full points for completing
+            answer.text_answer = str(rating)
+            answer.is_correct = True
+            answer.points_earned = question.points
+
+    return answer, selected_choice_ids
@@ -0,0 +1,166 @@
+import time
+from itertools import chain
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from quizzes.models import Choice, ItemAnalysis, Quiz, QuizAnswer, QuizAttempt, QuizQuestion
+
+
+def _masked_correlation(scores, rest, mask):
+    """Column-wise correlation of scores with rest, counting only the cells where mask is set"""
+    counts = mask.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score_means = (scores * mask).sum(axis=0) / counts
+        rest_means = (rest * mask).sum(axis=0) / counts
+        score_deviations = (scores - score_means) * mask
+        rest_deviations = (rest - rest_means) * mask
+        covariance = (score_deviations * rest_deviations).sum(axis=0)
+        spread = np.sqrt((score_deviations ** 2).sum(axis=0) * (rest_deviations ** 2).sum(axis=0))
+        return np.where(spread > 0, covariance / spread, np.nan)
+
+
+def analyse_score_matrix(scores, asked):
+    """
+    Classical item analysis of a students x questions matrix of scores from 0 to 1,
+    where asked marks the questions each student was given.
+    Returns per-question difficulty and corrected point-biserial discrimination, and Cronbach's alpha
+    over the students who were asked every question (None if there aren't enough of them).
+    """
+    scores = np.where(asked, scores, 0.0)
+    respondents = asked.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        difficulty = scores.sum(axis=0) / respondents
+
+    # Each item is correlated with the score on the other items, so it doesn't inflate its own discrimination
+    rest = scores.sum(axis=1, keepdims=True) - scores
+    discrimination = _masked_correlation(scores, rest, asked)
+
+    complete = scores[asked.all(axis=1)]
+    alpha = None
+    if complete.shape[0] >= 2 and complete.shape[1] >= 2:
+        total_variance = complete.sum(axis=1).var(ddof=1)
+        if total_variance > 0:
+            item_count = complete.shape[1]
+            alpha = item_count / (item_count - 1) * (1 - complete.var(axis=0, ddof=1).sum() / total_variance)
+
+    return respondents, difficulty, discrimination, alpha
+
+
+class Command(BaseCommand):
+    help = ("Compute item difficulty, discrimination, distractor frequencies and Cronbach's alpha "
+            "for quizzes from their finished attempts")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Analyse this quiz ID')
+        parser.add_argument('--course', type=int, help='Analyse every quiz in this course ID')
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if not options['quiz'] and not options['course']:
+            raise CommandError("Pass --quiz or --course.")
+
+        quizzes = Quiz.objects.all()
+        if options['quiz']:
+            quizzes = quizzes.filter(id=options['quiz'])
+        if options['course']:
+            quizzes = quizzes.filter(course_id=options['course'])
+        if not quizzes:
+            raise CommandError("No matching quizzes.")
+
+        for quiz in quizzes:
+            started = time.monotonic()
+            analysed = self.analyse_quiz(quiz, options['chunk_size'])
+            if analysed is None:
+                self.stdout.write(f"{quiz.title}: no finished attempts to analyse.")
+                continue
+            answers, students, alpha = analysed
+            alpha_text = f"{alpha:.2f}" if alpha is not None else "n/a"
+            self.stdout.write(self.style.SUCCESS(
+                f"{quiz.title}: analysed {answers} answers from {students} attempts "
+                f"in {time.monotonic() - started:.2f}s (alpha {alpha_text})."
+            ))
+
+    def analyse_quiz(self, quiz, chunk_size):
+        """Load the quiz's finished attempts into NumPy arrays, analyse them and store the results"""
+        question_ids = np.array(sorted(
+            QuizQuestion.objects.filter(quiz=quiz).values_list('question_id', flat=True)
+        ), dtype=np.int64)
+        points = dict(QuizQuestion.objects.filter(quiz=quiz).values_list('question_id', 'question__points'))
+        attempts = QuizAttempt.objects.filter(quiz=quiz, completed=True)
+        attempt_ids = np.array(sorted(attempts.values_list('id', flat=True)), dtype=np.int64)
+        if not len(attempt_ids) or not len(question_ids):
+            return None
+
+        # Attempts that drew their own questions were only asked those; everyone else was asked everything
+        asked = np.ones((len(attempt_ids), len(question_ids)), dtype=bool)
+        for attempt_id, drawn in attempts.exclude(question_ids=b'').values_list('id', 'question_ids').iterator():
+            row = np.searchsorted(attempt_ids, attempt_id)
+            asked[row] = np.isin(question_ids, np.frombuffer(bytes(drawn), dtype=np.uint32))
+
+        answers = QuizAnswer.objects.filter(quiz_attempt__in=attempts, question_id__in=question_ids.tolist())
+        count = answers.count()
+        rows = np.fromiter(
+            chain.from_iterable(answers.values_list(
+                'quiz_attempt_id', 'question_id', 'points_earned', Coalesce('selected_choice_id', Value(0))
+            ).order_by().iterator(chunk_size=chunk_size)),
+            dtype=np.int64, count=count * 4
+        ).reshape(-1, 4)
+
+        students = np.searchsorted(attempt_ids, rows[:, 0])
+        items = np.searchsorted(question_ids, rows[:, 1])
+        question_points = np.array([points[question_id] for question_id in question_ids.tolist()], dtype=float)
+        scores = np.zeros(asked.shape)
+        scores[students, items] = np.clip(rows[:, 2] / question_points[items], 0, 1)
+
+        respondents, difficulty, discrimination, alpha = analyse_score_matrix(scores, asked)
+
+        # Distractor frequencies: single selections plus every choice ticked on multi-select answers
+        SelectedChoice = QuizAnswer.selected_choices.through
+        picked = np.concatenate([
+            rows[:, 3][rows[:, 3] > 0],
+            np.fromiter(
+                SelectedChoice.objects.filter(quizanswer__in=answers).values_list('choice_id', flat=True).iterator(
+                    chunk_size=chunk_size
+                ),
+                dtype=np.int64
+            ),
+        ])
+        choice_ids, choice_totals = np.unique(picked, return_counts=True)
+        picked_counts = dict(zip(choice_ids.tolist(), choice_totals.tolist()))
+        choice_counts = {int(question_id): {} for question_id in question_ids}
+        for choice_id, question_id in Choice.objects.filter(question_id__in=question_ids.tolist()).values_list(
+            'id', 'question_id'
+        ):
+            choice_counts[question_id][str(choice_id)] = picked_counts.get(choice_id, 0)
+
+        def stored(value):
+            return None if np.isnan(value) else round(float(value), 4)
+
+        now = timezone.now()
+        analyses = [
+            ItemAnalysis(
+                quiz=quiz,
+                question_id=int(question_id),
+                respondents=int(respondents[index]),
+                difficulty=stored(difficulty[index]),
+                discrimination=stored(discrimination[index]),
+                choice_counts=choice_counts[int(question_id)],
+                analysed_at=now,
+            )
+            for index, question_id in enumerate(question_ids)
+        ]
+
+        # Swap the rows in one transaction so quiz_detail never shows a half-written analysis
+        with transaction.atomic():
+            ItemAnalysis.objects.filter(quiz=quiz).delete()
+            ItemAnalysis.objects.bulk_create(analyses)
+            Quiz.objects.filter(id=quiz.id).update(
+                reliability=None if alpha is None else round(float(alpha), 4), analysed_at=now
+            )
+
+        return count, len(attempt_ids), alpha
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from quizzes.models import Quiz
+
+
+class Command(BaseCommand):
+    help = "Check the stored question aggregates on quizzes against their questions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only check this quiz ID')
+        parser.add_argument('--fix', action='store_true', help='Store the recomputed aggregates where they differ')
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.only('id', 'title', 'total_points', 'question_count', 'total_time_seconds')
+        if options['quiz']:
+            quizzes = quizzes.filter(id=options['quiz'])
+
+        checked = 0
+        mismatched = 0
+
+        for quiz in quizzes.iterator():
+            checked += 1
+            expected = quiz.calculate_aggregates()
+            stored = {field: getattr(quiz, field) for field in expected}
+            if stored == expected:
+                continue
+
+            mismatched += 1
+            self.stdout.write(f"Quiz {quiz.id} ({quiz.title}): stored {stored}, expected {expected}")
+            if options['fix']:
+                quiz.refresh_aggregates()
+
+        summary = f"Checked {checked} quizzes, {mismatched} out of date"
+        if options['fix'] and mismatched:
+            self.stdout.write(self.style.SUCCESS(f"{summary}, all fixed."))
+        else:
+            self.stdout.write(f"{summary}.")
@@ -0,0 +1,60 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from courses.models import CourseProgress, adjust_course_progress
+from quizzes.models import QuizAttempt, attempt_result_expression, attempt_score_expression
+from quizzes.navigation import invalidate_attempt_states
+from quizzes.timer import invalidate_attempt_timers
+
+
+def expire_overdue_attempts(now=None):
+    """
+    Close every open attempt whose deadline has passed with a single UPDATE,
+    scoring it from its running totals the same way QuizAttempt.complete() does.
+    The UPDATE skips save() and the post_save signal, so the attempts' cached timer and navigation
+    state are dropped and the students' course progress is adjusted here.
+    Returns the number of attempts expired.
+    """
+    now = now or timezone.now()
+    score = attempt_score_expression()
+    with transaction.atomic():
+        overdue = list(QuizAttempt.objects.select_for_update(of=('self',)).filter(
+            status='in_progress', deadline__lte=now
+        ).values_list('id', 'student_id', 'quiz__course_id'))
+        expired = QuizAttempt.objects.filter(id__in=[attempt_id for attempt_id, _, _ in overdue]).update(
+            status='timed_out',
+            completed=True,
+            end_time=now,
+            score=score,
+            result=attempt_result_expression(score),
+        )
+        finished = Counter((student_id, course_id) for _, student_id, course_id in overdue)
+        for (student_id, course_id), count in finished.items():
+            adjust_course_progress(CourseProgress.objects.filter(user_id=student_id, course_id=course_id), count)
+
+    # Only once committed, so a request in between can't cache the attempts as still open
+    expired_ids = [attempt_id for attempt_id, _, _ in overdue]
+    invalidate_attempt_timers(expired_ids)
+    invalidate_attempt_states(expired_ids)
+    return expired
+
+
+class Command(BaseCommand):
+    help = "Close quiz attempts whose deadline has passed, scoring them from their running totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, sweeping every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_overdue_attempts()
+            self.stdout.write(f"Expired {expired} overdue quiz attempts.")
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
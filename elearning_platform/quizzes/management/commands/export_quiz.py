@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.models import Quiz
+from quizzes.transfer import export_quiz
+
+
+class Command(BaseCommand):
+    help = "Export a quiz's questions and choices as newline-delimited JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz', type=int, help='ID of the quiz to export')
+        parser.add_argument('--output', help='File to write to (defaults to stdout)')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            quiz = Quiz.objects.get(id=options['quiz'])
+        except Quiz.DoesNotExist as e:
+            raise CommandError(str(e))
+
+        started = time.monotonic()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                questions = self.write_export(quiz, output.write, options['chunk_size'])
+        else:
+            questions = self.write_export(quiz, lambda line: self.stdout.write(line, ending=''), options['chunk_size'])
+
+        # Report on stderr so the export itself can be piped from stdout
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {questions} questions in {elapsed:.2f}s "
+            f"({questions / elapsed if elapsed else 0:.0f} questions/s)."
+        ))
+
+    def write_export(self, quiz, write, chunk_size):
+        """Write the export line by line and return how many questions it held"""
+        lines = 0
+        for line in export_quiz(quiz, chunk_size=chunk_size):
+            write(line)
+            lines += 1
+        # The first line is the quiz itself
+        return lines - 1
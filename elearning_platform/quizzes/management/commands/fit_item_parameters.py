@@ -0,0 +1,120 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from quizzes.grading import AUTO_GRADED_QUESTION_TYPES
+from quizzes.models import Question, QuizAnswer, QuizQuestion
+from quizzes.snapshot import invalidate_quiz_snapshots
+
+# Bounds on the fitted parameters, so a handful of unusual answers can't produce extreme items
+DISCRIMINATION_RANGE = (0.2, 4.0)
+DIFFICULTY_RANGE = (-4.0, 4.0)
+
+# Largest change to any parameter in one Newton step, which keeps the joint fit from oscillating
+MAX_STEP = 1.0
+
+
+def fit_two_parameter_logistic(students, items, correct, iterations=100):
+    """
+    Jointly fit student abilities and item discriminations and difficulties to a set of
+    (student index, item index, correct) responses. Each round takes a damped diagonal Newton
+    step on the log posterior for the abilities, then the difficulties, then the discriminations;
+    weak priors keep items everyone got right or wrong finite.
+    Abilities are put on a mean 0, standard deviation 1 scale. Returns (discrimination, difficulty).
+    """
+    student_count, item_count = students.max() + 1, items.max() + 1
+    ability = np.zeros(student_count)
+    difficulty = np.zeros(item_count)
+    log_discrimination = np.zeros(item_count)
+
+    def responses():
+        a = np.exp(log_discrimination)[items]
+        distance = ability[students] - difficulty[items]
+        p = 1 / (1 + np.exp(-a * distance))
+        return a, distance, correct - p, p * (1 - p)
+
+    def step(gradient, curvature):
+        return np.clip(gradient / curvature, -MAX_STEP, MAX_STEP)
+
+    for _ in range(iterations):
+        # Standard normal prior on ability
+        a, distance, residual, information = responses()
+        ability += step(
+            np.bincount(students, residual * a, student_count) - ability,
+            np.bincount(students, information * a * a, student_count) + 1
+        )
+
+        # Normal prior on difficulty (sd 2)
+        a, distance, residual, information = responses()
+        difficulty += step(
+            np.bincount(items, -residual * a, item_count) - difficulty / 4,
+            np.bincount(items, information * a * a, item_count) + 1 / 4
+        )
+
+        # Log-normal prior on discrimination (sd 0.5)
+        a, distance, residual, information = responses()
+        log_discrimination += step(
+            np.bincount(items, residual * a * distance, item_count) - log_discrimination * 4,
+            np.bincount(items, information * (a * distance) ** 2, item_count) + 4
+        )
+
+    # Abilities are only identified up to scale, so express the items on the students' scale
+    mean, spread = ability.mean(), ability.std() or 1
+    discrimination = np.clip(np.exp(log_discrimination) * spread, *DISCRIMINATION_RANGE)
+    difficulty = np.clip((difficulty - mean) / spread, *DIFFICULTY_RANGE)
+    return discrimination, difficulty
+
+
+class Command(BaseCommand):
+    help = "Fit item response parameters for auto-graded questions from answers to finished attempts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help="Only fit the questions in this quiz ID, from its attempts")
+        parser.add_argument('--min-answers', type=int, default=30,
+                            help="Leave questions with fewer answers than this unchanged")
+        parser.add_argument('--iterations', type=int, default=100)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        answers = QuizAnswer.objects.filter(
+            quiz_attempt__completed=True, question__question_type__in=AUTO_GRADED_QUESTION_TYPES
+        )
+        if options['quiz']:
+            answers = answers.filter(quiz_attempt__quiz_id=options['quiz'])
+
+        rows = np.array(list(answers.values_list('quiz_attempt_id', 'question_id', 'is_correct').iterator()),
+                        dtype=np.int64).reshape(-1, 3)
+        if not len(rows):
+            self.stdout.write("No answers to fit.")
+            return
+
+        student_ids, students = np.unique(rows[:, 0], return_inverse=True)
+        question_ids, items = np.unique(rows[:, 1], return_inverse=True)
+        discrimination, difficulty = fit_two_parameter_logistic(
+            students, items, rows[:, 2].astype(float), options['iterations']
+        )
+
+        answer_counts = np.bincount(items, minlength=len(question_ids))
+        fitted = {
+            int(question_id): (float(discrimination[index]), float(difficulty[index]))
+            for index, question_id in enumerate(question_ids)
+            if answer_counts[index] >= options['min_answers']
+        }
+
+        questions = list(Question.objects.filter(id__in=fitted))
+        for question in questions:
+            question.discrimination, question.difficulty = fitted[question.id]
+
+        with transaction.atomic():
+            Question.objects.bulk_update(questions, ['discrimination', 'difficulty'], batch_size=1000)
+            # Adaptive tests read the parameters from the quiz snapshots
+            invalidate_quiz_snapshots(
+                QuizQuestion.objects.filter(question_id__in=fitted).values_list('quiz_id', flat=True)
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Fitted {len(questions)} of {len(question_ids)} questions from {len(rows)} answers "
+            f"by {len(student_ids)} attempts in {time.monotonic() - started:.2f}s."
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Course
+from quizzes.models import Quiz
+from quizzes.transfer import QuizImportError, import_quiz
+
+
+class Command(BaseCommand):
+    help = "Import questions and choices from a newline-delimited JSON quiz export"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON file written by export_quiz')
+        parser.add_argument('--quiz', type=int, help='Append the questions to this quiz ID')
+        parser.add_argument('--course', type=int, help='Create a new quiz in this course ID')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if bool(options['quiz']) == bool(options['course']):
+            raise CommandError("Pass either --quiz or --course.")
+
+        try:
+            quiz = Quiz.objects.get(id=options['quiz']) if options['quiz'] else None
+            course = Course.objects.get(id=options['course']) if options['course'] else None
+        except (Quiz.DoesNotExist, Course.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        try:
+            with open(options['path'], encoding='utf-8') as lines:
+                quiz, report = import_quiz(lines, quiz=quiz, course=course, batch_size=options['batch_size'])
+        except (OSError, QuizImportError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['questions']} questions and {report['choices']} choices into "
+            f"\"{quiz.title}\" (ID {quiz.id}) in {report['seconds']:.2f}s "
+            f"({report['questions_per_second']:.0f} questions/s)."
+        ))
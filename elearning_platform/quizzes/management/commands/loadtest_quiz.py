@@ -0,0 +1,271 @@
+import json
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.client import HTTPConnection
+from importlib import import_module
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection, connections
+from django.urls import Resolver404, resolve, reverse
+
+from accounts.models import PaymentProof, StudentProfile, User
+from courses.models import Course
+from quizzes.models import Choice
+from quizzes.transfer import import_quiz
+
+CHOICES_PER_QUESTION = 4
+ATTEMPT_URL_PATTERN = re.compile(r'/attempt/(\d+)/')
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    rank = max(1, round(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class QueryCountingApplication:
+    """Wrap a WSGI application to count each request's database queries by URL name"""
+
+    def __init__(self, application):
+        self.application = application
+        self.lock = threading.Lock()
+        self.queries = defaultdict(list)
+
+    def __call__(self, environ, start_response):
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        # The server runs each request in its own thread, with its own connection
+        with connection.execute_wrapper(counter):
+            response = self.application(environ, start_response)
+        try:
+            url_name = resolve(environ['PATH_INFO']).url_name
+        except Resolver404:
+            url_name = None
+        with self.lock:
+            self.queries[url_name].append(count)
+        return response
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class StudentClient:
+    """One simulated student with their own cookies, recording (url name, status, seconds) for every request"""
+
+    def __init__(self, address, session_key, results):
+        self.address = address
+        self.cookies = {settings.SESSION_COOKIE_NAME: session_key}
+        self.results = results
+
+    def request(self, url_name, method, path, data=None):
+        headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in self.cookies.items())}
+        body = None
+        if data is not None:
+            body = urlencode({**data, 'csrfmiddlewaretoken': self.cookies.get(settings.CSRF_COOKIE_NAME, '')})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        conn = HTTPConnection(*self.address, timeout=60)
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except OSError:
+            response = None
+        finally:
+            conn.close()
+        self.results.append((url_name, response.status if response else 0, time.perf_counter() - started))
+
+        if response is not None:
+            for header, value in response.getheaders():
+                if header.lower() == 'set-cookie':
+                    name, _, rest = value.partition('=')
+                    self.cookies[name.strip()] = rest.split(';', 1)[0]
+        return response
+
+    def poll_timer(self, attempt_id, interval, stop):
+        path = reverse('get_timer', args=[attempt_id])
+        while not stop.wait(interval):
+            self.request('get_timer', 'GET', path)
+
+    def take_quiz(self, quiz_id, answer_choices, poll_interval=0, think_time=0):
+        """start_quiz, a take_quiz GET and POST for every question, then quiz_results"""
+        response = self.request('start_quiz', 'GET', reverse('start_quiz', args=[quiz_id]))
+        match = ATTEMPT_URL_PATTERN.search(response.getheader('Location', '')) if response else None
+        if not match:
+            return
+        attempt_id = int(match.group(1))
+
+        stop = threading.Event()
+        poller = None
+        if poll_interval:
+            poller = threading.Thread(target=self.poll_timer, args=(attempt_id, poll_interval, stop), daemon=True)
+            poller.start()
+
+        try:
+            take_url = reverse('take_quiz', args=[attempt_id])
+            for number, choice_id in enumerate(answer_choices, start=1):
+                self.request('take_quiz', 'GET', f'{take_url}?question={number}')
+                if think_time:
+                    time.sleep(think_time)
+                self.request('take_quiz', 'POST', f'{take_url}?question={number}', {
+                    'choice': choice_id, 'submission_token': uuid.uuid4().hex
+                })
+            self.request('quiz_results', 'GET', reverse('quiz_results', args=[attempt_id]))
+        finally:
+            stop.set()
+            if poller:
+                poller.join()
+
+
+class Command(BaseCommand):
+    help = ("Simulate an exam spike end to end: seed a course, a quiz and students with bulk inserts, start a "
+            "local server and have the students take the quiz concurrently while polling get_timer. "
+            "Reports throughput, latency percentiles and queries per request for each URL name. "
+            "Runs against the configured database, so point it at SQLite or a local PostgreSQL, never production.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=50)
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--concurrency', type=int, default=10, help='Students taking the quiz at once')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help="Seconds between each student's get_timer polls; 0 turns polling off")
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Seconds each student spends on a question before answering it')
+        parser.add_argument('--port', type=int, default=0, help='Port for the local server; 0 picks a free one')
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded course, quiz and students")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        course, quiz, students, answer_choices = self.seed(
+            uuid.uuid4().hex[:8], options['students'], options['questions']
+        )
+        session_keys = self.create_sessions(students)
+        self.stdout.write(f"Seeded {len(students)} students and {len(answer_choices)} questions "
+                          f"in {time.perf_counter() - started:.2f}s.")
+
+        application = QueryCountingApplication(get_internal_wsgi_application())
+        server = ThreadedWSGIServer(('127.0.0.1', options['port']), QuietRequestHandler)
+        server.set_app(application)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.stdout.write(f"Running {len(students)} students, {options['concurrency']} at a time, "
+                          f"against http://{server.server_address[0]}:{server.server_address[1]}/")
+
+        results = []
+
+        def run_student(session_key):
+            StudentClient(server.server_address, session_key, results).take_quiz(
+                quiz.id, answer_choices, options['poll_interval'], options['think_time']
+            )
+
+        load_started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                list(executor.map(run_student, session_keys))
+        finally:
+            elapsed = time.perf_counter() - load_started
+            server.shutdown()
+            server.server_close()
+            connections.close_all()
+
+            if not options['keep']:
+                self.clean_up(course, students, session_keys)
+
+        self.report(results, application.queries, elapsed)
+
+    def seed(self, run, student_count, question_count):
+        """Create the course, quiz and enrolled students, returning the correct choice for each question"""
+        course = Course.objects.create(
+            title=f'Load test {run}', slug=f'load-test-{run}', description='Load test', placement_test_price=0
+        )
+        lines = [json.dumps({'type': 'quiz', 'title': f'Load test {run}', 'time_limit': 60})] + [
+            json.dumps({
+                'type': 'question',
+                'text': f'Question {number}',
+                'question_type': 'multiple_choice',
+                'time_limit': 600,
+                'choices': [
+                    {'text': f'Choice {index}', 'is_correct': index == 0} for index in range(CHOICES_PER_QUESTION)
+                ],
+            })
+            for number in range(question_count)
+        ]
+        quiz, _ = import_quiz(lines, course=course)
+
+        # Every student answers every question correctly, so each attempt does the same work
+        correct = dict(Choice.objects.filter(
+            question__quizquestion__quiz=quiz, is_correct=True
+        ).values_list('question__quizquestion__order', 'id'))
+        answer_choices = [correct[order] for order in sorted(correct)]
+
+        password = make_password(None)
+        students = User.objects.bulk_create([
+            User(username=f'loadtest-{run}-{index}', user_type='student', password=password)
+            for index in range(student_count)
+        ])
+        StudentProfile.objects.bulk_create([StudentProfile(user=student) for student in students])
+        PaymentProof.objects.bulk_create([
+            PaymentProof(user=student, course=course, proof_image='payment_proofs/loadtest.png', status='approved')
+            for student in students
+        ])
+        return course, quiz, students, answer_choices
+
+    def create_sessions(self, students):
+        """Log every student in by creating their session directly, as the test client's force_login does"""
+        SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+        session_keys = []
+        for student in students:
+            session = SessionStore()
+            session[SESSION_KEY] = student._meta.pk.value_to_string(student)
+            session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+            session[HASH_SESSION_KEY] = student.get_session_auth_hash()
+            session.set_expiry(timedelta(hours=1))
+            session.create()
+            session_keys.append(session.session_key)
+        return session_keys
+
+    def clean_up(self, course, students, session_keys):
+        SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+        for session_key in session_keys:
+            SessionStore(session_key).delete()
+        User.objects.filter(id__in=[student.id for student in students]).delete()
+        course.delete()
+
+    def report(self, results, queries, elapsed):
+        by_url = defaultdict(list)
+        for url_name, status, seconds in results:
+            by_url[url_name].append((status, seconds))
+
+        self.stdout.write(f"\n{len(results)} requests in {elapsed:.2f}s ({len(results) / elapsed:.1f} req/s)\n")
+        self.stdout.write(f"{'URL name':<16}{'requests':>9}{'errors':>8}{'req/s':>8}"
+                          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+        for url_name in sorted(by_url):
+            statuses = [status for status, _ in by_url[url_name]]
+            latencies = sorted(seconds * 1000 for _, seconds in by_url[url_name])
+            errors = sum(1 for status in statuses if not status or status >= 400)
+            counts = queries.get(url_name)
+            query_text = f"{sum(counts) / len(counts):.1f}" if counts else '-'
+            self.stdout.write(
+                f"{url_name:<16}{len(statuses):>9}{errors:>8}{len(statuses) / elapsed:>8.1f}"
+                f"{percentile(latencies, 50):>9.1f}{percentile(latencies, 95):>9.1f}{percentile(latencies, 99):>9.1f}"
+                f"{query_text:>9}"
+            )
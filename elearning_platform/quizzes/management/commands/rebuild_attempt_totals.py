@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q, Sum
+
+from quizzes.models import Quiz, QuizAttempt
+
+
+class Command(BaseCommand):
+    help = "Backfill or verify the running score totals stored on quiz attempts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only process attempts for this quiz ID')
+        parser.add_argument('--verify', action='store_true',
+                            help='Report attempts whose totals have drifted without fixing them')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        attempts = QuizAttempt.objects.annotate(
+            answer_points=Sum('answers__points_earned'),
+            answer_count=Count('answers'),
+            answer_correct=Count('answers', filter=Q(answers__is_correct=True)),
+        ).only('id', 'quiz_id', 'points_earned', 'answered_count', 'correct_count', 'max_points').order_by('id')
+
+        if options['quiz']:
+            attempts = attempts.filter(quiz_id=options['quiz'])
+
+        quiz_totals = {}
+        checked = 0
+        fixed = 0
+        drifted = []
+
+        for attempt in attempts.iterator(chunk_size=options['batch_size']):
+            checked += 1
+            expected = (attempt.answer_points or 0, attempt.answer_count, attempt.answer_correct)
+            actual = (attempt.points_earned, attempt.answered_count, attempt.correct_count)
+            changed = expected != actual
+
+            # Attempts from before max_points existed are scored against the quiz's current total
+            if not attempt.max_points:
+                if attempt.quiz_id not in quiz_totals:
+                    quiz_totals[attempt.quiz_id] = Quiz.objects.get(id=attempt.quiz_id).get_total_points()
+                attempt.max_points = quiz_totals[attempt.quiz_id]
+                changed = changed or bool(attempt.max_points)
+
+            if changed:
+                attempt.points_earned, attempt.answered_count, attempt.correct_count = expected
+                drifted.append(attempt)
+                fixed += 1
+
+            if not options['verify'] and len(drifted) >= options['batch_size']:
+                self._write(drifted)
+                drifted = []
+
+        if options['verify']:
+            for attempt in drifted:
+                self.stdout.write(f"Attempt {attempt.id}: totals out of date")
+            self.stdout.write(f"Checked {checked} attempts, {fixed} out of date.")
+            return
+
+        self._write(drifted)
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} attempts, rebuilt totals on {fixed}."))
+
+    def _write(self, attempts):
+        QuizAttempt.objects.bulk_update(
+            attempts, ['points_earned', 'answered_count', 'correct_count', 'max_points']
+        )
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from quizzes.models import QuizAnswer, QuizQuestion, QuestionStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-question answer statistics from the stored quiz answers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only rebuild stats for this quiz ID')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        answers = QuizAnswer.objects.all()
+        quiz_questions = QuizQuestion.objects.all()
+        existing = QuestionStats.objects.all()
+        if options['quiz']:
+            answers = answers.filter(quiz_attempt__quiz_id=options['quiz'])
+            quiz_questions = quiz_questions.filter(quiz_id=options['quiz'])
+            existing = existing.filter(quiz_id=options['quiz'])
+
+        full_points = Q(points_earned__gt=0, points_earned__gte=F('question__points'))
+        rows = answers.values('quiz_attempt__quiz_id', 'question_id').annotate(
+            answers=Count('id'),
+            correct=Count('id', filter=Q(is_correct=True)),
+            time_sum=Sum('time_taken'),
+            time_squares_sum=Sum(F('time_taken') * F('time_taken')),
+            points=Sum('points_earned'),
+            no_points=Count('id', filter=Q(points_earned=0)),
+            full=Count('id', filter=full_points),
+        ).order_by()
+
+        # Every question in a quiz has a row, even before it has been answered
+        stats = {
+            pair: QuestionStats(quiz_id=pair[0], question_id=pair[1])
+            for pair in quiz_questions.values_list('quiz_id', 'question_id')
+        }
+        for row in rows:
+            stats[row['quiz_attempt__quiz_id'], row['question_id']] = QuestionStats(
+                quiz_id=row['quiz_attempt__quiz_id'],
+                question_id=row['question_id'],
+                answer_count=row['answers'],
+                correct_count=row['correct'],
+                time_taken_sum=row['time_sum'] or 0,
+                time_taken_squares_sum=row['time_squares_sum'] or 0,
+                points_sum=row['points'] or 0,
+                no_points_count=row['no_points'],
+                partial_points_count=row['answers'] - row['no_points'] - row['full'],
+                full_points_count=row['full'],
+            )
+
+        # Swap the rows in one transaction so readers never see a half-built table
+        with transaction.atomic():
+            existing.delete()
+            QuestionStats.objects.bulk_create(stats.values(), batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {len(stats)} questions."))
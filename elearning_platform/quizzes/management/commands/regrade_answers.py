@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.models import Question, Quiz
+from quizzes.regrade import regrade_answers
+
+
+class Command(BaseCommand):
+    help = "Regrade auto-graded answers against the current answer key and re-score the affected attempts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Regrade every question in this quiz ID')
+        parser.add_argument('--question', type=int, help='Regrade only this question ID')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['quiz'] and not options['question']:
+            raise CommandError("Pass --quiz and/or --question.")
+
+        try:
+            quiz = Quiz.objects.get(id=options['quiz']) if options['quiz'] else None
+            question = Question.objects.get(id=options['question']) if options['question'] else None
+        except (Quiz.DoesNotExist, Question.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        report = regrade_answers(quiz=quiz, question=question, batch_size=options['batch_size'])
+        self.stdout.write(
+            f"Checked {report['answers_checked']} answers: {report['answers_changed']} changed "
+            f"({report['newly_correct']} now correct, {report['newly_incorrect']} now incorrect)."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-scored {report['attempts_rescored']} attempts, {report['results_changed']} results changed."
+        ))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0007_quizquestion_alter_quizattempt_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='quiz',
+            options={},
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='snapshot_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Bumped whenever the quiz's questions or choices change"),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0008_quiz_snapshot_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizanswer',
+            name='answered_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
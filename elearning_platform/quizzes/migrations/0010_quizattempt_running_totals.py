@@ -0,0 +1,64 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:36
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_attempt_totals(apps, schema_editor):
+    Quiz = apps.get_model('quizzes', 'Quiz')
+    Question = apps.get_model('quizzes', 'Question')
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+
+    # Existing attempts are scored against the quiz's total when the columns are added
+    quiz_totals = {}
+    for quiz in Quiz.objects.all():
+        direct = Question.objects.filter(quiz_id=quiz.id).aggregate(total=Sum('points'))['total']
+        through = Question.objects.filter(quizquestion__quiz_id=quiz.id).aggregate(total=Sum('points'))['total']
+        quiz_totals[quiz.id] = max(direct or 0, through or 0)
+
+    attempts = QuizAttempt.objects.annotate(
+        answer_points=Sum('answers__points_earned'),
+        answer_count=Count('answers'),
+        answer_correct=Count('answers', filter=Q(answers__is_correct=True)),
+    ).order_by('id')
+    changed = []
+    for attempt in attempts.iterator(chunk_size=1000):
+        attempt.points_earned = attempt.answer_points or 0
+        attempt.answered_count = attempt.answer_count
+        attempt.correct_count = attempt.answer_correct
+        attempt.max_points = quiz_totals.get(attempt.quiz_id, 0)
+        changed.append(attempt)
+    QuizAttempt.objects.bulk_update(
+        changed, ['points_earned', 'answered_count', 'correct_count', 'max_points'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0009_quizanswer_answered_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='answered_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='correct_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='max_points',
+            field=models.PositiveIntegerField(default=0, help_text='Total points of the quiz when the attempt started'),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='points_earned',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_attempt_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:37
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_quiz_aggregates(apps, schema_editor):
+    Quiz = apps.get_model('quizzes', 'Quiz')
+    Question = apps.get_model('quizzes', 'Question')
+    aggregates = {'total': Sum('points'), 'count': Count('id'), 'seconds': Sum('time_limit')}
+
+    for quiz in Quiz.objects.all():
+        direct = Question.objects.filter(quiz_id=quiz.id).aggregate(**aggregates)
+        through = Question.objects.filter(quizquestion__quiz_id=quiz.id).aggregate(**aggregates)
+        quiz.total_points = max(direct['total'] or 0, through['total'] or 0)
+        quiz.question_count = max(direct['count'], through['count'])
+        quiz.total_time_seconds = max(direct['seconds'] or 0, through['seconds'] or 0)
+        quiz.save(update_fields=['total_points', 'question_count', 'total_time_seconds'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0010_quizattempt_running_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='total_points',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='total_time_seconds',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_quiz_aggregates, migrations.RunPython.noop),
+    ]
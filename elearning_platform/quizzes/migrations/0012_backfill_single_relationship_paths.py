@@ -0,0 +1,56 @@
+from django.db import migrations
+from django.db.models import Q
+
+
+def backfill_single_relationship_paths(apps, schema_editor):
+    """
+    Move everything onto QuizQuestion for quiz membership and onto
+    quiz_attempt/question for answers, ahead of dropping the duplicate columns.
+    """
+    Question = apps.get_model('quizzes', 'Question')
+    QuizQuestion = apps.get_model('quizzes', 'QuizQuestion')
+    QuizAnswer = apps.get_model('quizzes', 'QuizAnswer')
+
+    # Every directly linked question gets a QuizQuestion row, and the direct
+    # relationship's order wins, as it did in get_quiz_questions
+    for question in Question.objects.filter(quiz__isnull=False).only('id', 'quiz_id', 'order'):
+        quiz_question, created = QuizQuestion.objects.get_or_create(
+            quiz_id=question.quiz_id,
+            question_id=question.id,
+            defaults={'order': question.order}
+        )
+        if not created and quiz_question.order != question.order:
+            quiz_question.order = question.order
+            quiz_question.save(update_fields=['order'])
+
+    # Answers saved through the old field patterns
+    legacy_answers = QuizAnswer.objects.filter(
+        Q(quiz_attempt__isnull=True) | Q(question__isnull=True)
+    ).select_related('quiz_question').order_by('id')
+
+    for answer in legacy_answers:
+        attempt_id = answer.quiz_attempt_id or answer.attempt_id
+        question_id = answer.question_id or (answer.quiz_question.question_id if answer.quiz_question else None)
+
+        # Answers that can't be tied to an attempt and a question can't be shown or scored,
+        # and the four partial constraints allowed the same answer to be stored once per pattern
+        if not attempt_id or not question_id or QuizAnswer.objects.filter(
+            quiz_attempt_id=attempt_id, question_id=question_id
+        ).exclude(id=answer.id).exists():
+            answer.delete()
+            continue
+
+        answer.quiz_attempt_id = attempt_id
+        answer.question_id = question_id
+        answer.save(update_fields=['quiz_attempt', 'question'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0011_quiz_stored_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_single_relationship_paths, migrations.RunPython.noop),
+    ]
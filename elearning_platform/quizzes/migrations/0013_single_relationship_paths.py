@@ -0,0 +1,85 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0012_backfill_single_relationship_paths'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='question',
+            options={'ordering': ['created_at']},
+        ),
+        migrations.RemoveConstraint(
+            model_name='quizanswer',
+            name='unique_attempt_question',
+        ),
+        migrations.RemoveConstraint(
+            model_name='quizanswer',
+            name='unique_quiz_attempt_question',
+        ),
+        migrations.RemoveConstraint(
+            model_name='quizanswer',
+            name='unique_attempt_quiz_question',
+        ),
+        migrations.RemoveConstraint(
+            model_name='quizanswer',
+            name='unique_quiz_attempt_quiz_question',
+        ),
+        migrations.RemoveIndex(
+            model_name='quizanswer',
+            name='quizzes_qui_quiz_at_927d49_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='quizanswer',
+            name='quizzes_qui_attempt_f061cb_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='quizanswer',
+            name='quizzes_qui_questio_4b21cc_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='quizanswer',
+            name='quizzes_qui_quiz_qu_cbfd9b_idx',
+        ),
+        migrations.RemoveField(
+            model_name='question',
+            name='order',
+        ),
+        migrations.RemoveField(
+            model_name='question',
+            name='quiz',
+        ),
+        migrations.RemoveField(
+            model_name='quizanswer',
+            name='attempt',
+        ),
+        migrations.RemoveField(
+            model_name='quizanswer',
+            name='quiz_question',
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='questions',
+            field=models.ManyToManyField(related_name='quizzes', through='quizzes.QuizQuestion', to='quizzes.question'),
+        ),
+        migrations.AlterField(
+            model_name='quizanswer',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='quizzes.question'),
+        ),
+        migrations.AlterField(
+            model_name='quizanswer',
+            name='quiz_attempt',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='quizzes.quizattempt'),
+        ),
+        migrations.AddConstraint(
+            model_name='quizanswer',
+            constraint=models.UniqueConstraint(fields=('quiz_attempt', 'question'), name='unique_quiz_attempt_question'),
+        ),
+    ]
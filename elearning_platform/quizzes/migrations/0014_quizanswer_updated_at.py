@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0013_single_relationship_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizanswer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
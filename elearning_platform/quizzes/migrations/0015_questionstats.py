@@ -0,0 +1,73 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def backfill_question_stats(apps, schema_editor):
+    QuizAnswer = apps.get_model('quizzes', 'QuizAnswer')
+    QuestionStats = apps.get_model('quizzes', 'QuestionStats')
+    QuizQuestion = apps.get_model('quizzes', 'QuizQuestion')
+
+    rows = QuizAnswer.objects.values('quiz_attempt__quiz_id', 'question_id').annotate(
+        answers=Count('id'),
+        correct=Count('id', filter=Q(is_correct=True)),
+        time_sum=Sum('time_taken'),
+        time_squares_sum=Sum(F('time_taken') * F('time_taken')),
+        points=Sum('points_earned'),
+        no_points=Count('id', filter=Q(points_earned=0)),
+        full=Count('id', filter=Q(points_earned__gt=0, points_earned__gte=F('question__points'))),
+    ).order_by()
+
+    # Every question in a quiz has a row, even before it has been answered
+    stats = {
+        pair: QuestionStats(quiz_id=pair[0], question_id=pair[1])
+        for pair in QuizQuestion.objects.values_list('quiz_id', 'question_id')
+    }
+    for row in rows:
+        stats[row['quiz_attempt__quiz_id'], row['question_id']] = QuestionStats(
+            quiz_id=row['quiz_attempt__quiz_id'],
+            question_id=row['question_id'],
+            answer_count=row['answers'],
+            correct_count=row['correct'],
+            time_taken_sum=row['time_sum'] or 0,
+            time_taken_squares_sum=row['time_squares_sum'] or 0,
+            points_sum=row['points'] or 0,
+            no_points_count=row['no_points'],
+            partial_points_count=row['answers'] - row['no_points'] - row['full'],
+            full_points_count=row['full'],
+        )
+    QuestionStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0014_quizanswer_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer_count', models.PositiveIntegerField(default=0)),
+                ('correct_count', models.PositiveIntegerField(default=0)),
+                ('time_taken_sum', models.PositiveBigIntegerField(default=0, help_text='Sum of time taken in seconds')),
+                ('time_taken_squares_sum', models.PositiveBigIntegerField(default=0, help_text='Sum of squared time taken, for the variance')),
+                ('points_sum', models.PositiveBigIntegerField(default=0)),
+                ('no_points_count', models.PositiveIntegerField(default=0)),
+                ('partial_points_count', models.PositiveIntegerField(default=0)),
+                ('full_points_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='quizzes.question')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_stats', to='quizzes.quiz')),
+            ],
+            options={
+                'verbose_name_plural': 'Question stats',
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'question'), name='unique_question_stats_quiz_question')],
+            },
+        ),
+        migrations.RunPython(backfill_question_stats, migrations.RunPython.noop),
+    ]
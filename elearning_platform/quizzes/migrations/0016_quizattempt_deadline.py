@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:48
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_deadlines(apps, schema_editor):
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+
+    # Open attempts get the deadline the timer views used to work out from start_time
+    attempts = QuizAttempt.objects.filter(
+        completed=False, status='in_progress', quiz__time_limit__gt=0
+    ).select_related('quiz')
+    for attempt in attempts.iterator():
+        attempt.deadline = attempt.start_time + timedelta(minutes=attempt.quiz.time_limit)
+        attempt.save(update_fields=['deadline'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0015_questionstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='deadline',
+            field=models.DateTimeField(blank=True, help_text='When the attempt runs out of time, if the quiz has a time limit', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(condition=models.Q(('status', 'in_progress')), fields=['deadline'], name='quizattempt_open_deadline_idx'),
+        ),
+        migrations.RunPython(backfill_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0016_quizattempt_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizanswer',
+            name='feedback',
+            field=models.TextField(blank=True, help_text="Teacher's comments when grading", null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0018_quizattempt_results_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='draw_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of questions drawn at random for each attempt. Leave at 0 to ask every question in order.'),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='question_ids',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0019_question_pools'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='difficulty',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='discrimination',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='is_adaptive',
+            field=models.BooleanField(default=False, help_text='Placement tests only: pick each question from the answers so far and stop once the level is clear'),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='ability',
+            field=models.FloatField(blank=True, editable=False, help_text='Estimated ability the result of an adaptive placement test is based on', null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0020_adaptive_placement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='analysed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='reliability',
+            field=models.FloatField(blank=True, editable=False, help_text="Cronbach's alpha from the last item analysis", null=True),
+        ),
+        migrations.CreateModel(
+            name='ItemAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('respondents', models.PositiveIntegerField(default=0, help_text='Finished attempts that were asked the question')),
+                ('difficulty', models.FloatField(blank=True, help_text='Average score on the question from 0 to 1; higher is easier', null=True)),
+                ('discrimination', models.FloatField(blank=True, help_text='Point-biserial correlation with the score on the rest of the quiz', null=True)),
+                ('choice_counts', models.JSONField(blank=True, default=dict, help_text='How often each choice was picked, by choice ID')),
+                ('analysed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_analyses', to='quizzes.question')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='item_analyses', to='quizzes.quiz')),
+            ],
+            options={
+                'verbose_name_plural': 'Item analyses',
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'question'), name='unique_item_analysis_quiz_question')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0021_item_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptState',
+            fields=[
+                ('attempt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='quizzes.quizattempt')),
+                ('started_at', models.BinaryField(blank=True, default=b'')),
+                ('deadline', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0022_attempt_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizanswer',
+            name='submission_token',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='quizanswer',
+            constraint=models.UniqueConstraint(condition=models.Q(('submission_token__isnull', False)), fields=('quiz_attempt', 'submission_token'), name='unique_quiz_attempt_submission_token'),
+        ),
+    ]
@@ -2,10 +2,17 @@ from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db.models import Q, Sum
-from courses.models import Course
+from django.db.models import (
+    Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+from array import array
+from datetime import timedelta
+from courses.models import Course, CourseProgress, adjust_course_progress, bump_content_version
 
 class Quiz(models.Model):
     """Model representing a quiz or assessment"""
@@ -17,63 +24,76 @@ class Quiz(models.Model):
     is_active = models.BooleanField(default=True)
     is_placement_test = models.BooleanField(default=False)
     max_points = models.PositiveIntegerField(default=100, help_text="Maximum points for the quiz")
+    draw_count = models.PositiveIntegerField(default=0, help_text="Number of questions drawn at random "
+                                             "for each attempt. Leave at 0 to ask every question in order.")
+    is_adaptive = models.BooleanField(default=False, help_text="Placement tests only: pick each question from "
+                                      "the answers so far and stop once the level is clear")
+    # Question aggregates, kept up to date by the Question and QuizQuestion signal handlers below
+    total_points = models.PositiveIntegerField(default=0, editable=False)
+    question_count = models.PositiveIntegerField(default=0, editable=False)
+    total_time_seconds = models.PositiveIntegerField(default=0, editable=False)
+    # Set by the analyse_items command
+    reliability = models.FloatField(null=True, blank=True, editable=False,
+                                    help_text="Cronbach's alpha from the last item analysis")
+    analysed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    snapshot_version = models.PositiveIntegerField(default=0, editable=False,
+                                                   help_text="Bumped whenever the quiz's questions or choices change")
+    # Questions belong to quizzes only through QuizQuestion, which also holds their order
+    questions = models.ManyToManyField('Question', through='QuizQuestion', related_name='quizzes')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    MAINTAINED_FIELDS = ('snapshot_version', 'total_points', 'question_count', 'total_time_seconds')
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # These are only ever changed with F() updates, so never write back a stale copy
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def get_time_limit(self):
         """Return 0 to effectively disable quiz-level time limit"""
         return 0
 
     def get_total_question_time(self):
         """Calculate the total time limit from all questions in this quiz (in minutes)"""
-        # Try direct relationship
-        total_seconds = self.questions.aggregate(total=Sum('time_limit'))['total'] or 0
-
-        # If we have quiz_questions relationship, add those too
-        if hasattr(self, 'quiz_questions'):
-            question_ids = self.quiz_questions.values_list('question_id', flat=True)
-            quiz_question_seconds = Question.objects.filter(id__in=question_ids).aggregate(
-                total=Sum('time_limit'))['total'] or 0
-            total_seconds = max(total_seconds, quiz_question_seconds)
-
-        total_minutes = total_seconds // 60
-
-        if (
-            (self.questions.exists() or
-            (hasattr(self, 'quiz_questions') and self.quiz_questions.exists()))
-            and total_minutes < 1
-        ):
+        total_minutes = self.total_time_seconds // 60
+
+        if self.question_count and total_minutes < 1:
             return 1
 
         return total_minutes
 
     def get_total_points(self):
         """Calculate the total points from all questions in this quiz"""
-        direct_sum = self.questions.aggregate(total=Sum('points'))['total'] or 0
-        through_sum = 0
-
-        if hasattr(self, 'quiz_questions'):
-            through_sum = Question.objects.filter(
-                quizquestion__quiz=self
-            ).aggregate(total=Sum('points'))['total'] or 0
-
-        return max(direct_sum, through_sum)
+        return self.total_points
     
     def get_question_count(self):
         """Count the total number of questions in the quiz"""
-    # First count direct questions
-        direct_count = self.questions.count()
+        return self.question_count
     
-    # Then count questions through QuizQuestion relationship if it exists
-        through_count = 0
-        if hasattr(self, 'quiz_questions'):
-            through_count = self.quiz_questions.count()
-    
-    # Return the higher count (they might overlap)
-        return max(direct_count, through_count)
+    def get_attempt_question_count(self):
+        """Count the questions each attempt asks, which is fewer than the quiz has if they're drawn at random"""
+        if self.draw_count:
+            return min(self.draw_count, self.question_count)
+        return self.question_count
+
+    def calculate_aggregates(self):
+        """Compute the stored question aggregates from the questions in the database"""
+        return calculate_quiz_aggregates(self.id)
+
+    def refresh_aggregates(self):
+        """Recompute and store the question aggregates for this quiz"""
+        aggregates = calculate_quiz_aggregates(self.id)
+        Quiz.objects.filter(pk=self.pk).update(**aggregates)
+        for field, value in aggregates.items():
+            setattr(self, field, value)
 
 class Question(models.Model):
     """Model representing a question in a quiz"""
@@ -94,8 +114,6 @@ class Question(models.Model):
         ('matching', 'Matching')
     ]
     
-    # Keep this as nullable for compatibility with QuizQuestion model
-    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='questions', null=True, blank=True)
     text = models.TextField()
     question_type = models.CharField(max_length=20, choices=QUESTION_TYPES, default='multiple_choice')
     image = models.ImageField(upload_to='question_images/', null=True, blank=True)
@@ -103,7 +121,9 @@ class Question(models.Model):
     time_limit = models.PositiveIntegerField(default=60, help_text='Time limit in seconds')
     points = models.PositiveIntegerField(default=10, validators=[MinValueValidator(1)], 
                                        help_text="Points for this question")
-    order = models.PositiveIntegerField(default=0, help_text="Order in the quiz")
+    # Item response theory parameters fitted from past answers by the fit_item_parameters command
+    difficulty = models.FloatField(null=True, blank=True, editable=False)
+    discrimination = models.FloatField(null=True, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -115,7 +135,7 @@ class Question(models.Model):
         return self.choices.all()
     
     class Meta:
-        ordering = ['order', 'created_at']
+        ordering = ['created_at']
 
 class QuizQuestion(models.Model):
     """Model representing the relationship between Quiz and Question"""
@@ -169,29 +189,43 @@ class QuizAttempt(models.Model):
     score = models.FloatField(default=0)  # Standardize on FloatField for precision
     result = models.CharField(max_length=15, choices=RESULT_CHOICES, blank=True, null=True)
     completed = models.BooleanField(default=False)
+    deadline = models.DateTimeField(null=True, blank=True,
+                                    help_text="When the attempt runs out of time, if the quiz has a time limit")
+    ability = models.FloatField(null=True, blank=True, editable=False,
+                                help_text="Estimated ability the result of an adaptive placement test is based on")
+    
+    # Running totals, kept up to date with F() updates as answers are written and graded
+    points_earned = models.PositiveIntegerField(default=0)
+    answered_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    max_points = models.PositiveIntegerField(default=0, help_text="Total points of the quiz when the attempt started")
+    
+    # The questions drawn for this attempt, as packed 32-bit question IDs in the order they're asked;
+    # empty when the attempt asks every question of the quiz
+    question_ids = models.BinaryField(default=b'', blank=True, editable=False)
+    
+    # Bumped whenever a finished attempt is graded, so cached results are only rebuilt when they change
+    results_version = models.PositiveIntegerField(default=0, editable=False)
+    results_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    RUNNING_TOTAL_FIELDS = ('points_earned', 'answered_count', 'correct_count')
+    RESULTS_VERSION_FIELDS = ('results_version', 'results_updated_at')
     
     def __str__(self):
         student_name = self.student.username if self.student else "Unknown"
         return f"{student_name}'s attempt at {self.quiz.title}"
     
     def calculate_score(self):
-        """Calculate the score for this attempt"""
-        total_points = self.quiz.get_total_points()
+        """Calculate the score for this attempt from its running totals"""
+        # The totals are only ever changed with F() updates, so read the current values
+        self.refresh_from_db(fields=['points_earned', 'answered_count', 'correct_count', 'max_points'])
+        
+        total_points = self.max_points or self.quiz.get_total_points()
         if total_points == 0:
             return 0
         
-        # Try both field patterns
-        try:
-            earned_points = self.answers.aggregate(earned=Sum('points_earned'))['earned'] or 0
-        except:
-            try:
-                earned_points = QuizAnswer.objects.filter(
-                    attempt=self
-                ).aggregate(earned=Sum('points_earned'))['earned'] or 0
-            except:
-                earned_points = 0
-        
-        return (earned_points / total_points) * 100
+        return (self.points_earned / total_points) * 100
+
     
     def determine_result(self):
         """Determine the result based on score"""
@@ -208,29 +242,47 @@ class QuizAttempt(models.Model):
             else:
                 return 'failed'
     
-    def complete(self):
-        """Mark the attempt as completed"""
+    def complete(self, status='completed', result=None):
+        """Mark the attempt as completed, with the result worked out from the score unless one is given"""
         self.end_time = timezone.now()
         self.score = self.calculate_score()
-        self.result = self.determine_result()
-        self.status = 'completed'
+        self.result = result or self.determine_result()
+        self.status = status
         self.completed = True
         self.save()
     
+    def expire(self):
+        """Close the attempt because its time ran out"""
+        self.complete(status='timed_out')
+    
+    def get_remaining_seconds(self):
+        """Seconds left before the deadline, or None if the quiz isn't timed"""
+        if not self.deadline:
+            return None
+        return max(int((self.deadline - timezone.now()).total_seconds()), 0)
+    
+    def is_past_deadline(self):
+        """Check whether the attempt is still open after its deadline"""
+        return bool(self.deadline) and not self.completed and timezone.now() >= self.deadline
+    
+    def get_question_ids(self):
+        """The IDs of the questions drawn for this attempt, or an empty tuple if it asks every question"""
+        return tuple(array('I', bytes(self.question_ids)))
+    
+    def set_question_ids(self, question_ids):
+        """Store the questions drawn for this attempt, in the order they're asked"""
+        self.question_ids = array('I', question_ids).tobytes()
+    
     def get_answers(self):
-        """Get all answers for this attempt, checking both field patterns"""
-        # Try both relationship patterns
-        try:
-            direct_answers = self.answers.all()
-            if direct_answers.exists():
-                return direct_answers
-        except:
-            pass
-            
-        try:
-            return QuizAnswer.objects.filter(attempt=self)
-        except:
-            return QuizAnswer.objects.none()
+        """Get all answers for this attempt"""
+        return self.answers.all()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember whether the attempt was finished so the progress signal handlers only count it once
+        instance._loaded_completed = dict(zip(field_names, values)).get('completed')
+        return instance
     
     def save(self, *args, **kwargs):
         # Ensure user field is synced with student field for compatibility
@@ -242,31 +294,74 @@ class QuizAttempt(models.Model):
         # Ensure status and completed are in sync
         if self.status == 'completed' and not self.completed:
             self.completed = True
-        elif self.completed and self.status != 'completed':
+        elif self.completed and self.status == 'in_progress':
             self.status = 'completed'
+        elif self.status == 'timed_out':
+            self.completed = True
+        
+        if self._state.adding:
+            if not self.max_points:
+                self.max_points = self.quiz.get_total_points()
+            # The deadline is fixed when the attempt starts so clients can count down to it
+            if not self.deadline and self.quiz.time_limit:
+                self.deadline = timezone.now() + timedelta(minutes=self.quiz.time_limit)
+        elif kwargs.get('update_fields') is None:
+            # Never write back running totals or results versions that may be stale on this instance
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.RUNNING_TOTAL_FIELDS + self.RESULTS_VERSION_FIELDS
+            ]
             
         super().save(*args, **kwargs)
+        
+        # The timer state is cached while the attempt is open
+        if self.completed:
+            from .timer import invalidate_attempt_timer
+            from .navigation import invalidate_attempt_state
+            invalidate_attempt_timer(self.pk)
+            invalidate_attempt_state(self.pk)
     
     class Meta:
         ordering = ['-start_time']
         indexes = [
             models.Index(fields=['student', 'completed']),
             models.Index(fields=['quiz', 'completed']),
+            # Lets the expire_quiz_attempts sweeper range-scan only the open attempts
+            models.Index(fields=['deadline'], condition=models.Q(status='in_progress'),
+                         name='quizattempt_open_deadline_idx'),
         ]
 
+class AttemptState(models.Model):
+    """When each question of an open attempt was first shown, cached and written through by quizzes.navigation"""
+    attempt = models.OneToOneField(QuizAttempt, on_delete=models.CASCADE, primary_key=True, related_name='state')
+    # When each question was first shown, as packed 32-bit epoch seconds
+    # indexed by the question's place in the attempt; 0 if not yet shown
+    started_at = models.BinaryField(default=b'', blank=True, editable=False)
+    deadline = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"State of attempt {self.attempt_id}"
+    
+    def get_started_at(self, index):
+        """When the question at index was first shown, in epoch seconds, or None if it hasn't been yet"""
+        started_at = array('I', bytes(self.started_at))
+        if index < len(started_at) and started_at[index]:
+            return started_at[index]
+        return None
+    
+    def set_started_at(self, index, timestamp):
+        """Record when the question at index was first shown"""
+        started_at = array('I', bytes(self.started_at))
+        if index >= len(started_at):
+            started_at.extend([0] * (index + 1 - len(started_at)))
+        started_at[index] = int(timestamp)
+        self.started_at = started_at.tobytes()
+
 class QuizAnswer(models.Model):
     """Model representing a student's answer to a question in a quiz attempt"""
-    # Support both field patterns for backward compatibility
-    quiz_attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, 
-                                    related_name='answers', null=True, blank=True)
-    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE,
-                               related_name='old_answers', null=True, blank=True)
-    
-    # Support both question reference patterns
-    question = models.ForeignKey(Question, on_delete=models.CASCADE, 
-                               related_name='answers', null=True, blank=True)
-    quiz_question = models.ForeignKey(QuizQuestion, on_delete=models.CASCADE,
-                                    null=True, blank=True)
+    quiz_attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='answers')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answers')
     
     selected_choice = models.ForeignKey(Choice, on_delete=models.CASCADE, null=True, blank=True)
     selected_choices = models.ManyToManyField(Choice, related_name='multi_select_answers', blank=True)
@@ -276,20 +371,26 @@ class QuizAnswer(models.Model):
     is_correct = models.BooleanField(default=False)
     points_earned = models.PositiveIntegerField(default=0)
     time_taken = models.PositiveIntegerField(default=0, help_text='Time taken in seconds')
+    feedback = models.TextField(blank=True, null=True, help_text="Teacher's comments when grading")
+    # Sent by the client with the answer so retries of the same submission can be recognised
+    submission_token = models.UUIDField(null=True, blank=True, editable=False)
+    answered_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        question_text = self.question.text[:30] if self.question else (
-            self.quiz_question.question.text[:30] if self.quiz_question else "Unknown Question"
-        )
-        return f"Answer to {question_text}..."
+        return f"Answer to {self.question.text[:30]}..."
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the graded values so save() can apply the difference to the attempt totals
+        loaded = dict(zip(field_names, values))
+        instance._loaded_grade = (loaded.get('points_earned'), loaded.get('is_correct'), loaded.get('time_taken'))
+        return instance
     
     def get_question(self):
-        """Get the actual question object regardless of relationship pattern"""
-        if self.question:
-            return self.question
-        elif self.quiz_question:
-            return self.quiz_question.question
-        return None
+        """Get the question this answer belongs to"""
+        return self.question
     
     def evaluate(self):
         """Evaluate if the answer is correct and assign points"""
@@ -323,47 +424,48 @@ class QuizAnswer(models.Model):
         self.save()
     
     def save(self, *args, **kwargs):
-        # Ensure both quiz_attempt and attempt fields are set for compatibility
-        if self.quiz_attempt and not self.attempt:
-            self.attempt = self.quiz_attempt
-        elif self.attempt and not self.quiz_attempt:
-            self.quiz_attempt = self.attempt
-            
-        # If we have a quiz_question but no question, set question
-        if not self.question and self.quiz_question:
-            self.question = self.quiz_question.question
+        adding = self._state.adding
+        grade = (self.points_earned, self.is_correct, self.time_taken)
+        loaded_points, loaded_correct, loaded_time = getattr(self, '_loaded_grade', (None, None, None))
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
             
-        super().save(*args, **kwargs)
+            # Keep the attempt's running totals and the question stats in step with this answer
+            if adding:
+                add_to_attempt_totals(self.quiz_attempt_id, self.points_earned, 1, int(self.is_correct))
+                add_to_question_stats(self.quiz_attempt.quiz_id, self.question_id, get_answer_stats(
+                    self.points_earned, self.is_correct, self.time_taken, self.question.points
+                ))
+            elif loaded_points is not None and loaded_correct is not None:
+                add_to_attempt_totals(
+                    self.quiz_attempt_id,
+                    self.points_earned - loaded_points,
+                    0,
+                    int(self.is_correct) - int(loaded_correct)
+                )
+                if grade[:2] != (loaded_points, loaded_correct):
+                    bump_results_version([self.quiz_attempt_id])
+                if loaded_time is not None and grade != (loaded_points, loaded_correct, loaded_time):
+                    question_points = self.question.points
+                    new_stats = get_answer_stats(*grade, question_points)
+                    old_stats = get_answer_stats(loaded_points, loaded_correct, loaded_time, question_points)
+                    add_to_question_stats(self.quiz_attempt.quiz_id, self.question_id, {
+                        field: new_stats[field] - old_stats[field] for field in QuestionStats.COUNTER_FIELDS
+                    })
+        self._loaded_grade = grade
     
     class Meta:
-        # Use conditional unique_together constraint
         constraints = [
-            models.UniqueConstraint(
-                fields=['attempt', 'question'],
-                condition=Q(attempt__isnull=False) & Q(question__isnull=False),
-                name='unique_attempt_question'
-            ),
             models.UniqueConstraint(
                 fields=['quiz_attempt', 'question'],
-                condition=Q(quiz_attempt__isnull=False) & Q(question__isnull=False),
                 name='unique_quiz_attempt_question'
             ),
             models.UniqueConstraint(
-                fields=['attempt', 'quiz_question'],
-                condition=Q(attempt__isnull=False) & Q(quiz_question__isnull=False),
-                name='unique_attempt_quiz_question'
+                fields=['quiz_attempt', 'submission_token'],
+                condition=models.Q(submission_token__isnull=False),
+                name='unique_quiz_attempt_submission_token'
             ),
-            models.UniqueConstraint(
-                fields=['quiz_attempt', 'quiz_question'],
-                condition=Q(quiz_attempt__isnull=False) & Q(quiz_question__isnull=False),
-                name='unique_quiz_attempt_quiz_question'
-            ),
-        ]
-        indexes = [
-            models.Index(fields=['quiz_attempt']),
-            models.Index(fields=['attempt']),
-            models.Index(fields=['question']),
-            models.Index(fields=['quiz_question']),
         ]
 
 class TextAnswer(models.Model):
@@ -398,19 +500,247 @@ class VoiceRecording(models.Model):
     class Meta:
         unique_together = ('question', 'student')
 
-# Signal to maintain both relationship patterns
-@receiver(post_save, sender=Question)
-def create_quiz_question_for_direct_relationship(sender, instance, created, **kwargs):
+class QuestionStats(models.Model):
+    """Running answer statistics for a question within a quiz, kept in step by QuizAnswer.save()"""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='question_stats')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='stats')
+    answer_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    time_taken_sum = models.PositiveBigIntegerField(default=0, help_text='Sum of time taken in seconds')
+    time_taken_squares_sum = models.PositiveBigIntegerField(default=0, help_text='Sum of squared time taken, for the variance')
+    points_sum = models.PositiveBigIntegerField(default=0)
+    # Points distribution
+    no_points_count = models.PositiveIntegerField(default=0)
+    partial_points_count = models.PositiveIntegerField(default=0)
+    full_points_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    COUNTER_FIELDS = (
+        'answer_count', 'correct_count', 'time_taken_sum', 'time_taken_squares_sum', 'points_sum',
+        'no_points_count', 'partial_points_count', 'full_points_count',
+    )
+    
+    def __str__(self):
+        return f"Stats for question {self.question_id} in quiz {self.quiz_id}"
+    
+    def get_correct_percentage(self):
+        """Percentage of answers that were correct"""
+        if not self.answer_count:
+            return 0
+        return (self.correct_count / self.answer_count) * 100
+    
+    def get_avg_time_taken(self):
+        """Average time taken in seconds"""
+        if not self.answer_count:
+            return 0
+        return self.time_taken_sum / self.answer_count
+    
+    def get_time_taken_stddev(self):
+        """Standard deviation of the time taken in seconds"""
+        if not self.answer_count:
+            return 0
+        mean = self.get_avg_time_taken()
+        return max(self.time_taken_squares_sum / self.answer_count - mean * mean, 0) ** 0.5
+    
+    def get_avg_points(self):
+        """Average points earned"""
+        if not self.answer_count:
+            return 0
+        return self.points_sum / self.answer_count
+    
+    class Meta:
+        verbose_name_plural = 'Question stats'
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'question'], name='unique_question_stats_quiz_question'),
+        ]
+
+class ItemAnalysis(models.Model):
+    """Classical item analysis of a question within a quiz, computed in bulk by the analyse_items command"""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='item_analyses')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='item_analyses')
+    respondents = models.PositiveIntegerField(default=0, help_text="Finished attempts that were asked the question")
+    difficulty = models.FloatField(null=True, blank=True,
+                                   help_text="Average score on the question from 0 to 1; higher is easier")
+    discrimination = models.FloatField(null=True, blank=True,
+                                       help_text="Point-biserial correlation with the score on the rest of the quiz")
+    choice_counts = models.JSONField(default=dict, blank=True, help_text="How often each choice was picked, by choice ID")
+    analysed_at = models.DateTimeField(default=timezone.now)
+    
+    # Items outside these bounds are flagged for teachers to look at
+    MIN_DISCRIMINATION = 0.2
+    DIFFICULTY_RANGE = (0.2, 0.95)
+    
+    def __str__(self):
+        return f"Item analysis for question {self.question_id} in quiz {self.quiz_id}"
+    
+    def needs_review(self):
+        """Whether the question is too hard, too easy or doesn't separate strong students from weak ones"""
+        if self.difficulty is not None and not self.DIFFICULTY_RANGE[0] <= self.difficulty <= self.DIFFICULTY_RANGE[1]:
+            return True
+        return self.discrimination is not None and self.discrimination < self.MIN_DISCRIMINATION
+    
+    def get_choice_count(self, choice_id):
+        """How many respondents picked the choice (JSON keys are strings)"""
+        return self.choice_counts.get(str(choice_id), 0)
+    
+    class Meta:
+        verbose_name_plural = 'Item analyses'
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'question'], name='unique_item_analysis_quiz_question'),
+        ]
+
+def calculate_quiz_aggregates(quiz_id):
+    """Compute a quiz's total points, question count and total time (in seconds)"""
+    aggregates = Question.objects.filter(quizquestion__quiz_id=quiz_id).aggregate(
+        total=Sum('points'),
+        count=Count('id'),
+        seconds=Sum('time_limit'),
+    )
+    return {
+        'total_points': aggregates['total'] or 0,
+        'question_count': aggregates['count'],
+        'total_time_seconds': aggregates['seconds'] or 0,
+    }
+
+def refresh_quiz_aggregates(quiz_ids):
+    """Recompute and store the question aggregates for the given quizzes"""
+    quiz_ids = {quiz_id for quiz_id in quiz_ids if quiz_id}
+    for quiz_id in quiz_ids:
+        Quiz.objects.filter(pk=quiz_id).update(**calculate_quiz_aggregates(quiz_id))
+    # The course content snapshots show each quiz's total time
+    if quiz_ids:
+        bump_content_version(Quiz.objects.filter(id__in=quiz_ids).values_list('course_id', flat=True))
+
+def bump_results_version(attempt_ids):
+    """Mark the results of the given finished attempts as changed, e.g. after grading"""
+    QuizAttempt.objects.filter(id__in=attempt_ids, completed=True).update(
+        results_version=F('results_version') + 1,
+        results_updated_at=timezone.now()
+    )
+
+def add_to_attempt_totals(attempt_id, points=0, answered=0, correct=0):
+    """Apply a change to a QuizAttempt's running totals with a single UPDATE"""
+    if points or answered or correct:
+        QuizAttempt.objects.filter(pk=attempt_id).update(
+            points_earned=F('points_earned') + points,
+            answered_count=F('answered_count') + answered,
+            correct_count=F('correct_count') + correct
+        )
+
+def get_answer_stats(points_earned, is_correct, time_taken, question_points):
+    """Return what a single answer contributes to its QuestionStats counters"""
+    full_points = points_earned > 0 and points_earned >= question_points
+    return {
+        'answer_count': 1,
+        'correct_count': int(is_correct),
+        'time_taken_sum': time_taken,
+        'time_taken_squares_sum': time_taken * time_taken,
+        'points_sum': points_earned,
+        'no_points_count': int(points_earned == 0),
+        'partial_points_count': int(points_earned > 0 and not full_points),
+        'full_points_count': int(full_points),
+    }
+
+def add_to_question_stats(quiz_id, question_id, changes):
+    """Apply a change to a question's stats within a quiz with a single UPDATE, creating the row if needed"""
+    changes = {field: change for field, change in changes.items() if change}
+    if not changes:
+        return
+    
+    stats = QuestionStats.objects.filter(quiz_id=quiz_id, question_id=question_id)
+    updates = {field: F(field) + change for field, change in changes.items()}
+    updates['updated_at'] = timezone.now()
+    if not stats.update(**updates):
+        QuestionStats.objects.get_or_create(quiz_id=quiz_id, question_id=question_id)
+        stats.update(**updates)
+
+def add_answers_to_question_stats(quiz_id, answers):
+    """Add newly created answers (e.g. from bulk_create, which skips save()) to their question stats"""
+    changes = {}
+    for answer in answers:
+        answer_stats = get_answer_stats(answer.points_earned, answer.is_correct, answer.time_taken, answer.question.points)
+        question_changes = changes.setdefault(answer.question_id, dict.fromkeys(QuestionStats.COUNTER_FIELDS, 0))
+        for field, change in answer_stats.items():
+            question_changes[field] += change
+    
+    for question_id, question_changes in changes.items():
+        add_to_question_stats(quiz_id, question_id, question_changes)
+
+def attempt_score_expression(points_earned=F('points_earned')):
     """
-    When a question is saved with a direct quiz relationship,
-    ensure the QuizQuestion relationship is also created.
+    SQL version of QuizAttempt.calculate_score() for bulk UPDATEs, given an expression for the points earned.
+    Attempts from before max_points existed are scored against the quiz's current total.
     """
-    if instance.quiz:
-        # Check if a QuizQuestion already exists
-        if not QuizQuestion.objects.filter(quiz=instance.quiz, question=instance).exists():
-            # Create new QuizQuestion
-            QuizQuestion.objects.create(
-                quiz=instance.quiz,
-                question=instance,
-                order=instance.order
-            )
\ No newline at end of file
+    quiz_total = Subquery(Quiz.objects.filter(pk=OuterRef('quiz_id')).values('total_points')[:1])
+    total_points = Coalesce(NullIf(F('max_points'), Value(0)), quiz_total)
+    return Coalesce(
+        Cast(points_earned, FloatField()) * Value(100.0) / Cast(NullIf(total_points, Value(0)), FloatField()),
+        Value(0.0)
+    )
+
+def attempt_result_expression(score):
+    """SQL version of QuizAttempt.determine_result() for bulk UPDATEs, given an expression for the score"""
+    quiz = Quiz.objects.filter(pk=OuterRef('quiz_id'))
+    is_placement_test = Subquery(quiz.values('is_placement_test')[:1])
+    passing_score = Subquery(quiz.values('passing_score')[:1])
+    return Case(
+        When(Q(is_placement_test) & LessThan(score, Value(40.0)), then=Value('beginner')),
+        When(Q(is_placement_test) & LessThan(score, Value(75.0)), then=Value('intermediate')),
+        When(Q(is_placement_test), then=Value('advanced')),
+        When(GreaterThanOrEqual(score, passing_score), then=Value('passed')),
+        default=Value('failed'),
+    )
+
+# Signals to keep the stored quiz aggregates up to date
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def update_quiz_aggregates_for_question(sender, instance, **kwargs):
+    """Refresh the aggregates of every quiz the question belongs to"""
+    refresh_quiz_aggregates(QuizQuestion.objects.filter(question_id=instance.id).values_list('quiz_id', flat=True))
+
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+def update_quiz_aggregates_for_quiz_question(sender, instance, **kwargs):
+    """Refresh the aggregates of the quiz the question was added to or removed from"""
+    refresh_quiz_aggregates([instance.quiz_id])
+
+@receiver(post_save, sender=QuizQuestion)
+def create_question_stats(sender, instance, created, **kwargs):
+    """Create the stats row up front so answer saves only need to UPDATE it"""
+    if created:
+        QuestionStats.objects.get_or_create(quiz_id=instance.quiz_id, question_id=instance.question_id)
+
+# Signals to keep the CourseProgress counters up to date
+@receiver(post_save, sender=Quiz)
+def add_quiz_to_course_progress(sender, instance, created, **kwargs):
+    """A new quiz adds to the total of everyone taking the course"""
+    if created:
+        adjust_course_progress(CourseProgress.objects.filter(course_id=instance.course_id), total=1)
+
+@receiver(post_delete, sender=Quiz)
+def remove_quiz_from_course_progress(sender, instance, **kwargs):
+    adjust_course_progress(CourseProgress.objects.filter(course_id=instance.course_id), total=-1)
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def update_course_content_version(sender, instance, **kwargs):
+    """Any change to a quiz invalidates its course's cached content snapshot"""
+    bump_content_version([instance.course_id])
+
+@receiver(post_save, sender=QuizAttempt)
+def update_progress_for_attempt(sender, instance, created, **kwargs):
+    """A finished attempt counts as a completed item of the quiz's course"""
+    if instance.completed and not getattr(instance, '_loaded_completed', False):
+        adjust_course_progress(
+            CourseProgress.objects.filter(user_id=instance.student_id, course__quizzes=instance.quiz_id),
+            completed=1
+        )
+    instance._loaded_completed = instance.completed
+
+@receiver(post_delete, sender=QuizAttempt)
+def remove_attempt_progress(sender, instance, **kwargs):
+    if getattr(instance, '_loaded_completed', instance.completed):
+        adjust_course_progress(
+            CourseProgress.objects.filter(user_id=instance.student_id, course__quizzes=instance.quiz_id),
+            completed=-1
+        )
@@ -0,0 +1,116 @@
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import AttemptState, QuizAnswer
+
+# Every change is written to the database and the cache together, so the cached state is always
+# current; it's dropped when the attempt finishes and the timeout just bounds abandoned entries.
+STATE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long the outcome of an answer submission is kept for replaying retries of it
+SUBMISSION_CACHE_TIMEOUT = 60 * 60
+
+
+def _state_cache_key(attempt_id):
+    return f'attempt_state:{attempt_id}'
+
+
+def get_attempt_state(attempt):
+    """
+    Return the navigation state of an open attempt: when each question was first shown and the deadline.
+    Only a cache miss touches the database. How far the student has got is the attempt's
+    answered_count running total, so the state only changes when a question is first shown.
+    """
+    key = _state_cache_key(attempt.id)
+    state = cache.get(key)
+    if state is None:
+        state, _ = AttemptState.objects.get_or_create(
+            attempt_id=attempt.id, defaults={'deadline': attempt.deadline}
+        )
+        cache.set(key, state, STATE_CACHE_TIMEOUT)
+    return state
+
+
+def save_attempt_state(state):
+    """Write the state through to the database and the cache"""
+    state.save()
+    cache.set(_state_cache_key(state.attempt_id), state, STATE_CACHE_TIMEOUT)
+
+
+def invalidate_attempt_state(attempt_id):
+    """Drop the cached state, e.g. once the attempt is finished"""
+    cache.delete(_state_cache_key(attempt_id))
+
+
+def invalidate_attempt_states(attempt_ids):
+    """Drop the cached state of several attempts at once, e.g. after they're closed in bulk"""
+    cache.delete_many([_state_cache_key(attempt_id) for attempt_id in attempt_ids])
+
+
+def start_question(state, index):
+    """
+    Return when the question at index was first shown, in epoch seconds,
+    recording the current time if this is the first time it's shown.
+    """
+    return start_questions(state, [index])[0]
+
+
+def start_questions(state, indexes):
+    """
+    Return when each of the questions at indexes was first shown, in epoch seconds,
+    recording the current time for those shown now for the first time with a single write.
+    """
+    now = int(timezone.now().timestamp())
+    started = []
+    changed = False
+    for index in indexes:
+        started_at = state.get_started_at(index)
+        if started_at is None:
+            started_at = now
+            state.set_started_at(index, started_at)
+            changed = True
+        started.append(started_at)
+    if changed:
+        save_attempt_state(state)
+    return started
+
+
+def get_attempt_position(attempt, questions):
+    """
+    Return the index in questions of the first one the student hasn't answered yet.
+    Every question they move past is stored with an answer, blank if need be, so this is normally
+    the attempt's answered_count; answers after it, left by questions skipped without one before
+    blank answers were stored, are stepped over with a single query.
+    """
+    position = attempt.answered_count
+    if position < len(questions):
+        answered = set(QuizAnswer.objects.filter(
+            quiz_attempt=attempt, question_id__in=[question.id for question in questions[position:]]
+        ).values_list('question_id', flat=True))
+        while position < len(questions) and questions[position].id in answered:
+            position += 1
+    return position
+
+
+def parse_submission_token(value):
+    """The UUID a client sent to identify an answer submission, or None if it's missing or malformed"""
+    try:
+        return uuid.UUID(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def _submission_cache_key(attempt_id, token):
+    return f'answer_submission:{attempt_id}:{token.hex}'
+
+
+def get_submission_outcome(attempt_id, token):
+    """Where an answer submission with this token led, if it has already been stored"""
+    return cache.get(_submission_cache_key(attempt_id, token))
+
+
+def set_submission_outcome(attempt_id, token, url):
+    """Remember where an answer submission led, so retries of it can be sent there without redoing it"""
+    cache.set(_submission_cache_key(attempt_id, token), url, SUBMISSION_CACHE_TIMEOUT)
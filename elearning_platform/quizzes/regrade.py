@@ -0,0 +1,157 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .grading import AUTO_GRADED_QUESTION_TYPES
+from .models import (
+    Choice, Question, QuizAnswer, QuizAttempt, QuestionStats, add_to_question_stats,
+    attempt_result_expression, attempt_score_expression, bump_results_version, get_answer_stats
+)
+
+# Question types whose answers can be regraded from the answer key alone
+REGRADABLE_QUESTION_TYPES = AUTO_GRADED_QUESTION_TYPES
+
+
+def _answer_totals(field, **filters):
+    """Subquery summing an answer field for the attempt being updated"""
+    answers = QuizAnswer.objects.filter(quiz_attempt=OuterRef('pk'), **filters).order_by().values('quiz_attempt')
+    return Coalesce(
+        Subquery(answers.annotate(total=field).values('total'), output_field=IntegerField()),
+        Value(0)
+    )
+
+
+def rescore_attempts(attempt_ids):
+    """
+    Rebuild the running totals of the given attempts from their answers in one UPDATE,
+    re-scoring the finished ones from the new totals. Returns how many results changed.
+    """
+    attempts = QuizAttempt.objects.filter(id__in=attempt_ids)
+    old_results = dict(attempts.values_list('id', 'result'))
+
+    points_earned = _answer_totals(Sum('points_earned'))
+    score = attempt_score_expression(points_earned)
+    finished = Q(completed=True) | Q(status__in=['completed', 'timed_out'])
+    attempts.update(
+        points_earned=points_earned,
+        correct_count=_answer_totals(Count('id'), is_correct=True),
+        score=Case(When(finished, then=score), default=F('score')),
+        # Adaptive placement results come from the ability estimate, not the score
+        result=Case(
+            When(finished & Q(ability__isnull=True), then=attempt_result_expression(score)),
+            default=F('result')
+        ),
+    )
+
+    # Cached results pages for these attempts are now stale
+    bump_results_version(attempt_ids)
+
+    new_results = dict(attempts.values_list('id', 'result'))
+    return sum(1 for attempt_id, result in new_results.items() if old_results.get(attempt_id) != result)
+
+
+def save_grades(grades, fields, batch_size=1000):
+    """
+    Write a batch of re-graded answers and bring everything derived from them up to date.
+    Each grade is (answer, quiz_id, question_points, old_points, old_is_correct), where the answer
+    carries its new values. bulk_update skips QuizAnswer.save(), so the question stats and attempt
+    scores are updated here, in the same transaction. Returns how many attempt results changed.
+    """
+    if not grades:
+        return 0
+
+    now = timezone.now()
+    stats_changes = defaultdict(lambda: defaultdict(int))
+    for answer, quiz_id, question_points, old_points, old_correct in grades:
+        answer.updated_at = now
+        new_stats = get_answer_stats(answer.points_earned, answer.is_correct, answer.time_taken, question_points)
+        old_stats = get_answer_stats(old_points, old_correct, answer.time_taken, question_points)
+        for field in QuestionStats.COUNTER_FIELDS:
+            stats_changes[quiz_id, answer.question_id][field] += new_stats[field] - old_stats[field]
+
+    with transaction.atomic():
+        QuizAnswer.objects.bulk_update(
+            [answer for answer, *_ in grades], list(fields) + ['updated_at'], batch_size=batch_size
+        )
+        for (quiz_id, question_id), changes in stats_changes.items():
+            add_to_question_stats(quiz_id, question_id, changes)
+        return rescore_attempts({answer.quiz_attempt_id for answer, *_ in grades})
+
+
+def regrade_answers(quiz=None, question=None, batch_size=1000):
+    """
+    Re-evaluate every auto-graded answer for a question, or for all questions in a quiz,
+    against the current answer key, then re-score the attempts whose answers changed.
+    Returns a report of what changed.
+    """
+    questions = Question.objects.filter(question_type__in=REGRADABLE_QUESTION_TYPES)
+    answers = QuizAnswer.objects.all()
+    if question is not None:
+        questions = questions.filter(pk=question.pk)
+        answers = answers.filter(question=question)
+    if quiz is not None:
+        questions = questions.filter(quizzes=quiz)
+        answers = answers.filter(quiz_attempt__quiz=quiz)
+
+    question_info = {
+        question_id: (question_type, points)
+        for question_id, question_type, points in questions.values_list('id', 'question_type', 'points')
+    }
+    correct_choice_ids = defaultdict(set)
+    for question_id, choice_id in Choice.objects.filter(
+        question_id__in=question_info, is_correct=True
+    ).values_list('question_id', 'id'):
+        correct_choice_ids[question_id].add(choice_id)
+
+    answer_rows = list(answers.filter(question_id__in=question_info).values_list(
+        'id', 'quiz_attempt_id', 'quiz_attempt__quiz_id', 'question_id',
+        'selected_choice_id', 'is_correct', 'points_earned', 'time_taken'
+    ))
+
+    # Selections for multi-select answers, as one set of choice IDs per answer
+    selected_choice_ids = defaultdict(set)
+    SelectedChoice = QuizAnswer.selected_choices.through
+    multi_select_ids = [row[0] for row in answer_rows if question_info[row[3]][0] == 'multi_select']
+    for start in range(0, len(multi_select_ids), batch_size):
+        for answer_id, choice_id in SelectedChoice.objects.filter(
+            quizanswer_id__in=multi_select_ids[start:start + batch_size]
+        ).values_list('quizanswer_id', 'choice_id'):
+            selected_choice_ids[answer_id].add(choice_id)
+
+    grades = []
+    newly_correct = 0
+    for answer_id, attempt_id, quiz_id, question_id, selected_choice_id, was_correct, old_points, time_taken in answer_rows:
+        question_type, points = question_info[question_id]
+        correct = correct_choice_ids[question_id]
+
+        if question_type == 'multi_select':
+            # Must select ALL correct choices and NO incorrect choices
+            selected = selected_choice_ids[answer_id]
+            is_correct = bool(selected) and selected == correct
+        else:
+            is_correct = selected_choice_id in correct
+        points_earned = points if is_correct else 0
+
+        if (is_correct, points_earned) == (was_correct, old_points):
+            continue
+
+        answer = QuizAnswer(
+            id=answer_id, quiz_attempt_id=attempt_id, question_id=question_id,
+            is_correct=is_correct, points_earned=points_earned, time_taken=time_taken
+        )
+        grades.append((answer, quiz_id, points, old_points, was_correct))
+        newly_correct += is_correct and not was_correct
+
+    results_changed = save_grades(grades, ['is_correct', 'points_earned'], batch_size=batch_size)
+
+    return {
+        'answers_checked': len(answer_rows),
+        'answers_changed': len(grades),
+        'newly_correct': newly_correct,
+        'newly_incorrect': len(grades) - newly_correct,
+        'attempts_rescored': len({answer.quiz_attempt_id for answer, *_ in grades}),
+        'results_changed': results_changed,
+    }
@@ -0,0 +1,51 @@
+from django.contrib import messages
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+# Results are keyed on QuizAttempt.results_version and the quiz's snapshot version, so
+# entries are never read again once either is bumped; the timeout only bounds how long they linger.
+RESULTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _results_version(attempt):
+    return f'{attempt.id}:{attempt.results_version}:{attempt.quiz.snapshot_version}'
+
+
+def get_attempt_results(kind, attempt, build):
+    """
+    Return the cached payload of one of an attempt's results pages ('results' or 'review'),
+    calling build() to create it on a miss. Only finished attempts should be cached;
+    after that they only change when they're graded, which bumps the version.
+    """
+    key = f'attempt_{kind}:{_results_version(attempt)}'
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, RESULTS_CACHE_TIMEOUT)
+    return payload
+
+
+def get_results_validators(kind, attempt, viewer):
+    """ETag and Last-Modified timestamp for a results page as seen by the given kind of viewer"""
+    etag = quote_etag(f'{kind}:{_results_version(attempt)}:{viewer}')
+    modified = attempt.results_updated_at or attempt.end_time or attempt.start_time
+    return etag, int(modified.timestamp())
+
+
+def get_not_modified_response(request, etag, last_modified):
+    """
+    Return a 304 if the browser's copy of the page is still current, otherwise None.
+    Pages with flash messages waiting are always rendered so the messages aren't lost.
+    """
+    if request.method != 'GET' or len(messages.get_messages(request)):
+        return None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def add_results_headers(response, etag, last_modified):
+    """Let the browser keep the page but revalidate it on every view"""
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
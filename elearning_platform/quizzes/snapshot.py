@@ -0,0 +1,112 @@
+import random
+
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Quiz
+
+# Snapshots are keyed on Quiz.snapshot_version, so stale entries are never read
+# again once the version is bumped; the timeout only bounds how long they linger.
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+class QuizSnapshot:
+    """
+    Read-only, versioned view of a quiz's ordered questions, choices and answer keys.
+    Built once per quiz edit and shared from the cache by every request that needs it.
+    """
+
+    def __init__(self, quiz_id, version, questions):
+        self.quiz_id = quiz_id
+        self.version = version
+        self.questions = tuple(questions)
+        self.question_ids = tuple(question.id for question in self.questions)
+        self.questions_by_id = {question.id: question for question in self.questions}
+        self.choices = {}
+        self.correct_choice_ids = {}
+        for question in self.questions:
+            question_choices = tuple(question.choices.all())
+            self.choices[question.id] = question_choices
+            self.correct_choice_ids[question.id] = frozenset(
+                choice.id for choice in question_choices if choice.is_correct
+            )
+        self.points = {question.id: question.points for question in self.questions}
+        self.time_limits = {question.id: question.time_limit for question in self.questions}
+        self.total_points = sum(self.points.values())
+        self.total_time = sum(self.time_limits.values())
+
+    def __len__(self):
+        return len(self.questions)
+
+    def question_at(self, number):
+        """Return the question at the given 1-based position"""
+        return self.questions[number - 1]
+
+    def draw(self, count):
+        """
+        Pick count questions at random from the quiz's question IDs, in a random order.
+        Returns None when the attempt should simply ask every question in order.
+        """
+        if not count or count >= len(self.question_ids):
+            return None
+        return random.sample(self.question_ids, count)
+
+    def questions_for(self, attempt):
+        """
+        Return the questions an attempt asks, in order: the ones drawn for it, or every question.
+        Drawn questions that have since been removed from the quiz are skipped.
+        """
+        question_ids = attempt.get_question_ids()
+        if not question_ids:
+            return self.questions
+        return tuple(
+            self.questions_by_id[question_id] for question_id in question_ids
+            if question_id in self.questions_by_id
+        )
+
+    def get_choices(self, question_id):
+        """Return the choices for a question in display order"""
+        return self.choices.get(question_id, ())
+
+    def get_choice(self, question_id, choice_id):
+        """Return one of the question's choices by ID, or None if it doesn't belong to it"""
+        try:
+            choice_id = int(choice_id)
+        except (TypeError, ValueError):
+            return None
+        for choice in self.get_choices(question_id):
+            if choice.id == choice_id:
+                return choice
+        return None
+
+
+def _snapshot_cache_key(quiz_id, version):
+    return f'quiz_snapshot:{quiz_id}:{version}'
+
+
+def build_quiz_snapshot(quiz):
+    """Load the quiz's questions and choices from the database into a new snapshot"""
+    questions = quiz.questions.order_by('quizquestion__order').prefetch_related('choices')
+    return QuizSnapshot(quiz.id, quiz.snapshot_version, questions)
+
+
+def get_quiz_snapshot(quiz):
+    """Return the current snapshot for a quiz, building and caching it on a miss"""
+    key = _snapshot_cache_key(quiz.id, quiz.snapshot_version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_quiz_snapshot(quiz)
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def invalidate_quiz_snapshots(quiz_ids):
+    """Bump the snapshot version of every given quiz in a single UPDATE"""
+    quiz_ids = {quiz_id for quiz_id in quiz_ids if quiz_id}
+    if quiz_ids:
+        Quiz.objects.filter(id__in=quiz_ids).update(snapshot_version=F('snapshot_version') + 1)
+
+
+def invalidate_quiz_snapshot(quiz):
+    """Bump a quiz's snapshot version so the next read rebuilds it"""
+    invalidate_quiz_snapshots([getattr(quiz, 'id', quiz)])
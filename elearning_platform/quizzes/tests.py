@@ -1,3 +1,1096 @@
-from django.test import TestCase
+import json
+import tempfile
+import uuid
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User, PaymentProof, StudentProfile
+from courses.models import Course
+from .models import (
+    Quiz, Question, QuizQuestion, Choice, QuizAttempt, QuizAnswer, QuestionStats, ItemAnalysis, AttemptState,
+    VoiceRecording
+)
+from .forms import ChoiceFormSet
+from .navigation import get_attempt_state, save_attempt_state
+from .regrade import regrade_answers
+from .snapshot import get_quiz_snapshot, invalidate_quiz_snapshot
+from .transfer import QuizImportError, export_quiz, import_quiz
+from .uploads import append_upload_chunk, finish_voice_upload, get_upload_offset
+
+
+class QuizTestCase(TestCase):
+    """Shared fixture: a quiz with one question of each auto-graded type and a short answer"""
+
+    QUESTION_TYPES = ['multiple_choice', 'multi_select', 'true_false', 'short_answer', 'star_rating']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', password='pw', user_type='teacher', is_staff=True)
+        cls.student = User.objects.create_user('student', password='pw', user_type='student')
+        StudentProfile.objects.create(user=cls.student)
+        cls.course = Course.objects.create(title='Course', description='', placement_test_price=0)
+        PaymentProof.objects.create(user=cls.student, course=cls.course, proof_image='proof.png', status='approved')
+        cls.quiz = Quiz.objects.create(title='Quiz', course=cls.course, passing_score=50)
+
+        cls.questions = []
+        for order, question_type in enumerate(cls.QUESTION_TYPES):
+            question = Question.objects.create(text=f'Question {order}', question_type=question_type, points=10)
+            QuizQuestion.objects.create(quiz=cls.quiz, question=question, order=order)
+            for index in range(3):
+                Choice.objects.create(
+                    question=question,
+                    text=f'Choice {index}',
+                    is_correct=index == 0 or (question_type == 'multi_select' and index == 1)
+                )
+            cls.questions.append(question)
+
+    def setUp(self):
+        cache.clear()
+        self.quiz.refresh_from_db()
+
+    def start_attempt(self):
+        return QuizAttempt.objects.create(student=self.student, quiz=self.quiz)
+
+    def answer(self, attempt, question, **kwargs):
+        return QuizAnswer.objects.create(quiz_attempt=attempt, question=question, **kwargs)
+
+    def complete_attempt(self):
+        attempt = self.start_attempt()
+        for question in self.questions:
+            self.answer(attempt, question, is_correct=True, points_earned=question.points,
+                        selected_choice=question.choices.first(), text_answer='answer')
+        attempt.complete()
+        return attempt
+
+
+class QuizSnapshotTests(QuizTestCase):
+    """take_quiz, quiz_review and quiz_detail read questions and answer keys from a cached, versioned snapshot"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.teacher)
+
+    def choice_formset_data(self, question, correct_index):
+        formset = ChoiceFormSet(instance=question)
+        choices = list(question.choices.order_by('id'))
+        data = {
+            f'{formset.prefix}-TOTAL_FORMS': len(choices),
+            f'{formset.prefix}-INITIAL_FORMS': len(choices),
+            f'{formset.prefix}-MIN_NUM_FORMS': 0,
+            f'{formset.prefix}-MAX_NUM_FORMS': 1000,
+        }
+        for index, choice in enumerate(choices):
+            data[f'{formset.prefix}-{index}-id'] = choice.id
+            data[f'{formset.prefix}-{index}-question'] = question.id
+            data[f'{formset.prefix}-{index}-text'] = choice.text
+            if index == correct_index:
+                data[f'{formset.prefix}-{index}-is_correct'] = 'on'
+        return data
+
+    def test_snapshot_is_built_once(self):
+        snapshot = get_quiz_snapshot(self.quiz)
+        self.assertEqual(snapshot.question_ids, tuple(question.id for question in self.questions))
+        with self.assertNumQueries(0):
+            get_quiz_snapshot(self.quiz)
+
+    def test_editing_choices_rebuilds_the_snapshot(self):
+        question = self.questions[0]
+        get_quiz_snapshot(self.quiz)
+        response = self.client.post(reverse('edit_question_choices', args=[question.id]),
+                                    self.choice_formset_data(question, correct_index=2))
+        self.assertEqual(response.status_code, 302)
+
+        self.quiz.refresh_from_db()
+        new_correct = question.choices.order_by('id')[2]
+        self.assertEqual(get_quiz_snapshot(self.quiz).correct_choice_ids[question.id], {new_correct.id})
+
+    def test_editing_points_rebuilds_the_snapshot(self):
+        get_quiz_snapshot(self.quiz)
+        self.client.post(reverse('quiz_detail', args=[self.quiz.id]), {
+            'adjust_max_points': '1', 'adjustment_type': 'adjust_questions'
+        })
+        self.quiz.refresh_from_db()
+        self.assertEqual(get_quiz_snapshot(self.quiz).total_points, self.quiz.max_points)
+
+    def test_saving_a_stale_quiz_keeps_the_snapshot_version(self):
+        stale = Quiz.objects.get(id=self.quiz.id)
+        invalidate_quiz_snapshot(self.quiz)
+        stale.title = 'Renamed'
+        stale.save()
+
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.title, 'Renamed')
+        self.assertEqual(self.quiz.snapshot_version, stale.snapshot_version + 1)
+
+
+class BatchSubmissionTests(QuizTestCase):
+    """submit_quiz_answers grades pages of answers in memory, with the same position and timers as take_quiz"""
+
+    def setUp(self):
+        super().setUp()
+        self.attempt = self.start_attempt()
+        self.url = reverse('submit_quiz_answers', args=[self.attempt.id])
+        self.client.force_login(self.student)
+
+    def get_page(self, limit=10):
+        return self.client.get(self.url, {'limit': limit}).json()
+
+    def correct_answer(self, question):
+        correct = [str(choice.id) for choice in question.choices.filter(is_correct=True)]
+        return {'question_id': question.id, 'choice': correct[0], 'choices': correct,
+                'text_answer': 'answer', 'rating': 4}
+
+    def submit(self, answers, token=None):
+        body = {'answers': answers, 'submission_token': (token or uuid.uuid4()).hex}
+        return self.client.post(self.url, json.dumps(body), content_type='application/json').json()
+
+    def test_page_starts_the_question_timers(self):
+        page = self.get_page(limit=2)
+        self.assertEqual([question['number'] for question in page['questions']], [1, 2])
+        state = AttemptState.objects.get(attempt=self.attempt)
+        self.assertIsNotNone(state.get_started_at(1))
+        self.assertIsNone(state.get_started_at(2))
+
+    def test_page_is_graded_in_memory_and_totals_kept(self):
+        self.get_page(limit=3)
+        answers = [self.correct_answer(question) for question in self.questions[:3]]
+        answers[2]['choice'] = str(self.questions[2].choices.get(is_correct=False, text='Choice 1').id)
+
+        response = self.submit(answers)
+        self.assertEqual((response['saved'], response['next_question'], response['completed']), (3, 4, False))
+        self.attempt.refresh_from_db()
+        self.assertEqual((self.attempt.answered_count, self.attempt.correct_count, self.attempt.points_earned),
+                         (3, 2, 20))
+        multi_select = self.attempt.answers.get(question=self.questions[1])
+        self.assertEqual(multi_select.selected_choices.count(), 2)
+
+    def test_partial_pages_continue_in_order(self):
+        self.get_page(limit=2)
+        self.submit([self.correct_answer(question) for question in self.questions[:2]])
+
+        # Going back, or skipping ahead, is refused
+        for questions in (self.questions[1:3], self.questions[3:4]):
+            response = self.client.post(self.url, json.dumps({
+                'answers': [self.correct_answer(question) for question in questions]
+            }), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+        page = self.get_page()
+        self.assertEqual(page['next_question'], 3)
+        self.assertEqual([question['id'] for question in page['questions']],
+                         [question.id for question in self.questions[2:]])
+
+        # take_quiz carries on from the same place
+        response = self.client.get(reverse('take_quiz', args=[self.attempt.id]) + '?question=1')
+        self.assertTrue(response['Location'].endswith('?question=3'))
+
+    def test_replayed_page_is_stored_once(self):
+        self.get_page(limit=2)
+        answers = [self.correct_answer(question) for question in self.questions[:2]]
+        token = uuid.uuid4()
+        first = self.submit(answers, token)
+        replay = self.submit(answers, token)
+        self.assertTrue(replay['replayed'])
+        self.assertEqual(replay['redirect_url'], first['redirect_url'])
+
+        cache.clear()
+        self.assertTrue(self.submit(answers, token)['replayed'])
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.answered_count, 2)
+
+    def test_answers_after_the_question_time_are_stored_blank(self):
+        self.get_page(limit=1)
+        state = get_attempt_state(self.attempt)
+        state.set_started_at(0, state.get_started_at(0) - self.questions[0].time_limit - 60)
+        save_attempt_state(state)
+
+        self.submit([self.correct_answer(self.questions[0])])
+        answer = self.attempt.answers.get()
+        self.assertEqual((answer.is_correct, answer.points_earned, answer.time_taken),
+                         (False, 0, self.questions[0].time_limit))
+
+    def test_last_page_completes_the_attempt(self):
+        self.get_page()
+        response = self.submit([self.correct_answer(question) for question in self.questions])
+        self.assertTrue(response['completed'])
+        self.assertEqual(response['redirect_url'], reverse('quiz_results', args=[self.attempt.id]))
+
+        self.attempt.refresh_from_db()
+        self.assertTrue(self.attempt.completed)
+        self.assertEqual(self.attempt.score, 80)  # the short answer waits for the teacher
+        self.assertEqual(self.submit([self.correct_answer(self.questions[0])])['error'], 'Quiz already completed')
+
+    def test_questions_already_answered_are_not_stored_again(self):
+        # An attempt that skipped question 1 without storing an answer, then answered question 2
+        self.answer(self.attempt, self.questions[1], is_correct=True, points_earned=10)
+        page = self.get_page()
+        self.assertEqual([question['id'] for question in page['questions']],
+                         [question.id for question in self.questions[2:]])
+
+        # A page that reaches an answered question further on stores the rest around it
+        self.answer(self.attempt, self.questions[3], text_answer='earlier')
+        response = self.submit([self.correct_answer(question) for question in self.questions[2:]])
+        self.assertEqual((response['saved'], response['completed']), (2, True))
+        self.assertEqual(self.attempt.answers.get(question=self.questions[3]).text_answer, 'earlier')
+
+    def test_paged_page_renders(self):
+        response = self.client.get(reverse('take_quiz_paged', args=[self.attempt.id]))
+        self.assertContains(response, self.url)
+
+
+class QuizAggregateTests(QuizTestCase):
+    """Quiz.total_points, question_count and total_time_seconds follow question changes through signals"""
+
+    def aggregates(self):
+        self.quiz.refresh_from_db()
+        return self.quiz.total_points, self.quiz.question_count, self.quiz.total_time_seconds
+
+    def test_aggregates_match_the_questions(self):
+        self.assertEqual(self.aggregates(), (50, 5, 300))
+        self.assertEqual(self.quiz.get_total_question_time(), 5)
+
+    def test_question_changes_update_the_aggregates(self):
+        question = self.questions[0]
+        question.points = 30
+        question.time_limit = 120
+        question.save()
+        self.assertEqual(self.aggregates(), (70, 5, 360))
+
+        question = Question.objects.create(text='Another', points=5, time_limit=30)
+        QuizQuestion.objects.create(quiz=self.quiz, question=question, order=9)
+        self.assertEqual(self.aggregates(), (75, 6, 390))
+
+        self.questions[1].delete()
+        self.assertEqual(self.aggregates(), (65, 5, 330))
+
+    def test_saving_a_stale_quiz_keeps_the_aggregates(self):
+        stale = Quiz.objects.get(id=self.quiz.id)
+        self.questions[0].delete()
+        stale.passing_score = 70
+        stale.save()
+        self.assertEqual(self.aggregates(), (40, 4, 240))
+        self.assertEqual(self.quiz.passing_score, 70)
+
+
+class SingleRelationshipPathTests(QuizTestCase):
+    """Quiz membership only goes through QuizQuestion and answers only through quiz_attempt"""
+
+    def test_questions_follow_quiz_question_order(self):
+        QuizQuestion.objects.filter(question=self.questions[0]).update(order=99)
+        ordered = list(self.quiz.questions.order_by('quizquestion__order'))
+        self.assertEqual(ordered, self.questions[1:] + self.questions[:1])
+
+    def test_aggregates_follow_quiz_question(self):
+        self.assertEqual(self.quiz.get_question_count(), 5)
+        self.assertEqual(self.quiz.get_total_points(), 50)
+
+        QuizQuestion.objects.filter(question=self.questions[0]).delete()
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.get_question_count(), 4)
+        self.assertEqual(self.quiz.get_total_points(), 40)
+
+    def test_edit_quiz_questions_places_new_question_in_quiz(self):
+        self.client.force_login(self.teacher)
+        data = {
+            'form-TOTAL_FORMS': '1',
+            'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000',
+            'form-0-text': 'New question',
+            'form-0-question_type': 'short_answer',
+            'form-0-time_limit': '60',
+            'form-0-points': '5',
+            'form-0-order': '7',
+        }
+        response = self.client.post(reverse('edit_quiz_questions', args=[self.quiz.id]), data)
+        self.assertRedirects(response, reverse('quiz_detail', args=[self.quiz.id]))
+
+        quiz_question = QuizQuestion.objects.get(quiz=self.quiz, question__text='New question')
+        self.assertEqual(quiz_question.order, 7)
+
+    def test_attempt_answers_use_quiz_attempt(self):
+        attempt = self.complete_attempt()
+        self.assertEqual(attempt.get_answers().count(), len(self.questions))
+
+
+class QuestionStatsTests(QuizTestCase):
+    """Per-question analytics are read from QuestionStats, which answer saves keep up to date"""
+
+    def get_stats(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('quiz_analytics', args=[self.quiz.id]))
+        return {stat['question'].id: stat for stat in response.context['question_stats']}
+
+    def test_stats(self):
+        attempt = self.start_attempt()
+        first, second = self.questions[:2]
+        self.answer(attempt, first, is_correct=True, points_earned=10, time_taken=20)
+        self.answer(attempt, second, time_taken=40)
+        other = self.start_attempt()
+        self.answer(other, first, time_taken=10)
+
+        stats = self.get_stats()
+        self.assertEqual(stats[first.id]['total_answers'], 2)
+        self.assertEqual(stats[first.id]['correct_answers'], 1)
+        self.assertEqual(stats[first.id]['correct_percentage'], 50)
+        self.assertEqual(stats[first.id]['avg_time_taken'], 15)
+        self.assertEqual(stats[first.id]['avg_points'], 5)
+        self.assertEqual(stats[second.id]['correct_percentage'], 0)
+        self.assertEqual(stats[self.questions[2].id]['total_answers'], 0)
+
+    def test_incremental_stats_match_rebuild(self):
+        attempt = self.start_attempt()
+        first, second = self.questions[:2]
+        self.answer(attempt, first, is_correct=True, points_earned=10, time_taken=20)
+        answer = self.answer(attempt, second, time_taken=40)
+        answer.points_earned = 4
+        answer.save()
+        self.answer(self.start_attempt(), first, time_taken=10)
+
+        fields = ('quiz_id', 'question_id') + QuestionStats.COUNTER_FIELDS
+        incremental = set(QuestionStats.objects.values_list(*fields))
+        call_command('rebuild_question_stats', stdout=StringIO())
+        self.assertEqual(set(QuestionStats.objects.values_list(*fields)), incremental)
+
+        stats = QuestionStats.objects.get(question=first)
+        self.assertEqual(stats.get_time_taken_stddev(), 5)
+        self.assertEqual((stats.no_points_count, stats.partial_points_count, stats.full_points_count), (1, 0, 1))
+        self.assertEqual(QuestionStats.objects.get(question=second).partial_points_count, 1)
+
+    def test_grading_updates_stats(self):
+        attempt = self.start_attempt()
+        answer = self.answer(attempt, self.questions[3], text_answer='answer')
+        self.assertEqual(self.get_stats()[answer.question_id]['correct_answers'], 0)
+
+        answer.is_correct = True
+        answer.points_earned = 10
+        answer.save()
+        self.assertEqual(self.get_stats()[answer.question_id]['correct_answers'], 1)
+
+
+class AttemptDeadlineTests(QuizTestCase):
+    """Attempts carry an absolute deadline that the timer endpoints count down to without writing"""
+
+    def expire(self, attempt):
+        QuizAttempt.objects.filter(id=attempt.id).update(deadline=timezone.now() - timedelta(seconds=1))
+        cache.clear()
+
+    def test_deadline_set_on_start(self):
+        attempt = self.start_attempt()
+        expected = attempt.start_time + timedelta(minutes=self.quiz.time_limit)
+        self.assertAlmostEqual(attempt.deadline, expected, delta=timedelta(seconds=5))
+
+    def test_get_timer_does_not_close_expired_attempt(self):
+        attempt = self.start_attempt()
+        self.expire(attempt)
+        self.client.force_login(self.student)
+        data = self.client.get(reverse('get_timer', args=[attempt.id])).json()
+        self.assertTrue(data['timed_out'])
+
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.status, 'in_progress')
+
+    def test_take_quiz_closes_expired_attempt(self):
+        attempt = self.start_attempt()
+        self.answer(attempt, self.questions[0], is_correct=True, points_earned=10)
+        self.expire(attempt)
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('take_quiz', args=[attempt.id]))
+        self.assertRedirects(response, reverse('quiz_results', args=[attempt.id]))
+
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.status, 'timed_out')
+        self.assertTrue(attempt.completed)
+        self.assertEqual(attempt.score, 20)
+
+    def test_timer_stream(self):
+        attempt = self.start_attempt()
+        QuizAttempt.objects.filter(id=attempt.id).update(deadline=timezone.now() + timedelta(seconds=1))
+
+        async def read_stream():
+            client = AsyncClient()
+            await client.aforce_login(self.student)
+            response = await client.get(reverse('timer_stream', args=[attempt.id]))
+            return response, b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        response, body = async_to_sync(read_stream)()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('"remaining_seconds": 1', body)
+        self.assertIn('event: timeout', body)
+
+    def test_timer_stream_ends_when_attempt_finishes(self):
+        attempt = self.start_attempt()
+        QuizAttempt.objects.filter(id=attempt.id).update(deadline=timezone.now() + timedelta(seconds=1))
+
+        def finish():
+            attempt.refresh_from_db()
+            attempt.completed = True
+            attempt.save()
+
+        async def read_stream():
+            client = AsyncClient()
+            await client.aforce_login(self.student)
+            response = await client.get(reverse('timer_stream', args=[attempt.id]))
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+            await sync_to_async(finish)()
+            return first.decode(), b''.join([chunk async for chunk in chunks]).decode()
+
+        first, rest = async_to_sync(read_stream)()
+        self.assertIn('"remaining_seconds": 1', first)
+        self.assertIn('event: end', rest)
+        self.assertNotIn('event: timeout', rest)
+
+
+class AttemptStateTests(QuizTestCase):
+    """take_quiz keeps its position and per-question start times in AttemptState, not the session"""
+
+    def setUp(self):
+        super().setUp()
+        self.attempt = self.start_attempt()
+        self.url = reverse('take_quiz', args=[self.attempt.id])
+        self.client.force_login(self.student)
+
+    def shift_start(self, index, seconds):
+        """Pretend the question at index was first shown the given number of seconds earlier"""
+        state = get_attempt_state(self.attempt)
+        state.set_started_at(index, state.get_started_at(index) - seconds)
+        save_attempt_state(state)
+
+    def test_start_time_is_recorded_once_without_touching_the_session(self):
+        session_keys = set(self.client.session.keys())
+        self.client.get(f'{self.url}?question=1')
+        started_at = AttemptState.objects.get(attempt=self.attempt).get_started_at(0)
+        self.assertIsNotNone(started_at)
+
+        self.client.get(f'{self.url}?question=1')
+        self.assertEqual(AttemptState.objects.get(attempt=self.attempt).get_started_at(0), started_at)
+        self.assertEqual(set(self.client.session.keys()), session_keys)
+
+    def test_time_taken_and_position(self):
+        self.client.get(f'{self.url}?question=1')
+        self.shift_start(0, 30)
+        choice = self.questions[0].choices.get(is_correct=True)
+        self.client.post(f'{self.url}?question=1', {'choice': choice.id})
+        self.assertGreaterEqual(self.attempt.answers.get().time_taken, 30)
+
+        response = self.client.get(f'{self.url}?question=1')
+        self.assertRedirects(response, f'{self.url}?question=2', fetch_redirect_response=False)
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.answered_count, 1)
+
+    def test_question_times_out(self):
+        self.client.get(f'{self.url}?question=1')
+        self.shift_start(0, self.questions[0].time_limit)
+        response = self.client.get(f'{self.url}?question=1')
+        self.assertRedirects(response, f'{self.url}?question=2', fetch_redirect_response=False)
+
+        answer = self.attempt.answers.get()
+        self.assertEqual((answer.points_earned, answer.time_taken), (0, self.questions[0].time_limit))
+
+    def test_empty_submission_stores_a_blank_answer(self):
+        self.client.post(f'{self.url}?question=1', {})
+        choices = self.questions[1].choices.filter(is_correct=True)
+        self.client.post(f'{self.url}?question=2', {'choices': [choice.id for choice in choices]})
+        self.attempt.refresh_from_db()
+        self.assertEqual((self.attempt.answered_count, self.attempt.correct_count), (2, 1))
+        self.assertFalse(self.attempt.answers.get(question=self.questions[0]).is_correct)
+
+        response = self.client.get(f'{self.url}?question=2')
+        self.assertRedirects(response, f'{self.url}?question=3', fetch_redirect_response=False)
+
+    def test_answered_questions_are_stepped_over(self):
+        # An attempt that skipped question 1 without storing an answer, then answered question 2
+        self.answer(self.attempt, self.questions[1], is_correct=True, points_earned=10)
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.answered_count, 1)
+
+        response = self.client.get(f'{self.url}?question=2')
+        self.assertRedirects(response, f'{self.url}?question=3', fetch_redirect_response=False)
+        response = self.client.post(f'{self.url}?question=2', {})
+        self.assertRedirects(response, f'{self.url}?question=3', fetch_redirect_response=False)
+        self.assertEqual(self.attempt.answers.count(), 1)
+
+
+class SubmissionTokenTests(QuizTestCase):
+    """Retries of a take_quiz answer with the same token are sent where the first submission went"""
+
+    def setUp(self):
+        super().setUp()
+        self.attempt = self.start_attempt()
+        self.url = reverse('take_quiz', args=[self.attempt.id])
+        self.client.force_login(self.student)
+        self.token = self.client.get(f'{self.url}?question=1').context['submission_token']
+        self.choice = self.questions[0].choices.get(is_correct=True)
+
+    def submit(self):
+        return self.client.post(f'{self.url}?question=1', {'choice': self.choice.id, 'submission_token': self.token})
+
+    def test_replay_is_answered_from_the_cache(self):
+        first = self.submit()
+        # Only the session, user, profile and attempt lookups
+        with self.assertNumQueries(4):
+            replay = self.submit()
+        self.assertEqual(replay['Location'], first['Location'])
+        self.assertEqual(self.attempt.answers.get().submission_token, self.token)
+
+    def test_replay_after_the_cache_is_cleared(self):
+        first = self.submit()
+        cache.clear()
+        replay = self.submit()
+        self.assertEqual(replay['Location'], first['Location'])
+        self.assertEqual(self.attempt.answers.count(), 1)
+        # The replay isn't told off for going back to an answered question
+        self.assertEqual(list(get_messages(replay.wsgi_request)), [])
+
+
+class ExpireQuizAttemptsTests(QuizTestCase):
+    """The sweeper closes overdue attempts in bulk and scores them like complete() does"""
+
+    def test_expires_overdue_attempts(self):
+        overdue = self.start_attempt()
+        self.answer(overdue, self.questions[0], is_correct=True, points_earned=10)
+        self.answer(overdue, self.questions[1], is_correct=True, points_earned=10)
+        self.answer(overdue, self.questions[2], is_correct=True, points_earned=10)
+        QuizAttempt.objects.filter(id=overdue.id).update(deadline=timezone.now() - timedelta(seconds=1))
+        open_attempt = self.start_attempt()
+
+        output = StringIO()
+        # Savepoint, the locked SELECT of overdue attempts, the UPDATE, one course progress UPDATE, release
+        with self.assertNumQueries(5):
+            call_command('expire_quiz_attempts', stdout=output)
+        self.assertIn('Expired 1 overdue', output.getvalue())
+
+        overdue.refresh_from_db()
+        self.assertEqual(overdue.status, 'timed_out')
+        self.assertTrue(overdue.completed)
+        self.assertIsNotNone(overdue.end_time)
+        self.assertEqual(overdue.score, 60)
+        self.assertEqual(overdue.result, overdue.determine_result())
+        open_attempt.refresh_from_db()
+        self.assertEqual(open_attempt.status, 'in_progress')
+
+    def test_placement_test_results(self):
+        Quiz.objects.filter(id=self.quiz.id).update(is_placement_test=True)
+        attempt = self.start_attempt()
+        self.answer(attempt, self.questions[0], is_correct=True, points_earned=10)
+        self.answer(attempt, self.questions[1], is_correct=True, points_earned=10)
+        QuizAttempt.objects.filter(id=attempt.id).update(deadline=timezone.now() - timedelta(seconds=1))
+
+        call_command('expire_quiz_attempts', stdout=StringIO())
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.result, 'intermediate')
+
+    def test_drops_cached_timer_and_state(self):
+        attempt = self.start_attempt()
+        QuizAttempt.objects.filter(id=attempt.id).update(deadline=timezone.now() + timedelta(minutes=5))
+        self.client.force_login(self.student)
+        self.client.get(reverse('take_quiz', args=[attempt.id]))
+        self.assertIn('remaining_seconds', self.client.get(reverse('get_timer', args=[attempt.id])).json())
+
+        QuizAttempt.objects.filter(id=attempt.id).update(deadline=timezone.now() - timedelta(seconds=1))
+        call_command('expire_quiz_attempts', stdout=StringIO())
+
+        self.assertIsNone(cache.get(f'attempt_timer:{attempt.id}'))
+        self.assertIsNone(cache.get(f'attempt_state:{attempt.id}'))
+        response = self.client.get(reverse('get_timer', args=[attempt.id])).json()
+        self.assertEqual(response['error'], 'Quiz already completed')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class VoiceUploadTests(QuizTestCase):
+    """Voice recordings are uploaded in resumable binary chunks and stored with their answer in one step"""
+
+    def setUp(self):
+        super().setUp()
+        self.question = Question.objects.create(text='Say something', question_type='voice_record')
+        QuizQuestion.objects.filter(quiz=self.quiz).update(order=F('order') + 1)
+        QuizQuestion.objects.create(quiz=self.quiz, question=self.question, order=0)
+        self.quiz.refresh_from_db()
+        self.attempt = self.start_attempt()
+        self.client.force_login(self.student)
+        self.url = reverse('upload_voice_recording', args=[self.attempt.id]) + f'?question_id={self.question.id}'
+
+    def send(self, data, offset, **headers):
+        return self.client.post(
+            self.url, data, content_type='application/octet-stream',
+            headers={'Upload-Offset': str(offset), **headers}
+        )
+
+    def test_chunked_upload_with_resume(self):
+        self.assertEqual(self.client.get(self.url).json()['offset'], 0)
+        self.assertEqual(self.send(b'abc', 0).json()['offset'], 3)
+
+        # A retried chunk from before the connection dropped is refused with the real offset
+        response = self.send(b'abc', 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 3)
+        self.assertEqual(self.client.get(self.url).json()['offset'], 3)
+
+        data = self.send(b'def', 3, **{'Upload-Complete': '1', 'Upload-Duration': '4'}).json()
+        self.assertTrue(data['completed'])
+        self.assertTrue(data['next_url'].endswith('?question=2'))
+
+        answer = self.attempt.answers.get()
+        self.assertEqual(answer.question, self.question)
+        self.assertEqual(answer.voice_answer.duration, 4)
+        with answer.voice_answer.recording.open('rb') as recording:
+            self.assertEqual(recording.read(), b'abcdef')
+
+    def test_rejects_other_questions(self):
+        url = reverse('upload_voice_recording', args=[self.attempt.id]) + f'?question_id={self.questions[0].id}'
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_duplicate_final_chunk_keeps_the_first_answer(self):
+        self.send(b'abc', 0, **{'Upload-Complete': '1'})
+        answer = self.attempt.answers.get()
+
+        append_upload_chunk(self.attempt.id, self.question.id, BytesIO(b'xyz'), 0)
+        self.assertIsNone(finish_voice_upload(self.attempt, self.question, self.student, 0, 0))
+        self.assertEqual(list(self.attempt.answers.all()), [answer])
+        self.assertEqual(VoiceRecording.objects.count(), 1)
+        self.assertEqual(get_upload_offset(self.attempt.id, self.question.id), 0)
+
+
+class RegradeTests(QuizTestCase):
+    """Changing the answer key regrades existing answers in bulk and re-scores their attempts"""
+
+    def test_regrade_after_answer_key_change(self):
+        multiple_choice, multi_select = self.questions[:2]
+        wrong_choice = multiple_choice.choices.get(text='Choice 1')
+        attempt = self.start_attempt()
+        self.answer(attempt, multiple_choice, selected_choice=wrong_choice)
+        multi_answer = self.answer(attempt, multi_select, is_correct=True, points_earned=10)
+        multi_answer.selected_choices.set(multi_select.choices.filter(is_correct=True))
+        attempt.complete()
+        self.assertEqual((attempt.score, attempt.result), (20, 'failed'))
+
+        # Choice 1 becomes the right answer, and the multi-select key gains a third choice
+        multiple_choice.choices.update(is_correct=False)
+        Choice.objects.filter(id=wrong_choice.id).update(is_correct=True)
+        multi_select.choices.update(is_correct=True)
+
+        output = StringIO()
+        call_command('regrade_answers', quiz=self.quiz.id, stdout=output)
+        self.assertIn('2 changed (1 now correct, 1 now incorrect)', output.getvalue())
+        self.assertIn('Re-scored 1 attempts, 0 results changed', output.getvalue())
+
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.points_earned, attempt.correct_count, attempt.score), (10, 1, 20))
+        stats = QuestionStats.objects.get(quiz=self.quiz, question=multiple_choice)
+        self.assertEqual((stats.correct_count, stats.points_sum), (1, 10))
+
+    def test_regrade_changes_result(self):
+        Quiz.objects.filter(id=self.quiz.id).update(passing_score=20)
+        question = self.questions[0]
+        attempt = self.start_attempt()
+        self.answer(attempt, question, selected_choice=question.choices.get(text='Choice 2'))
+        attempt.complete()
+        self.assertEqual(attempt.result, 'failed')
+
+        Choice.objects.filter(question=question, text='Choice 2').update(is_correct=True)
+        report = regrade_answers(question=question)
+        self.assertEqual(report['results_changed'], 1)
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.score, attempt.result), (20, 'passed'))
+
+
+class BulkGradingTests(QuizTestCase):
+    """grade_submissions saves a whole batch of manual grades and re-scores the attempts together"""
+
+    def setUp(self):
+        super().setUp()
+        self.short_answer = self.questions[3]
+        self.attempts = []
+        for index in range(3):
+            student = User.objects.create_user(f'student{index}', password='pw', user_type='student')
+            attempt = QuizAttempt.objects.create(student=student, quiz=self.quiz)
+            self.answer(attempt, self.short_answer, text_answer='answer')
+            attempt.complete()
+            self.attempts.append(attempt)
+        self.client.force_login(self.teacher)
+
+    def post_grades(self, grades):
+        data = {'answer_id': []}
+        for answer, is_correct, points in grades:
+            data['answer_id'].append(answer.id)
+            data[f'is_correct_{answer.id}'] = 'true' if is_correct else 'false'
+            data[f'points_{answer.id}'] = points
+            data[f'feedback_{answer.id}'] = f'Feedback {answer.id}'
+        return self.client.post(reverse('grade_submissions', args=[self.quiz.id]), data)
+
+    def test_batch_grading(self):
+        answers = [attempt.answers.get() for attempt in self.attempts]
+        self.post_grades([(answers[0], True, 10), (answers[1], True, 5), (answers[2], False, 10)])
+
+        scores = [(attempt.score, attempt.result) for attempt in QuizAttempt.objects.filter(
+            id__in=[attempt.id for attempt in self.attempts]).order_by('id')]
+        self.assertEqual(scores, [(20, 'failed'), (10, 'failed'), (0, 'failed')])
+        answers[1].refresh_from_db()
+        self.assertEqual((answers[1].points_earned, answers[1].feedback), (5, f'Feedback {answers[1].id}'))
+        stats = QuestionStats.objects.get(quiz=self.quiz, question=self.short_answer)
+        self.assertEqual((stats.correct_count, stats.points_sum, stats.partial_points_count), (2, 15, 1))
+
+    def test_invalid_batch_saves_nothing(self):
+        answers = [attempt.answers.get() for attempt in self.attempts]
+        self.post_grades([(answers[0], True, 10), (answers[1], True, 50)])
+        answers[0].refresh_from_db()
+        self.assertFalse(answers[0].is_correct)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        answers = [attempt.answers.get() for attempt in self.attempts]
+        with self.assertNumQueries(14):
+            self.post_grades([(answer, True, 10) for answer in answers])
+
+
+class QuestionPoolTests(QuizTestCase):
+    """Quizzes with a draw count give every attempt its own random set of questions"""
+
+    def setUp(self):
+        super().setUp()
+        Quiz.objects.filter(id=self.quiz.id).update(draw_count=3)
+        self.quiz.refresh_from_db()
+        self.client.force_login(self.student)
+
+    def start(self):
+        self.client.get(reverse('start_quiz', args=[self.quiz.id]))
+        return QuizAttempt.objects.get(student=self.student, quiz=self.quiz)
+
+    def test_attempt_stores_its_draw(self):
+        attempt = self.start()
+        question_ids = attempt.get_question_ids()
+        self.assertEqual(len(question_ids), 3)
+        self.assertEqual(len(set(question_ids)), 3)
+        self.assertTrue(set(question_ids) <= {question.id for question in self.questions})
+        self.assertEqual(len(attempt.question_ids), 12)
+        self.assertEqual(attempt.max_points, 30)
+
+    def test_take_quiz_follows_the_draw(self):
+        attempt = self.start()
+        question_ids = attempt.get_question_ids()
+        url = reverse('take_quiz', args=[attempt.id])
+        for number, question_id in enumerate(question_ids, 1):
+            response = self.client.get(f'{url}?question={number}')
+            self.assertEqual(response.context['question'].id, question_id)
+            self.answer(attempt, Question.objects.get(id=question_id), is_correct=True, points_earned=10)
+
+        response = self.client.get(f'{url}?question=4')
+        self.assertRedirects(response, reverse('quiz_results', args=[attempt.id]), fetch_redirect_response=False)
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.completed, attempt.score), (True, 100))
+
+    def test_full_quiz_is_not_stored(self):
+        Quiz.objects.filter(id=self.quiz.id).update(draw_count=0)
+        attempt = self.start()
+        self.assertEqual(attempt.get_question_ids(), ())
+        self.assertEqual(attempt.max_points, 50)
+
+
+class AdaptivePlacementTests(QuizTestCase):
+    """Adaptive placement tests pick questions from the answers so far and stop once the level is clear"""
+
+    def setUp(self):
+        super().setUp()
+        self.placement = Quiz.objects.create(
+            title='Placement', course=self.course, is_placement_test=True, is_adaptive=True
+        )
+        for index in range(30):
+            question = Question.objects.create(
+                text=f'Item {index}', question_type='multiple_choice', points=1,
+                difficulty=(index - 15) / 5, discrimination=1.5
+            )
+            QuizQuestion.objects.create(quiz=self.placement, question=question, order=index)
+            Choice.objects.create(question=question, text='Right', is_correct=True)
+            Choice.objects.create(question=question, text='Wrong')
+        self.client.force_login(self.student)
+
+    def take_test(self, answers_correctly):
+        self.client.get(reverse('take_placement_test', args=[self.course.id]))
+        attempt = QuizAttempt.objects.get(student=self.student, quiz=self.placement)
+        url = reverse('take_quiz', args=[attempt.id])
+
+        for number in range(1, 32):
+            response = self.client.get(f'{url}?question={number}')
+            if response.status_code == 302:
+                break
+            question = response.context['question']
+            self.answer(attempt, question, is_correct=answers_correctly, points_earned=int(answers_correctly),
+                        selected_choice=question.choices.get(is_correct=answers_correctly))
+
+        attempt.refresh_from_db()
+        return attempt
+
+    def test_strong_student_stops_early_as_advanced(self):
+        attempt = self.take_test(answers_correctly=True)
+        self.assertTrue(attempt.completed)
+        self.assertEqual(attempt.result, 'advanced')
+        self.assertLess(len(attempt.get_question_ids()), 15)
+        self.assertEqual(attempt.max_points, len(attempt.get_question_ids()))
+        self.assertGreater(attempt.ability, 1)
+
+    def test_weak_student_is_placed_as_beginner(self):
+        attempt = self.take_test(answers_correctly=False)
+        self.assertEqual(attempt.result, 'beginner')
+        self.assertLess(len(attempt.get_question_ids()), 15)
+
+    def test_unanswered_items_move_the_test_on(self):
+        self.client.get(reverse('take_placement_test', args=[self.course.id]))
+        attempt = QuizAttempt.objects.get(student=self.student, quiz=self.placement)
+        url = reverse('take_quiz', args=[attempt.id])
+
+        # The first item runs out of time, and every later one is submitted empty by its timer
+        self.client.get(f'{url}?question=1')
+        state = get_attempt_state(attempt)
+        state.set_started_at(0, state.get_started_at(0) - 3600)
+        save_attempt_state(state)
+        response = self.client.get(f'{url}?question=1')
+        self.assertRedirects(response, f'{url}?question=2', fetch_redirect_response=False)
+
+        shown = []
+        for number in range(2, 32):
+            response = self.client.get(f'{url}?question={number}')
+            if response.status_code == 302:
+                break
+            shown.append(response.context['question'].id)
+            response = self.client.post(f'{url}?question={number}', {})
+            self.assertRedirects(response, f'{url}?question={number + 1}', fetch_redirect_response=False)
+
+        attempt.refresh_from_db()
+        self.assertEqual(len(shown), len(set(shown)))
+        self.assertTrue(attempt.completed)
+        self.assertEqual(attempt.result, 'beginner')
+        self.assertEqual(attempt.answered_count, len(attempt.get_question_ids()))
+
+    def test_unfitted_questions_still_stop_early(self):
+        # Twelve questions with the default item parameters, as in a newly created test
+        QuizQuestion.objects.filter(quiz=self.placement, order__gte=12).delete()
+        Question.objects.filter(quizquestion__quiz=self.placement).update(difficulty=None, discrimination=None)
+        attempt = self.take_test(answers_correctly=True)
+        self.assertTrue(attempt.completed)
+        self.assertEqual(attempt.result, 'advanced')
+        self.assertLess(len(attempt.get_question_ids()), 12)
+
+
+class ResultsCachingTests(QuizTestCase):
+    """Finished attempts' results pages are revalidated with ETags that only change on grading"""
+
+    def test_unchanged_results_are_not_modified(self):
+        attempt = self.complete_attempt()
+        self.client.force_login(self.student)
+        for name in ['quiz_results', 'quiz_review']:
+            url = reverse(name, args=[attempt.id])
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_grading_changes_the_etag(self):
+        attempt = self.complete_attempt()
+        self.client.force_login(self.student)
+        url = reverse('quiz_review', args=[attempt.id])
+        etag = self.client.get(url)['ETag']
+
+        answer = attempt.answers.get(question=self.questions[3])
+        answer.points_earned = 5
+        answer.feedback = 'Close'
+        answer.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Close')
+
+
+class ItemAnalysisTests(QuizTestCase):
+    """analyse_items stores per-question difficulty, discrimination and choice counts, and the quiz's alpha"""
+
+    def setUp(self):
+        super().setUp()
+        # Student i gets the first i questions right, so every question separates strong students from weak ones
+        for index in range(len(self.questions) + 1):
+            student = User.objects.create_user(f'student{index}', password='pw', user_type='student')
+            attempt = QuizAttempt.objects.create(student=student, quiz=self.quiz)
+            for number, question in enumerate(self.questions):
+                correct = number < index
+                self.answer(attempt, question, is_correct=correct, points_earned=10 if correct else 0,
+                            selected_choice=question.choices.order_by('id')[0 if correct else 2])
+            attempt.complete()
+
+    def test_analysis(self):
+        call_command('analyse_items', quiz=self.quiz.id, stdout=StringIO())
+
+        analyses = {analysis.question_id: analysis for analysis in ItemAnalysis.objects.filter(quiz=self.quiz)}
+        first = analyses[self.questions[0].id]
+        self.assertEqual(first.respondents, 6)
+        self.assertAlmostEqual(first.difficulty, 5 / 6, places=3)
+        self.assertGreater(first.discrimination, 0.4)
+        choices = list(self.questions[0].choices.order_by('id'))
+        self.assertEqual(
+            [first.get_choice_count(choice.id) for choice in choices], [5, 0, 1]
+        )
+        self.quiz.refresh_from_db()
+        self.assertGreater(self.quiz.reliability, 0.8)
+
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('quiz_detail', args=[self.quiz.id]))
+        self.assertEqual(len(response.context['item_analysis']), len(self.questions))
+
+
+class QuizTransferTests(QuizTestCase):
+    """Quizzes survive an NDJSON export and re-import, which is written in batches"""
+
+    def test_round_trip(self):
+        lines = list(export_quiz(self.quiz))
+        self.assertEqual(len(lines), 1 + len(self.questions))
+
+        quiz, report = import_quiz(lines, course=self.course, batch_size=2)
+        self.assertEqual((report['questions'], report['choices']), (5, 15))
+        self.assertEqual(quiz.title, self.quiz.title)
+        self.assertEqual(
+            list(quiz.questions.order_by('quizquestion__order').values_list('text', 'question_type')),
+            [(question.text, question.question_type) for question in self.questions]
+        )
+        self.assertEqual(
+            sorted(Choice.objects.filter(question__quizzes=quiz, is_correct=True).values_list('question__text', 'text')),
+            sorted(Choice.objects.filter(question__quizzes=self.quiz, is_correct=True).values_list('question__text', 'text'))
+        )
+        quiz.refresh_from_db()
+        self.assertEqual((quiz.total_points, quiz.question_count), (50, 5))
+        self.assertEqual(QuestionStats.objects.filter(quiz=quiz).count(), 5)
+
+    def test_bad_line_imports_nothing(self):
+        lines = list(export_quiz(self.quiz))
+        lines.insert(3, json.dumps({'type': 'question', 'text': 'Broken', 'question_type': 'essay'}))
+        with self.assertRaises(QuizImportError):
+            import_quiz(lines, quiz=self.quiz)
+        self.assertEqual(QuizQuestion.objects.filter(quiz=self.quiz).count(), 5)
+        self.assertEqual(Question.objects.count(), 5)
+
+
+class QuizViewQueryCountTests(QuizTestCase):
+    """Query-count regression tests for the views that used to OR across both relationship paths"""
+
+    def test_take_quiz_get(self):
+        attempt = self.start_attempt()
+        self.client.force_login(self.student)
+        url = reverse('take_quiz', args=[attempt.id]) + '?question=1'
+        self.client.get(url)  # warm the quiz snapshot and attempt state
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_take_quiz_post(self):
+        attempt = self.start_attempt()
+        self.client.force_login(self.student)
+        url = reverse('take_quiz', args=[attempt.id]) + '?question=1'
+        self.client.get(url)
+        choice = self.questions[0].choices.get(is_correct=True)
+        with self.assertNumQueries(13):
+            response = self.client.post(url, {'choice': choice.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(attempt.answers.get().is_correct)
+
+    def test_quiz_results(self):
+        attempt = self.complete_attempt()
+        self.client.force_login(self.student)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('quiz_results', args=[attempt.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_quiz_review(self):
+        attempt = self.complete_attempt()
+        self.client.force_login(self.student)
+        url = reverse('quiz_review', args=[attempt.id])
+        self.client.get(url)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['question_answers']), len(self.questions))
+
+    def test_quiz_detail(self):
+        self.client.force_login(self.teacher)
+        url = reverse('quiz_detail', args=[self.quiz.id])
+        self.client.get(url)
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_quiz_analytics(self):
+        self.complete_attempt()
+        self.client.force_login(self.teacher)
+        with self.assertNumQueries(11):
+            response = self.client.get(reverse('quiz_analytics', args=[self.quiz.id]))
+        self.assertEqual(len(response.context['question_stats']), len(self.questions))
+
+    def test_quiz_analytics_query_count_does_not_grow_with_questions(self):
+        self.complete_attempt()
+        self.client.force_login(self.teacher)
+        url = reverse('quiz_analytics', args=[self.quiz.id])
+        with self.assertNumQueries(11):
+            self.client.get(url)
+        cache.clear()
+
+        for order in range(len(self.questions), 20):
+            question = Question.objects.create(text=f'Question {order}', question_type='short_answer')
+            QuizQuestion.objects.create(quiz=self.quiz, question=question, order=order)
+        with self.assertNumQueries(11):
+            self.client.get(url)
+
+    def test_grade_submissions(self):
+        self.complete_attempt()
+        self.client.force_login(self.teacher)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('grade_submissions', args=[self.quiz.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_timer(self):
+        attempt = self.start_attempt()
+        self.client.force_login(self.student)
+        url = reverse('get_timer', args=[attempt.id])
+        self.client.get(url)  # warm the timer cache
+        # Only the session, user and profile lookups; the attempt comes from the cache
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertTrue(response.json()['success'])
+
+    def test_update_question_order(self):
+        self.client.force_login(self.teacher)
+        question_ids = [question.id for question in reversed(self.questions)]
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                reverse('update_question_order'),
+                json.dumps({'quiz_id': self.quiz.id, 'question_ids': question_ids}),
+                content_type='application/json'
+            )
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(
+            list(self.quiz.questions.order_by('quizquestion__order').values_list('id', flat=True)),
+            question_ids
+        )
+
+    def test_update_question_order_rejects_foreign_questions(self):
+        self.client.force_login(self.teacher)
+        other = Question.objects.create(text='Elsewhere', question_type='short_answer', points=1)
+        question_ids = [question.id for question in reversed(self.questions)] + [other.id]
+        version = self.quiz.snapshot_version
+        response = self.client.post(
+            reverse('update_question_order'),
+            json.dumps({'quiz_id': self.quiz.id, 'question_ids': question_ids}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.snapshot_version, version)
+        self.assertEqual(
+            list(self.quiz.questions.order_by('quizquestion__order').values_list('id', flat=True)),
+            [question.id for question in self.questions]
+        )
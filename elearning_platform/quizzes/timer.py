@@ -0,0 +1,69 @@
+import math
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import QuizAttempt
+
+# The deadline never changes once an attempt starts, so the cached timer state only
+# has to be dropped when the attempt finishes; the timeout just bounds abandoned entries.
+TIMER_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How often the timer stream (served under ASGI only) re-sends the remaining time so clients can correct drift
+TIMER_STREAM_INTERVAL = 15
+
+
+def _timer_cache_key(attempt_id):
+    return f'attempt_timer:{attempt_id}'
+
+
+def get_attempt_timer(attempt_id):
+    """
+    Return the cached timer state for an attempt: its student, deadline and whether it's finished.
+    Only a cache miss touches the database. Returns None if the attempt doesn't exist.
+    """
+    key = _timer_cache_key(attempt_id)
+    timer = cache.get(key)
+    if timer is None:
+        timer = QuizAttempt.objects.filter(id=attempt_id).values(
+            'student_id', 'deadline', 'completed'
+        ).first()
+        if timer is None:
+            return None
+        cache.set(key, timer, TIMER_CACHE_TIMEOUT)
+    return timer
+
+
+def invalidate_attempt_timer(attempt_id):
+    """Drop the cached timer state, e.g. once the attempt is finished"""
+    cache.delete(_timer_cache_key(attempt_id))
+
+
+def invalidate_attempt_timers(attempt_ids):
+    """Drop the cached timer state of several attempts at once, e.g. after they're closed in bulk"""
+    cache.delete_many([_timer_cache_key(attempt_id) for attempt_id in attempt_ids])
+
+
+def get_timer_status(timer, attempt_id):
+    """Build the remaining-time payload sent to the quiz page"""
+    if timer['completed']:
+        return {'success': False, 'error': 'Quiz already completed'}
+
+    if not timer['deadline']:
+        return {'success': True}
+
+    remaining_seconds = math.ceil((timer['deadline'] - timezone.now()).total_seconds())
+    if remaining_seconds <= 0:
+        # The attempt is closed by take_quiz or the sweeper, never by the timer itself
+        return {
+            'success': True,
+            'timed_out': True,
+            'redirect_url': reverse('take_quiz', args=[attempt_id])
+        }
+
+    return {
+        'success': True,
+        'remaining_seconds': remaining_seconds,
+        'deadline': timer['deadline'].isoformat()
+    }
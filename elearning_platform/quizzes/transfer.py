@@ -0,0 +1,186 @@
+import json
+import time
+
+from django.db import transaction
+from django.db.models import Max, Prefetch
+
+from .models import Choice, Question, Quiz, QuizQuestion, QuestionStats, refresh_quiz_aggregates
+from .snapshot import invalidate_quiz_snapshot
+
+# Quiz export format: newline-delimited JSON. The first line describes the quiz and every
+# following line is one question with its choices, so both ends only hold a line at a time.
+# Media files are referenced by their storage path, not embedded.
+QUIZ_EXPORT_FIELDS = ('title', 'description', 'time_limit', 'passing_score', 'is_placement_test', 'max_points')
+QUESTION_EXPORT_FIELDS = ('text', 'question_type', 'time_limit', 'points', 'is_active')
+CHOICE_EXPORT_FIELDS = ('text', 'match_text', 'is_correct')
+
+QUESTION_TYPES = {question_type for question_type, _ in Question.QUESTION_TYPES}
+
+
+class QuizImportError(ValueError):
+    """Raised when an import file can't be read, with the line it failed on"""
+
+    def __init__(self, line_number, message):
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+
+
+def export_quiz(quiz, chunk_size=500):
+    """Yield the quiz as NDJSON lines, reading its questions from the database in chunks"""
+    header = {field: getattr(quiz, field) for field in QUIZ_EXPORT_FIELDS}
+    yield json.dumps({'type': 'quiz', **header}) + '\n'
+
+    quiz_questions = QuizQuestion.objects.filter(quiz=quiz).select_related('question').prefetch_related(
+        Prefetch('question__choices', queryset=Choice.objects.order_by('id'))
+    ).order_by('order', 'id')
+
+    for quiz_question in quiz_questions.iterator(chunk_size=chunk_size):
+        question = quiz_question.question
+        row = {field: getattr(question, field) for field in QUESTION_EXPORT_FIELDS}
+        row['image'] = question.image.name or None
+        row['audio'] = question.audio.name or None
+        row['choices'] = [
+            {**{field: getattr(choice, field) for field in CHOICE_EXPORT_FIELDS}, 'image': choice.image.name or None}
+            for choice in question.choices.all()
+        ]
+        yield json.dumps({'type': 'question', **row}) + '\n'
+
+
+def _parse_line(line_number, line):
+    try:
+        row = json.loads(line)
+    except ValueError as e:
+        raise QuizImportError(line_number, f"Invalid JSON ({e})")
+    if not isinstance(row, dict):
+        raise QuizImportError(line_number, "Expected a JSON object")
+    return row
+
+
+def _build_question(line_number, row):
+    """Turn a question line into an unsaved Question and its unsaved choices"""
+    if not row.get('text'):
+        raise QuizImportError(line_number, "Question text is required")
+    if row.get('question_type', 'multiple_choice') not in QUESTION_TYPES:
+        raise QuizImportError(line_number, f"Unknown question type {row['question_type']!r}")
+
+    try:
+        question = Question(
+            text=row['text'],
+            question_type=row.get('question_type', 'multiple_choice'),
+            time_limit=int(row.get('time_limit', 60)),
+            points=int(row.get('points', 10)),
+            is_active=bool(row.get('is_active', True)),
+        )
+        choices = [
+            Choice(
+                text=choice['text'],
+                match_text=choice.get('match_text'),
+                is_correct=bool(choice.get('is_correct', False)),
+            )
+            for choice in row.get('choices', [])
+        ]
+    except (KeyError, TypeError, ValueError) as e:
+        raise QuizImportError(line_number, f"Invalid question ({e!r})")
+
+    if question.points < 1 or question.time_limit < 0:
+        raise QuizImportError(line_number, "Points must be at least 1 and time limit can't be negative")
+
+    question.image.name = row.get('image') or None
+    question.audio.name = row.get('audio') or None
+    for choice, choice_row in zip(choices, row.get('choices', [])):
+        choice.image.name = choice_row.get('image') or None
+    return question, choices
+
+
+def _save_question_batch(quiz, batch, first_order, batch_size):
+    """bulk_create a batch of questions, their QuizQuestion links and their choices"""
+    questions = Question.objects.bulk_create([question for question, _ in batch], batch_size=batch_size)
+    QuizQuestion.objects.bulk_create([
+        QuizQuestion(quiz=quiz, question=question, order=first_order + index)
+        for index, question in enumerate(questions)
+    ], batch_size=batch_size)
+
+    choices = []
+    for question, (_, question_choices) in zip(questions, batch):
+        for choice in question_choices:
+            choice.question = question
+            choices.append(choice)
+    Choice.objects.bulk_create(choices, batch_size=batch_size)
+    return len(choices)
+
+
+def import_quiz(lines, quiz=None, course=None, batch_size=500):
+    """
+    Read NDJSON lines produced by export_quiz and add the questions to a quiz.
+    With a quiz, the questions are appended to it and the file's quiz line is ignored;
+    otherwise a new quiz is created in the course from the quiz line.
+
+    Questions are written with bulk_create a batch at a time, so no per-row signals fire;
+    the quiz aggregates, stats rows and snapshot are brought up to date once at the end.
+    Everything happens in one transaction, so a bad line leaves the database untouched.
+    Returns the quiz and a report with counts and timings.
+    """
+    if quiz is None and course is None:
+        raise ValueError("Pass the quiz to add to, or the course to create it in")
+
+    started = time.monotonic()
+    question_count = choice_count = 0
+
+    with transaction.atomic():
+        batch = []
+        next_order = None
+
+        for line_number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            row = _parse_line(line_number, line)
+
+            if row.get('type') == 'quiz':
+                if quiz is None:
+                    try:
+                        quiz = Quiz.objects.create(
+                            course=course, **{field: row[field] for field in QUIZ_EXPORT_FIELDS if field in row}
+                        )
+                    except (TypeError, ValueError) as e:
+                        raise QuizImportError(line_number, f"Invalid quiz ({e!r})")
+                continue
+
+            if row.get('type') != 'question':
+                raise QuizImportError(line_number, f"Unknown line type {row.get('type')!r}")
+            if quiz is None:
+                raise QuizImportError(line_number, "The quiz line must come before the questions")
+
+            if next_order is None:
+                last_order = QuizQuestion.objects.filter(quiz=quiz).aggregate(last=Max('order'))['last']
+                next_order = 0 if last_order is None else last_order + 1
+
+            batch.append(_build_question(line_number, row))
+            if len(batch) >= batch_size:
+                choice_count += _save_question_batch(quiz, batch, next_order, batch_size)
+                question_count += len(batch)
+                next_order += len(batch)
+                batch = []
+
+        if batch:
+            choice_count += _save_question_batch(quiz, batch, next_order, batch_size)
+            question_count += len(batch)
+
+        if quiz is None:
+            raise QuizImportError(0, "The file has no quiz line")
+
+        refresh_quiz_aggregates([quiz.id])
+        QuestionStats.objects.bulk_create([
+            QuestionStats(quiz_id=quiz.id, question_id=question_id)
+            for question_id in QuizQuestion.objects.filter(quiz=quiz).values_list('question_id', flat=True)
+        ], batch_size=batch_size, ignore_conflicts=True)
+        invalidate_quiz_snapshot(quiz)
+
+    elapsed = time.monotonic() - started
+    return quiz, {
+        'questions': question_count,
+        'choices': choice_count,
+        'seconds': elapsed,
+        'questions_per_second': question_count / elapsed if elapsed else 0,
+    }
@@ -0,0 +1,105 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import QuizAnswer, QuizAttempt, VoiceRecording
+
+# How much of the request body is read into memory at a time
+VOICE_UPLOAD_READ_SIZE = 64 * 1024
+
+# Largest recording accepted; a two minute recording is well under this
+VOICE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+
+# Where recordings are assembled until their last chunk arrives
+VOICE_UPLOAD_PARTIAL_DIR = 'voice_recordings/partial'
+
+
+class UploadOffsetMismatch(Exception):
+    """Raised when a chunk doesn't start where the stored upload ends"""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at byte {offset}")
+        self.offset = offset
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload would grow past VOICE_UPLOAD_MAX_SIZE"""
+
+
+def _partial_upload_path(attempt_id, question_id):
+    return default_storage.path(f'{VOICE_UPLOAD_PARTIAL_DIR}/{attempt_id}_{question_id}.part')
+
+
+def get_upload_offset(attempt_id, question_id):
+    """Return how many bytes of a voice recording have been received so far"""
+    path = _partial_upload_path(attempt_id, question_id)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def append_upload_chunk(attempt_id, question_id, stream, offset):
+    """
+    Stream a chunk from the request body onto the end of the partial recording.
+    The chunk must start at the current end of the upload, so a client can resume
+    after a dropped connection by asking for the offset and sending the rest.
+    Returns the new offset.
+    """
+    path = _partial_upload_path(attempt_id, question_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'ab') as partial:
+        current = partial.tell()
+        if offset != current:
+            raise UploadOffsetMismatch(current)
+
+        while True:
+            data = stream.read(VOICE_UPLOAD_READ_SIZE)
+            if not data:
+                break
+            if partial.tell() + len(data) > VOICE_UPLOAD_MAX_SIZE:
+                # Drop this chunk so the upload can't be left half-written
+                partial.truncate(current)
+                raise UploadTooLarge()
+            partial.write(data)
+
+        return partial.tell()
+
+
+def finish_voice_upload(attempt, question, student, duration, time_taken):
+    """
+    Move the assembled recording into place and store it as the answer to the question.
+    The recording and the answer are saved together, so a question is never left with one but not the other.
+    If the question already has an answer, e.g. after a duplicate final chunk, the upload is discarded
+    and None is returned.
+    """
+    partial_path = _partial_upload_path(attempt.id, question.id)
+
+    with transaction.atomic():
+        # Lock the attempt so a concurrent final chunk waits here, then finds this one's answer
+        QuizAttempt.objects.select_for_update().only('id').get(id=attempt.id)
+        if QuizAnswer.objects.filter(quiz_attempt=attempt, question=question).exists():
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return None
+
+        name = default_storage.get_available_name(f'voice_recordings/voice_recording_{student.id}_{question.id}.wav')
+        os.replace(partial_path, default_storage.path(name))
+
+        # Only one recording is kept per student and question
+        recording = VoiceRecording.objects.filter(question=question, student=student).first()
+        if recording:
+            QuizAnswer.objects.filter(voice_answer=recording).update(voice_answer=None)
+        else:
+            recording = VoiceRecording(question=question, student=student)
+        recording.recording.name = name
+        recording.duration = duration
+        recording.save()
+
+        return QuizAnswer.objects.create(
+            quiz_attempt=attempt,
+            question=question,
+            voice_answer=recording,
+            is_correct=False,  # Will be graded later
+            points_earned=0,   # Will be assigned by teacher
+            time_taken=time_taken
+        )
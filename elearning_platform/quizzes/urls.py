@@ -19,6 +19,7 @@ urlpatterns = [
     path('student/list/', views.student_quiz_list, name='student_quiz_list'),
     path('<int:quiz_id>/start/', views.start_quiz, name='start_quiz'),
     path('attempt/<int:attempt_id>/take/', views.take_quiz, name='take_quiz'),
+    path('attempt/<int:attempt_id>/take-paged/', views.take_quiz_paged, name='take_quiz_paged'),
     path('attempt/<int:attempt_id>/results/', views.quiz_results, name='quiz_results'),
     path('attempt/<int:attempt_id>/review/', views.quiz_review, name='quiz_review'),
     
@@ -26,4 +27,7 @@ urlpatterns = [
     path('update-question-order/', views.update_question_order, name='update_question_order'),
     path('attempt/<int:attempt_id>/update-timer/', views.update_timer, name='update_timer'),
     path('attempt/<int:attempt_id>/get-timer/', views.get_timer, name='get_timer'),
+    path('attempt/<int:attempt_id>/timer-stream/', views.timer_stream, name='timer_stream'),
+    path('attempt/<int:attempt_id>/submit-answers/', views.submit_quiz_answers, name='submit_quiz_answers'),
+    path('attempt/<int:attempt_id>/voice-upload/', views.upload_voice_recording, name='upload_voice_recording'),
 ]
\ No newline at end of file
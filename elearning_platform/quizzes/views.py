@@ -2,79 +2,94 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
-from django.db.models import Sum, Avg, Count, F, Q
-from django.db import transaction
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.db.models import Sum, Avg, Case, Count, F, IntegerField, Q, Value, When
+from django.db import IntegrityError, transaction
 from django.urls import reverse
+import asyncio
 import json
 import logging
+import uuid
+from asgiref.sync import sync_to_async
 from datetime import timedelta
 from django.urls import reverse
 from django.forms import inlineformset_factory
 
 logger = logging.getLogger(__name__)
 
+# Seconds of leeway on per-question deadlines to absorb network latency
+ANSWER_DEADLINE_GRACE = 5
+
+# Questions per page when a quiz is answered in pages
+PAGED_QUIZ_PAGE_SIZE = 5
+
 from .models import (
-    Quiz, Question, Choice, QuizAttempt, QuizAnswer, QuizQuestion,
-    TextAnswer, FileAnswer, VoiceRecording
+    Quiz, Question, QuizAttempt, QuizAnswer, QuizQuestion, QuestionStats, ItemAnalysis,
+    TextAnswer, FileAnswer, VoiceRecording, add_to_attempt_totals, add_answers_to_question_stats
 )
 from .forms import (
     QuizForm, QuestionForm, QuestionFormSet, ChoiceForm, ChoiceFormSet,
     QuizAnswerForm, TextAnswerForm, FileAnswerForm, VoiceRecordingForm
 )
-from courses.models import Course, ContentView
+from .snapshot import get_quiz_snapshot, invalidate_quiz_snapshot
+from .grading import grade_answer, UPLOAD_QUESTION_TYPES
+from .adaptive import next_adaptive_step
+from .navigation import (
+    get_attempt_position, get_attempt_state, get_submission_outcome, parse_submission_token, set_submission_outcome,
+    start_question, start_questions
+)
+from .regrade import regrade_answers, save_grades
+from .results import add_results_headers, get_attempt_results, get_not_modified_response, get_results_validators
+from .timer import get_attempt_timer, get_timer_status, TIMER_STREAM_INTERVAL
+from .uploads import (
+    get_upload_offset, append_upload_chunk, finish_voice_upload, UploadOffsetMismatch, UploadTooLarge
+)
+from courses.models import Course
+from courses.view_buffer import record_content_views
 from accounts.models import PaymentProof, StudentProfile
 
 # Helper Functions
 def get_quiz_questions(quiz):
-    """
-    Helper function to get all questions for a quiz,
-    checking both direct and indirect relationships
-    """
-    # First try direct relationship
-    direct_questions = quiz.questions.all().order_by('order')
-    
-    # If no direct questions, try through QuizQuestion
-    if not direct_questions.exists():
-        indirect_questions = Question.objects.filter(
-            quizquestion__quiz=quiz
-        ).order_by('quizquestion__order')
-        return indirect_questions
-    
-    return direct_questions
+    """Helper function to get all questions for a quiz in order"""
+    return quiz.questions.order_by('quizquestion__order')
 
 def get_quiz_attempt(attempt_id, user):
-    """
-    Helper function to get quiz attempt,
-    checking both student and user fields
-    """
-    try:
-        # First try with student field
-        return QuizAttempt.objects.get(id=attempt_id, student=user)
-    except Exception:
-        # Then try with user field
-        try:
-            return QuizAttempt.objects.get(id=attempt_id, user=user)
-        except Exception:
-            return None
+    """Helper function to get a quiz attempt belonging to the user"""
+    # QuizAttempt.save() keeps user in sync with student, so student is always set
+    return QuizAttempt.objects.select_related('quiz').filter(id=attempt_id, student=user).first()
 
 def process_quiz_answer_form(form, attempt, question):
-    """Helper function to process quiz answer form with field compatibility"""
+    """Helper function to process quiz answer form"""
     answer = form.save(commit=False)
-    
-    # Set both field patterns for maximum compatibility
     answer.quiz_attempt = attempt
-    answer.attempt = attempt
     answer.question = question
-    
-    # If QuizQuestion exists, set it too
-    quiz_question = QuizQuestion.objects.filter(quiz=attempt.quiz, question=question).first()
-    if quiz_question:
-        answer.quiz_question = quiz_question
-    
     answer.save()
     return answer
 
+def get_question_stats(quiz):
+    """Helper function to get per-question answer stats for a quiz, lowest correct percentage first"""
+    # QuestionStats rows are kept up to date as answers are saved, so this is one small query
+    stats_by_question = {
+        stats.question_id: stats
+        for stats in QuestionStats.objects.filter(quiz=quiz)
+    }
+    
+    question_stats = []
+    for question in get_quiz_snapshot(quiz).questions:
+        stats = stats_by_question.get(question.id) or QuestionStats(quiz=quiz, question=question)
+        question_stats.append({
+            'question': question,
+            'total_answers': stats.answer_count,
+            'correct_answers': stats.correct_count,
+            'correct_percentage': stats.get_correct_percentage(),
+            'avg_time_taken': stats.get_avg_time_taken(),
+            'avg_points': stats.get_avg_points(),
+        })
+    
+    # Sort question stats by correct percentage (lowest first)
+    question_stats.sort(key=lambda x: x['correct_percentage'])
+    return question_stats
+
 def is_admin(user):
     return user.is_staff or user.is_superuser
 
@@ -86,7 +101,7 @@ def is_teacher_or_admin(user):
 @user_passes_test(is_teacher_or_admin)
 def quiz_list(request):
     """View to list all quizzes for a teacher"""
-    quizzes = Quiz.objects.all().order_by('-created_at')
+    quizzes = Quiz.objects.select_related('course').order_by('-created_at')
     
     return render(request, 'quizzes/quiz_list.html', {
         'quizzes': quizzes
@@ -147,7 +162,7 @@ def edit_quiz_questions(request, quiz_id):
     max_points = quiz.max_points
     
     if request.method == 'POST':
-        formset = QuestionFormSet(request.POST, request.FILES, instance=quiz)
+        formset = QuestionFormSet(request.POST, request.FILES, quiz=quiz)
         
         if formset.is_valid():
             # Save formset
@@ -155,22 +170,23 @@ def edit_quiz_questions(request, quiz_id):
             
             # Process each question
             for question in questions:
-                question.quiz = quiz
                 question.save()
             
             # Handle deleted questions
             for obj in formset.deleted_objects:
                 obj.delete()
                 
-            # Save many-to-many relations
+            # Save many-to-many relations and place the questions in the quiz
             formset.save_m2m()
+            formset.save_question_order()
+            invalidate_quiz_snapshot(quiz)
             
             messages.success(request, "Questions saved successfully.")
             return redirect('quiz_detail', quiz_id=quiz.id)
         else:
             messages.error(request, "There were errors in the form. Please check below.")
     else:
-        formset = QuestionFormSet(instance=quiz)
+        formset = QuestionFormSet(quiz=quiz)
     
     return render(request, 'quizzes/edit_quiz_questions.html', {
         'quiz': quiz,
@@ -184,7 +200,10 @@ def edit_quiz_questions(request, quiz_id):
 def edit_question_choices(request, question_id):
     """View to edit choices for a question"""
     question = get_object_or_404(Question, id=question_id)
-    quiz = question.quiz
+    quiz = question.quizzes.first()
+    if not quiz:
+        messages.error(request, "This question doesn't belong to a quiz.")
+        return redirect('quiz_list')
     
     # Use the existing ChoiceFormSet from forms.py instead of redefining it here
     
@@ -192,7 +211,17 @@ def edit_question_choices(request, question_id):
         formset = ChoiceFormSet(request.POST, request.FILES, instance=question)
         if formset.is_valid():
             formset.save()
+            invalidate_quiz_snapshot(quiz)
             messages.success(request, "Choices updated successfully.")
+            
+            # Bring existing answers in line with the new answer key
+            report = regrade_answers(question=question)
+            if report['answers_changed']:
+                messages.info(
+                    request,
+                    f"Regraded {report['answers_changed']} of {report['answers_checked']} answers; "
+                    f"{report['results_changed']} quiz results changed."
+                )
             return redirect('edit_quiz_questions', quiz_id=quiz.id)
     else:
         formset = ChoiceFormSet(instance=question)
@@ -208,10 +237,11 @@ def edit_question_choices(request, question_id):
 def quiz_detail(request, quiz_id):
     """View to show quiz details and questions"""
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    questions = get_quiz_questions(quiz)
+    snapshot = get_quiz_snapshot(quiz)
+    questions = snapshot.questions
     
     # Calculate total points and check if they match max_points
-    total_points = questions.aggregate(total=Sum('points'))['total'] or 0
+    total_points = snapshot.total_points
     points_match = total_points == quiz.max_points
     
     # Handle points adjustment if form submitted
@@ -225,29 +255,45 @@ def quiz_detail(request, quiz_id):
             messages.success(request, f"Quiz max points updated to {total_points}.")
             return redirect('quiz_detail', quiz_id=quiz.id)
             
-        elif adjustment_type == 'adjust_questions' and questions.exists():
+        elif adjustment_type == 'adjust_questions' and questions:
             # Distribute max_points evenly among questions
-            question_count = questions.count()
+            question_count = len(questions)
             points_per_question = quiz.max_points // question_count
             remainder = quiz.max_points % question_count
             
             with transaction.atomic():
-                for i, question in enumerate(questions):
+                for i, question in enumerate(get_quiz_questions(quiz)):
                     # Add remainder to first question if needed
                     if i == 0:
                         question.points = points_per_question + remainder
                     else:
                         question.points = points_per_question
                     question.save()
+                invalidate_quiz_snapshot(quiz)
             
             messages.success(request, f"Points distributed evenly across {question_count} questions.")
             return redirect('quiz_detail', quiz_id=quiz.id)
     
+    # Item analysis from the last analyse_items run, for spotting questions that need repair
+    analyses = {analysis.question_id: analysis for analysis in ItemAnalysis.objects.filter(quiz=quiz)}
+    item_analysis = []
+    for question in questions:
+        analysis = analyses.get(question.id)
+        if analysis:
+            item_analysis.append({
+                'question': question,
+                'analysis': analysis,
+                'choices': [
+                    (choice, analysis.get_choice_count(choice.id)) for choice in snapshot.get_choices(question.id)
+                ],
+            })
+    
     return render(request, 'quizzes/quiz_detail.html', {
         'quiz': quiz,
         'questions': questions,
         'total_points': total_points,
-        'points_match': points_match
+        'points_match': points_match,
+        'item_analysis': item_analysis
     })
 
 @login_required
@@ -295,34 +341,7 @@ def quiz_analytics(request, quiz_id):
             result_distribution[item['result']] = item['count']
     
     # Get top-performing questions (highest percentage of correct answers)
-    questions = get_quiz_questions(quiz)
-    question_stats = []
-    
-    for question in questions:
-        # Get answers for this question using both relationship patterns
-        answers = QuizAnswer.objects.filter(
-            Q(question=question) | Q(quiz_question__question=question)
-        ).filter(
-            Q(quiz_attempt__quiz=quiz) | Q(attempt__quiz=quiz)
-        )
-        
-        total_answers = answers.count()
-        correct_answers = answers.filter(is_correct=True).count()
-        
-        if total_answers > 0:
-            correct_percentage = (correct_answers / total_answers) * 100
-        else:
-            correct_percentage = 0
-        
-        question_stats.append({
-            'question': question,
-            'total_answers': total_answers,
-            'correct_answers': correct_answers,
-            'correct_percentage': correct_percentage
-        })
-    
-    # Sort question stats by correct percentage (lowest first)
-    question_stats.sort(key=lambda x: x['correct_percentage'])
+    question_stats = get_question_stats(quiz)
     
     return render(request, 'quizzes/quiz_analytics.html', {
         'quiz': quiz,
@@ -342,7 +361,7 @@ def student_quiz_list(request):
     available_quizzes = Quiz.objects.filter(
         course__in=student_courses, 
         is_active=True
-    ).order_by('course__title', 'title')
+    ).select_related('course').order_by('course__title', 'title')
     
     # Get all of the student's completed quiz attempts
     completed_attempts = QuizAttempt.objects.filter(
@@ -368,6 +387,46 @@ def student_quiz_list(request):
         'quiz_data': quiz_data
     })
 
+def create_quiz_attempt(student, quiz):
+    """Start an attempt, drawing its questions from the quiz's pool if the quiz asks for a random draw"""
+    snapshot = get_quiz_snapshot(quiz)
+    attempt = QuizAttempt(student=student, quiz=quiz, max_points=snapshot.total_points)
+    
+    if quiz.is_adaptive and quiz.is_placement_test:
+        # Adaptive tests start with one question and choose the rest as the answers come in
+        step = next_adaptive_step(snapshot, (), {}, quiz.draw_count)
+        question_ids = [step.question.id] if step.question else None
+    else:
+        question_ids = snapshot.draw(quiz.draw_count)
+    
+    if question_ids:
+        # Each student gets their own form of the quiz, scored out of the questions they were asked
+        attempt.set_question_ids(question_ids)
+        attempt.max_points = sum(snapshot.points[question_id] for question_id in question_ids)
+    
+    attempt.save()
+    return attempt
+
+def advance_adaptive_attempt(attempt, snapshot):
+    """
+    Choose the next question of an adaptive placement test once the previous ones are answered,
+    or finish the attempt with the level from the ability estimate once it's clear.
+    Returns True if a question was added.
+    """
+    asked_ids = attempt.get_question_ids()
+    answers = dict(QuizAnswer.objects.filter(quiz_attempt=attempt).values_list('question_id', 'is_correct'))
+    step = next_adaptive_step(snapshot, asked_ids, answers, attempt.quiz.draw_count)
+    
+    if step.question:
+        attempt.set_question_ids(asked_ids + (step.question.id,))
+        attempt.max_points += step.question.points
+        attempt.save(update_fields=['question_ids', 'max_points'])
+        return True
+    
+    attempt.ability = step.ability
+    attempt.complete(result=step.level)
+    return False
+
 @login_required
 def take_placement_test(request, course_id):
     """View to take a placement test for a course"""
@@ -386,7 +445,7 @@ def take_placement_test(request, course_id):
     
     # Check if the student has already taken this placement test
     existing_attempt = QuizAttempt.objects.filter(
-        (Q(student=request.user) | Q(user=request.user)) &
+        Q(student=request.user) &
         Q(quiz=placement_test) &
         (Q(completed=True) | Q(status='completed'))
     ).first()
@@ -396,10 +455,7 @@ def take_placement_test(request, course_id):
         return redirect('quiz_results', attempt_id=existing_attempt.id)
     
     # Create a new quiz attempt
-    attempt = QuizAttempt.objects.create(
-        student=request.user,
-        quiz=placement_test
-    )
+    attempt = create_quiz_attempt(request.user, placement_test)
     
     return redirect('take_quiz', attempt_id=attempt.id)
 
@@ -443,18 +499,10 @@ def start_quiz(request, quiz_id):
         return redirect('student_quiz_list')
     
     # Create a new quiz attempt
-    attempt = QuizAttempt.objects.create(
-        student=request.user,
-        quiz=quiz
-    )
+    attempt = create_quiz_attempt(request.user, quiz)
     
     # Track that the student has viewed this quiz
-    ContentView.objects.get_or_create(
-        user=request.user,
-        course=quiz.course,
-        content_type='quiz',
-        content_id=quiz.id
-    )
+    record_content_views(request.user.id, quiz.course_id, [('quiz', quiz.id)])
     
     return redirect('take_quiz', attempt_id=attempt.id)
 
@@ -462,14 +510,29 @@ def start_quiz(request, quiz_id):
 def take_quiz(request, attempt_id):
     """View to take a quiz with enforced time limits and no ability to change previous answers"""
     # Get the attempt, ensuring it belongs to the current user
-    attempt = get_object_or_404(QuizAttempt, id=attempt_id, student=request.user)
+    attempt = get_object_or_404(
+        QuizAttempt.objects.select_related('quiz'), id=attempt_id, student=request.user
+    )
     quiz = attempt.quiz
     
+    # Double clicks and retries resend the client's token for the answer; replay the first outcome
+    submission_token = parse_submission_token(request.POST.get('submission_token'))
+    if submission_token:
+        outcome = get_submission_outcome(attempt.id, submission_token)
+        if outcome:
+            return redirect(outcome)
+    
     # Check if the attempt is already completed
     if attempt.completed or attempt.status == 'completed':
         messages.info(request, "You have already completed this quiz.")
         return redirect('quiz_results', attempt_id=attempt.id)
     
+    # Close the attempt if its time ran out while the student was away
+    if attempt.is_past_deadline():
+        attempt.expire()
+        messages.warning(request, "Time's up! Your quiz has been submitted.")
+        return redirect('quiz_results', attempt_id=attempt.id)
+    
     # Check if the student already has a completed attempt for this quiz (any attempt, not just this one)
     existing_completed_attempts = QuizAttempt.objects.filter(
         student=request.user, 
@@ -481,10 +544,12 @@ def take_quiz(request, attempt_id):
         messages.warning(request, "You have already completed this quiz. Only one attempt is allowed.")
         return redirect('student_quiz_list')
     
-    # Get all questions for this quiz
-    questions = get_quiz_questions(quiz)
+    # Get the questions this attempt asks from the cached snapshot
+    snapshot = get_quiz_snapshot(quiz)
+    questions = snapshot.questions_for(attempt)
+    total_questions = len(questions)
     
-    if not questions.exists():
+    if not total_questions:
         messages.error(request, "This quiz doesn't have any questions.")
         return redirect('student_quiz_list')
     
@@ -492,17 +557,31 @@ def take_quiz(request, attempt_id):
     current_question_num = int(request.GET.get('question', 1))
     
     # Check if the student is trying to go back to a previous question
-    max_answered_question = QuizAnswer.objects.filter(
-        quiz_attempt=attempt
-    ).count()
+    state = get_attempt_state(attempt)
+    max_answered_question = get_attempt_position(attempt, questions)
     
-    # If trying to access a previous question, redirect to the current unanswered question
+    # If trying to access an answered question, redirect to the current unanswered question
     if current_question_num < max_answered_question + 1:
+        # A retry whose outcome has dropped out of the cache carries on from the stored answer
+        if submission_token and QuizAnswer.objects.filter(
+            quiz_attempt=attempt, submission_token=submission_token
+        ).exists():
+            return redirect(f"{reverse('take_quiz', args=[attempt.id])}?question={current_question_num + 1}")
         messages.warning(request, "You cannot go back to previous questions once they are answered.")
         return redirect(f"{reverse('take_quiz', args=[attempt.id])}?question={max_answered_question + 1}")
     
+    # Adaptive tests only add the next question once every question so far is answered;
+    # questions left empty or timed out count too, as they're stored with blank answers
+    if current_question_num > total_questions and quiz.is_adaptive and quiz.is_placement_test:
+        if current_question_num != max_answered_question + 1:
+            return redirect(f"{reverse('take_quiz', args=[attempt.id])}?question={max_answered_question + 1}")
+        if not advance_adaptive_attempt(attempt, snapshot):
+            return redirect('quiz_results', attempt_id=attempt.id)
+        questions = snapshot.questions_for(attempt)
+        total_questions = len(questions)
+    
     # Make sure the question number is valid
-    if current_question_num > questions.count():
+    if current_question_num > total_questions:
         # All questions have been answered, complete the quiz
         attempt.end_time = timezone.now()
         attempt.completed = True
@@ -516,207 +595,173 @@ def take_quiz(request, attempt_id):
     # Get the current question
     current_question = questions[current_question_num - 1]
     
-    # Check if this question has already been answered
-    existing_answer = QuizAnswer.objects.filter(
-        quiz_attempt=attempt,
-        question=current_question
-    ).first()
-    
-    if existing_answer:
-        # Redirect to the next unanswered question
-        return redirect(f"{reverse('take_quiz', args=[attempt.id])}?question={current_question_num + 1}")
-    
-    # Get the start time for this question
-    # We'll store this in the session to track per-question time
-    session_key = f'question_start_time_{attempt.id}_{current_question.id}'
-    if session_key not in request.session:
-        request.session[session_key] = timezone.now().timestamp()
+    # Get the start time for this question, recorded in the attempt state the first time it's shown
+    start_time = start_question(state, current_question_num - 1)
     
     # Process form submission
     if request.method == 'POST':
         # Calculate time taken on this question
-        start_time = request.session.get(session_key, timezone.now().timestamp())
         time_taken = int(timezone.now().timestamp() - start_time)
         
-        # Clear the session key
-        if session_key in request.session:
-            del request.session[session_key]
-        
         # Initialize variables
         is_correct = False
         points_earned = 0
+        answer = None
         
-        # Process the answer based on question type
-        if current_question.question_type == 'multiple_choice':
-            # Get the selected choice
-            selected_choice_id = request.POST.get('choice')
-            
-            if selected_choice_id:
-                selected_choice = Choice.objects.get(id=selected_choice_id)
-                
-                # Check if correct
-                if selected_choice.is_correct:
-                    is_correct = True
-                    points_earned = current_question.points
-                
-                # Create the answer
-                answer = QuizAnswer.objects.create(
-                    quiz_attempt=attempt,
-                    question=current_question,
-                    selected_choice=selected_choice,
-                    is_correct=is_correct,
-                    points_earned=points_earned,
-                    time_taken=time_taken
-                )
-        
-        elif current_question.question_type == 'multi_select':
-            # Get the selected choices
-            selected_choice_ids = request.POST.getlist('choices')
-            
-            if selected_choice_ids:
-                # Get all correct choices for this question
-                correct_choices = current_question.choices.filter(is_correct=True)
-                selected_choices = Choice.objects.filter(id__in=selected_choice_ids)
-                
-                # Check if correct - must select ALL correct choices and NO incorrect choices
-                correct_choice_ids = set(str(c.id) for c in correct_choices)
-                selected_choice_ids_set = set(selected_choice_ids)
-                
-                # Check if the selected choices exactly match the correct choices
-                if correct_choice_ids == selected_choice_ids_set:
-                    is_correct = True
-                    points_earned = current_question.points
-                
-                # Create the answer
-                answer = QuizAnswer.objects.create(
-                    quiz_attempt=attempt,
-                    question=current_question,
-                    is_correct=is_correct,
-                    points_earned=points_earned,
-                    time_taken=time_taken
-                )
-                
-                # Add the selected choices to the many-to-many relationship
-                answer.selected_choices.add(*selected_choices)
-        
-        elif current_question.question_type in ['short_answer', 'long_answer']:
-            # Get the text answer
-            text_answer = request.POST.get('text_answer', '')
-            
-            # Save the answer - teacher will evaluate later
-            answer = QuizAnswer.objects.create(
-                quiz_attempt=attempt,
-                question=current_question,
-                text_answer=text_answer,
-                is_correct=False,  # Default to false, teacher will grade later
-                points_earned=0,   # Default to 0, teacher will assign points later
-                time_taken=time_taken
-            )
-        
-        elif current_question.question_type == 'star_rating':
-            # Get the rating
-            rating = request.POST.get('rating')
-            
-            if rating:
-                # Store the rating in the text_answer field
-                answer = QuizAnswer.objects.create(
-                    quiz_attempt=attempt,
-                    question=current_question,
-                    text_answer=rating,
-                    is_correct=True,  # Star ratings are always "correct"
-                    points_earned=current_question.points,  # Give full points for completing
-                    time_taken=time_taken
-                )
-        
-        elif current_question.question_type == 'voice_record':
-            # Get the voice data and duration
-            voice_data = request.POST.get('voice_data')
-            duration = request.POST.get('duration', 0)
-            
-            if voice_data and voice_data.startswith('data:audio'):
-                # Create a temporary file to store the voice recording
-                import base64
-                from django.core.files.base import ContentFile
+        # Store the answer in one transaction, so a duplicate submission leaves nothing behind
+        try:
+            with transaction.atomic():
+                # Process the answer based on question type
+                if current_question.question_type == 'multiple_choice':
+                    # Get the selected choice
+                    selected_choice = snapshot.get_choice(current_question.id, request.POST.get('choice'))
+                    
+                    if selected_choice:
+                        # Check if correct
+                        if selected_choice.id in snapshot.correct_choice_ids[current_question.id]:
+                            is_correct = True
+                            points_earned = current_question.points
+                        
+                        # Create the answer
+                        answer = QuizAnswer.objects.create(
+                            quiz_attempt=attempt,
+                            question=current_question,
+                            selected_choice=selected_choice,
+                            is_correct=is_correct,
+                            points_earned=points_earned,
+                            time_taken=time_taken,
+                            submission_token=submission_token
+                        )
                 
-                # Remove the data URI prefix to get the base64 content
-                format, base64_data = voice_data.split(';base64,')
+                elif current_question.question_type == 'multi_select':
+                    # Get the selected choices
+                    selected_choices = [
+                        choice for choice in (
+                            snapshot.get_choice(current_question.id, choice_id)
+                            for choice_id in request.POST.getlist('choices')
+                        ) if choice
+                    ]
+                    
+                    if selected_choices:
+                        # Check if correct - must select ALL correct choices and NO incorrect choices
+                        selected_choice_ids_set = {choice.id for choice in selected_choices}
+                        
+                        # Check if the selected choices exactly match the correct choices
+                        if snapshot.correct_choice_ids[current_question.id] == selected_choice_ids_set:
+                            is_correct = True
+                            points_earned = current_question.points
+                        
+                        # Create the answer
+                        answer = QuizAnswer.objects.create(
+                            quiz_attempt=attempt,
+                            question=current_question,
+                            is_correct=is_correct,
+                            points_earned=points_earned,
+                            time_taken=time_taken,
+                            submission_token=submission_token
+                        )
+                        
+                        # Add the selected choices to the many-to-many relationship
+                        answer.selected_choices.add(*selected_choices)
                 
-                # Decode the base64 data
-                decoded_data = base64.b64decode(base64_data)
+                elif current_question.question_type in ['short_answer', 'long_answer']:
+                    # Get the text answer
+                    text_answer = request.POST.get('text_answer', '')
+                    
+                    # Save the answer - teacher will evaluate later
+                    answer = QuizAnswer.objects.create(
+                        quiz_attempt=attempt,
+                        question=current_question,
+                        text_answer=text_answer,
+                        is_correct=False,  # Default to false, teacher will grade later
+                        points_earned=0,   # Default to 0, teacher will assign points later
+                        time_taken=time_taken,
+                        submission_token=submission_token
+                    )
                 
-                # Create a voice recording
-                voice_recording = VoiceRecording.objects.create(
-                    question=current_question,
-                    student=request.user,
-                    duration=int(duration)
-                )
+                elif current_question.question_type == 'star_rating':
+                    # Get the rating
+                    rating = request.POST.get('rating')
+                    
+                    if rating:
+                        # Store the rating in the text_answer field
+                        answer = QuizAnswer.objects.create(
+                            quiz_attempt=attempt,
+                            question=current_question,
+                            text_answer=rating,
+                            is_correct=True,  # Star ratings are always "correct"
+                            points_earned=current_question.points,  # Give full points for completing
+                            time_taken=time_taken,
+                            submission_token=submission_token
+                        )
                 
-                # Save the audio file
-                file_name = f"voice_recording_{request.user.id}_{current_question.id}.wav"
-                voice_recording.recording.save(file_name, ContentFile(decoded_data), save=True)
+                # voice_record answers are stored by upload_voice_recording before the form is submitted
                 
-                # Create the answer and link it to the voice recording
-                answer = QuizAnswer.objects.create(
-                    quiz_attempt=attempt,
-                    question=current_question,
-                    voice_answer=voice_recording,
-                    is_correct=False,  # Will be graded later
-                    points_earned=0,   # Will be assigned by teacher
-                    time_taken=time_taken
-                )
-        
-        elif current_question.question_type == 'file_upload':
-            # Handle file upload questions
-            uploaded_file = request.FILES.get('file')
-            
-            if uploaded_file:
-                # Create a file answer record
-                file_answer = FileAnswer.objects.create(
-                    question=current_question,
-                    student=request.user,
-                    file=uploaded_file,
-                    file_type=uploaded_file.content_type
-                )
+                elif current_question.question_type == 'file_upload':
+                    # Handle file upload questions
+                    uploaded_file = request.FILES.get('file')
+                    
+                    if uploaded_file:
+                        # Create a file answer record
+                        file_answer = FileAnswer.objects.create(
+                            question=current_question,
+                            student=request.user,
+                            file=uploaded_file,
+                            file_type=uploaded_file.content_type
+                        )
+                        
+                        # Create the answer and link it to the file
+                        answer = QuizAnswer.objects.create(
+                            quiz_attempt=attempt,
+                            question=current_question,
+                            file_answer=file_answer,
+                            is_correct=False,  # Default to false, teacher will grade later
+                            points_earned=0,   # Default to 0, teacher will assign points later
+                            time_taken=time_taken,
+                            submission_token=submission_token
+                        )
                 
-                # Create the answer and link it to the file
-                answer = QuizAnswer.objects.create(
-                    quiz_attempt=attempt,
-                    question=current_question,
-                    file_answer=file_answer,
-                    is_correct=False,  # Default to false, teacher will grade later
-                    points_earned=0,   # Default to 0, teacher will assign points later
-                    time_taken=time_taken
-                )
-        
-        elif current_question.question_type == 'true_false':
-            # Handle true/false questions similar to multiple choice
-            selected_choice_id = request.POST.get('choice')
-            
-            if selected_choice_id:
-                selected_choice = Choice.objects.get(id=selected_choice_id)
+                elif current_question.question_type == 'true_false':
+                    # Handle true/false questions similar to multiple choice
+                    selected_choice = snapshot.get_choice(current_question.id, request.POST.get('choice'))
+                    
+                    if selected_choice:
+                        # Check if correct
+                        if selected_choice.id in snapshot.correct_choice_ids[current_question.id]:
+                            is_correct = True
+                            points_earned = current_question.points
+                        
+                        # Create the answer
+                        answer = QuizAnswer.objects.create(
+                            quiz_attempt=attempt,
+                            question=current_question,
+                            selected_choice=selected_choice,
+                            is_correct=is_correct,
+                            points_earned=points_earned,
+                            time_taken=time_taken,
+                            submission_token=submission_token
+                        )
                 
-                # Check if correct
-                if selected_choice.is_correct:
-                    is_correct = True
-                    points_earned = current_question.points
+                # Add handling for other question types as needed
                 
-                # Create the answer
-                answer = QuizAnswer.objects.create(
-                    quiz_attempt=attempt,
-                    question=current_question,
-                    selected_choice=selected_choice,
-                    is_correct=is_correct,
-                    points_earned=points_earned,
-                    time_taken=time_taken
-                )
-        
-        # Add handling for other question types as needed
+                # A question left unanswered, e.g. when its timer submits the form, still gets a blank answer
+                # so the student's position moves past it; voice answers may already be stored by the upload
+                if answer is None:
+                    QuizAnswer.objects.get_or_create(
+                        quiz_attempt=attempt,
+                        question=current_question,
+                        defaults={'time_taken': time_taken, 'submission_token': submission_token}
+                    )
+        except IntegrityError:
+            # A concurrent submission of this question got there first; carry on from it
+            return redirect(f"{reverse('take_quiz', args=[attempt.id])}?question={current_question_num + 1}")
         
         # Redirect to the next question
         next_question = current_question_num + 1
         
-        if next_question <= questions.count():
-            return redirect(f"{reverse('take_quiz', args=[attempt.id])}?question={next_question}")
+        # Adaptive tests are finished by the next GET once it decides there's nothing more to ask
+        if next_question <= total_questions or (quiz.is_adaptive and quiz.is_placement_test):
+            outcome = f"{reverse('take_quiz', args=[attempt.id])}?question={next_question}"
         else:
             # Complete the quiz if this was the last question
             attempt.end_time = timezone.now()
@@ -726,54 +771,55 @@ def take_quiz(request, attempt_id):
             attempt.result = attempt.determine_result()
             attempt.save()
             
-            return redirect('quiz_results', attempt_id=attempt.id)
+            outcome = reverse('quiz_results', args=[attempt.id])
+        
+        # Remember where the submission led, so a retry of it is sent to the same place
+        if submission_token:
+            set_submission_outcome(attempt.id, submission_token, outcome)
+        return redirect(outcome)
     
     # Prepare the context for the template
     choices = None
     if current_question.question_type in ['multiple_choice', 'true_false', 'dropdown', 'multi_select']:
-        choices = current_question.choices.all()
+        choices = snapshot.get_choices(current_question.id)
     
     # Calculate progress
-    progress_percentage = int((current_question_num / questions.count()) * 100)
-    
-    # Use the question-specific time limit instead of the quiz's overall time limit
-    remaining_time = current_question.time_limit  # This is in seconds already
-    
-    # If we've already started this question, calculate the remaining time
-    if session_key in request.session:
-        elapsed_time = int(timezone.now().timestamp() - request.session[session_key])
-        remaining_time = max(0, current_question.time_limit - elapsed_time)
+    progress_percentage = int((current_question_num / total_questions) * 100)
+    
+    # Use the question-specific time limit instead of the quiz's overall time limit,
+    # counting down from when the question was first shown
+    elapsed_time = int(timezone.now().timestamp() - start_time)
+    remaining_time = max(0, current_question.time_limit - elapsed_time)
+    
+    # If time is up, auto-submit with no answer
+    if remaining_time <= 0:
+        # Create a blank answer, unless a concurrent request already stored one
+        QuizAnswer.objects.get_or_create(
+            quiz_attempt=attempt,
+            question=current_question,
+            defaults={'is_correct': False, 'points_earned': 0, 'time_taken': current_question.time_limit}
+        )
         
-        # If time is up, auto-submit with no answer
-        if remaining_time <= 0:
-            # Create a blank answer
-            QuizAnswer.objects.create(
-                quiz_attempt=attempt,
-                question=current_question,
-                is_correct=False,
-                points_earned=0,
-                time_taken=current_question.time_limit
-            )
-            
-            # Clear the session key
-            del request.session[session_key]
-            
-            # Show message and redirect to next question
-            messages.warning(request, "Time's up for this question! Moving to the next question.")
-            next_question = current_question_num + 1
+        # Show message and redirect to next question
+        messages.warning(request, "Time's up for this question! Moving to the next question.")
+        next_question = current_question_num + 1
+        
+        if next_question <= total_questions or (quiz.is_adaptive and quiz.is_placement_test):
+            return redirect(f"{reverse('take_quiz', args=[attempt.id])}?question={next_question}")
+        else:
+            # Complete the quiz if this was the last question
+            attempt.end_time = timezone.now()
+            attempt.completed = True
+            attempt.status = 'completed'
+            attempt.score = attempt.calculate_score()
+            attempt.result = attempt.determine_result()
+            attempt.save()
             
-            if next_question <= questions.count():
-                return redirect(f"{reverse('take_quiz', args=[attempt.id])}?question={next_question}")
-            else:
-                # Complete the quiz if this was the last question
-                attempt.end_time = timezone.now()
-                attempt.completed = True
-                attempt.status = 'completed'
-                attempt.score = attempt.calculate_score()
-                attempt.result = attempt.determine_result()
-                attempt.save()
-                
-                return redirect('quiz_results', attempt_id=attempt.id)
+            return redirect('quiz_results', attempt_id=attempt.id)
+    
+    # The question's countdown never runs past the deadline of the attempt as a whole
+    if state.deadline:
+        remaining_time = min(remaining_time, max(0, int((state.deadline - timezone.now()).total_seconds())))
     
     # Prepare context for voice recording questions
     existing_recording = None
@@ -787,17 +833,24 @@ def take_quiz(request, attempt_id):
         if existing_voice_recording:
             existing_recording = existing_voice_recording.recording
     
+    # Adaptive tests pick one question at a time, so they can't be answered in pages
+    paged_url = None
+    if not (quiz.is_adaptive and quiz.is_placement_test):
+        paged_url = reverse('take_quiz_paged', args=[attempt.id])
+    
     # Choose the appropriate template based on question type
     context = {
         'attempt': attempt,
         'quiz': quiz,
         'question': current_question,
         'question_number': current_question_num,
-        'total_questions': questions.count(),
+        'total_questions': total_questions,
         'progress_percentage': progress_percentage,
         'choices': choices,
         'time_limit': remaining_time,  # Use time_limit instead of remaining_time
-        'existing_recording': existing_recording
+        'existing_recording': existing_recording,
+        'submission_token': uuid.uuid4(),
+        'paged_url': paged_url
     }
     
     # Select the template based on question type
@@ -819,6 +872,282 @@ def take_quiz(request, attempt_id):
         # For any other question type, use the generic template
         return render(request, 'quizzes/take_quiz_generic.html', context)
 
+@login_required
+def take_quiz_paged(request, attempt_id):
+    """View to answer the rest of a quiz a page of questions at a time through submit_quiz_answers"""
+    attempt = get_object_or_404(
+        QuizAttempt.objects.select_related('quiz'), id=attempt_id, student=request.user
+    )
+    quiz = attempt.quiz
+    
+    if attempt.completed or attempt.status == 'completed':
+        messages.info(request, "You have already completed this quiz.")
+        return redirect('quiz_results', attempt_id=attempt.id)
+    
+    # Adaptive tests pick one question at a time
+    if quiz.is_adaptive and quiz.is_placement_test:
+        return redirect('take_quiz', attempt_id=attempt.id)
+    
+    return render(request, 'quizzes/take_quiz_paged.html', {
+        'attempt': attempt,
+        'quiz': quiz,
+        'page_size': PAGED_QUIZ_PAGE_SIZE
+    })
+
+@login_required
+def submit_quiz_answers(request, attempt_id):
+    """
+    AJAX endpoint for taking a quiz in pages instead of one POST per question, used by take_quiz_paged.
+    GET returns the next unanswered questions and starts their timers; POST grades and stores a page of answers.
+    Position and per-question start times come from the same attempt state take_quiz uses.
+    """
+    if request.method == 'GET':
+        attempt = get_object_or_404(
+            QuizAttempt.objects.select_related('quiz'), id=attempt_id, student=request.user
+        )
+        if attempt.completed or attempt.status == 'completed':
+            return JsonResponse({'success': False, 'error': 'Quiz already completed'})
+        
+        snapshot = get_quiz_snapshot(attempt.quiz)
+        attempt_questions = snapshot.questions_for(attempt)
+        position = get_attempt_position(attempt, attempt_questions)
+        try:
+            limit = max(1, int(request.GET.get('limit', 10)))
+        except ValueError:
+            limit = 10
+        
+        # Stop the page before a question that needs an upload; take_quiz asks those on their own
+        page = []
+        for question in attempt_questions[position:position + limit]:
+            if question.question_type in UPLOAD_QUESTION_TYPES:
+                break
+            page.append(question)
+        
+        # Every question on the page is shown now, so their timers start together
+        state = get_attempt_state(attempt)
+        started = start_questions(state, range(position, position + len(page)))
+        now = timezone.now().timestamp()
+        
+        questions = []
+        for number, question, started_at in zip(range(position + 1, position + len(page) + 1), page, started):
+            questions.append({
+                'id': question.id,
+                'number': number,
+                'text': question.text,
+                'question_type': question.question_type,
+                'points': question.points,
+                'time_limit': question.time_limit,
+                'remaining_seconds': max(0, int(started_at + question.time_limit - now)),
+                'image': question.image.url if question.image else None,
+                'audio': question.audio.url if question.audio else None,
+                'choices': [{
+                    'id': choice.id,
+                    'text': choice.text,
+                    'match_text': choice.match_text,
+                    'image': choice.image.url if choice.image else None,
+                } for choice in snapshot.get_choices(question.id)],
+            })
+        
+        # Questions the page can't ask continue one at a time in take_quiz
+        redirect_url = None
+        if not questions and position < len(attempt_questions):
+            redirect_url = f"{reverse('take_quiz', args=[attempt.id])}?question={position + 1}"
+        
+        return JsonResponse({
+            'success': True,
+            'total_questions': len(attempt_questions),
+            'next_question': position + 1,
+            'questions': questions,
+            'redirect_url': redirect_url,
+            'submission_token': uuid.uuid4().hex
+        })
+    
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+    
+    try:
+        body = json.loads(request.body)
+        submitted = body.get('answers', [])
+        question_ids = [int(item['question_id']) for item in submitted]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid answer data'}, status=400)
+    
+    # Retries resend the client's token for the page; replay the first outcome
+    submission_token = parse_submission_token(body.get('submission_token'))
+    if submission_token:
+        outcome = get_submission_outcome(attempt_id, submission_token)
+        if outcome:
+            return JsonResponse({'success': True, 'replayed': True, 'redirect_url': outcome})
+    
+    with transaction.atomic():
+        # Lock the attempt so concurrent pages for it are applied one after another
+        attempt = get_object_or_404(
+            QuizAttempt.objects.select_for_update(of=('self',)).select_related('quiz'),
+            id=attempt_id, student=request.user
+        )
+        if attempt.completed or attempt.status == 'completed':
+            return JsonResponse({'success': False, 'error': 'Quiz already completed'})
+        
+        if attempt.is_past_deadline():
+            attempt.expire()
+            return JsonResponse({
+                'success': False,
+                'timed_out': True,
+                'error': "Time's up",
+                'redirect_url': reverse('quiz_results', args=[attempt.id])
+            })
+        
+        # A retry whose outcome has dropped out of the cache carries on from the stored page
+        if submission_token and QuizAnswer.objects.filter(
+            quiz_attempt=attempt, submission_token=submission_token
+        ).exists():
+            return JsonResponse({
+                'success': True,
+                'replayed': True,
+                'redirect_url': reverse('take_quiz_paged', args=[attempt.id])
+            })
+        
+        # The locked row carries the current running totals, so this is where the student really is
+        snapshot = get_quiz_snapshot(attempt.quiz)
+        attempt_questions = snapshot.questions_for(attempt)
+        position = get_attempt_position(attempt, attempt_questions)
+        questions = attempt_questions[position:position + len(submitted)]
+        
+        # Answers must continue from the first unanswered question, in order, with no going back
+        if not submitted or question_ids != [question.id for question in questions]:
+            return JsonResponse({
+                'success': False,
+                'error': f"Answers must be submitted in order starting at question {position + 1}"
+            }, status=400)
+        
+        for question in questions:
+            if question.question_type in UPLOAD_QUESTION_TYPES:
+                return JsonResponse({
+                    'success': False,
+                    'error': f"Question {question.id} needs an upload and must be submitted on its own"
+                }, status=400)
+        
+        # Questions that already have an answer keep it; the rest of the page is still stored
+        answered = set(QuizAnswer.objects.filter(
+            quiz_attempt=attempt, question_id__in=question_ids
+        ).values_list('question_id', flat=True))
+        
+        # Each question's time runs from when it was first shown, as in take_quiz
+        state = get_attempt_state(attempt)
+        started = start_questions(state, range(position, position + len(questions)))
+        now = timezone.now()
+        answers = []
+        selections = []
+        
+        for question, item, started_at in zip(questions, submitted, started):
+            if question.id in answered:
+                continue
+            time_taken = max(0, int(now.timestamp() - started_at))
+            
+            if time_taken > question.time_limit + ANSWER_DEADLINE_GRACE:
+                # Time ran out for this question, record it blank as the per-question timer does
+                answer, selected_choice_ids = QuizAnswer(question=question), []
+            else:
+                answer, selected_choice_ids = grade_answer(snapshot, question, item)
+            
+            answer.time_taken = min(time_taken, question.time_limit)
+            answer.quiz_attempt = attempt
+            answer.answered_at = now
+            answers.append(answer)
+            selections.append(selected_choice_ids)
+        
+        if answers:
+            answers[0].submission_token = submission_token
+            QuizAnswer.objects.bulk_create(answers)
+            add_to_attempt_totals(
+                attempt.id,
+                sum(answer.points_earned for answer in answers),
+                len(answers),
+                sum(1 for answer in answers if answer.is_correct)
+            )
+            add_answers_to_question_stats(attempt.quiz_id, answers)
+            
+            SelectedChoice = QuizAnswer.selected_choices.through
+            SelectedChoice.objects.bulk_create([
+                SelectedChoice(quizanswer_id=answer.id, choice_id=choice_id)
+                for answer, selected_choice_ids in zip(answers, selections)
+                for choice_id in selected_choice_ids
+            ])
+        
+        next_question = position + len(questions) + 1
+        # Adaptive tests are finished by take_quiz once it decides there's nothing more to ask
+        completed = next_question > len(attempt_questions) and not (
+            attempt.quiz.is_adaptive and attempt.quiz.is_placement_test
+        )
+        
+        if completed:
+            attempt.end_time = now
+            attempt.completed = True
+            attempt.status = 'completed'
+            attempt.score = attempt.calculate_score()
+            attempt.result = attempt.determine_result()
+            attempt.save()
+    
+    if completed:
+        redirect_url = reverse('quiz_results', args=[attempt.id])
+    elif next_question > len(attempt_questions):
+        redirect_url = f"{reverse('take_quiz', args=[attempt.id])}?question={next_question}"
+    else:
+        redirect_url = reverse('take_quiz_paged', args=[attempt.id])
+    
+    # Remember where the page led, so a retry of it is sent to the same place
+    if submission_token:
+        set_submission_outcome(attempt.id, submission_token, redirect_url)
+    
+    return JsonResponse({
+        'success': True,
+        'saved': len(answers),
+        'next_question': next_question,
+        'completed': completed,
+        'redirect_url': redirect_url
+    })
+
+def build_results_payload(attempt):
+    """Work out the statistics shown on the results page of a finished attempt"""
+    # Statistics for the results page come from the attempt's running totals
+    total_questions = attempt.answered_count
+    correct_answers = attempt.correct_count
+    
+    if total_questions > 0:
+        accuracy_percentage = int((correct_answers / total_questions) * 100)
+    else:
+        accuracy_percentage = 0
+    
+    # For placement tests, show the detailed score breakdown
+    beginner_percentage = 0
+    intermediate_percentage = 0
+    advanced_percentage = 0
+    
+    if attempt.quiz.is_placement_test:
+        # Calculate percentages for each level
+        # This is a simplistic calculation and might need to be adjusted
+        # based on your specific requirements
+        if accuracy_percentage < 40:
+            beginner_percentage = 100
+        elif accuracy_percentage < 75:
+            beginner_percentage = 100
+            intermediate_percentage = accuracy_percentage
+        else:
+            beginner_percentage = 100
+            intermediate_percentage = 100
+            advanced_percentage = (accuracy_percentage - 75) * 4  # Scale to 100
+    
+    return {
+        'total_questions': total_questions,
+        'correct_answers': correct_answers,
+        'accuracy_percentage': accuracy_percentage,
+        'beginner_percentage': beginner_percentage,
+        'intermediate_percentage': intermediate_percentage,
+        'advanced_percentage': advanced_percentage,
+        'points_earned': attempt.points_earned,
+        'total_possible': attempt.max_points or attempt.quiz.get_total_points(),
+    }
+
 @login_required
 def quiz_results(request, attempt_id):
     """View to show quiz results after completion"""
@@ -830,20 +1159,20 @@ def quiz_results(request, attempt_id):
         
         if is_teacher_admin:
             # Teachers and admins can view any attempt
-            attempt = get_object_or_404(QuizAttempt, id=attempt_id)
+            attempt = get_object_or_404(QuizAttempt.objects.select_related('quiz__course'), id=attempt_id)
             
             # Check if teacher is assigned to the student who made this attempt
             if request.user.user_type == 'teacher' and not request.user.is_staff:
-                student_ids = StudentProfile.objects.filter(
-                    assigned_teacher=request.user
-                ).values_list('user_id', flat=True)
+                is_assigned = StudentProfile.objects.filter(
+                    assigned_teacher=request.user, user_id=attempt.student_id
+                ).exists()
                 
-                if attempt.student.id not in student_ids:
+                if not is_assigned:
                     messages.error(request, "You don't have permission to view this student's quiz results.")
                     return redirect('quiz_list')
         else:
             # Regular students can only view their own attempts
-            attempt = get_object_or_404(QuizAttempt, id=attempt_id, student=request.user)
+            attempt = get_object_or_404(QuizAttempt.objects.select_related('quiz__course'), id=attempt_id, student=request.user)
         
         if not attempt:
             messages.error(request, "Quiz attempt not found.")
@@ -859,73 +1188,49 @@ def quiz_results(request, attempt_id):
             return redirect('take_quiz', attempt_id=attempt.id)
         
         # Ensure both status and completed flags are set correctly
-        if is_completed and (attempt.status != 'completed' or not attempt.completed):
+        if is_completed and (attempt.status == 'in_progress' or not attempt.completed):
             attempt.status = 'completed'
             attempt.completed = True
             attempt.save()
             logger.debug("Updated attempt status to completed")
         
-        # Get all answers for this attempt
-        answers = attempt.get_answers()
-        logger.debug(f"Found {answers.count()} answers for attempt")
+        # Placement results set the student's level; one UPDATE that only writes when it changed
+        if quiz.is_placement_test and is_completed and request.user == attempt.student:
+            updated = StudentProfile.objects.filter(user=request.user).exclude(
+                proficiency_level=attempt.result
+            ).update(proficiency_level=attempt.result)
+            if updated:
+                logger.debug(f"Updated student proficiency level to: {attempt.result}")
         
-        # Calculate statistics for the results page
-        total_questions = answers.count()
-        correct_answers = answers.filter(is_correct=True).count()
+        # Teachers can look at attempts still in progress, whose totals change with every answer
+        if not is_completed:
+            return render(request, 'quizzes/quiz_results.html', {
+                'attempt': attempt,
+                'quiz': quiz,
+                'answers': attempt.get_answers(),
+                **build_results_payload(attempt),
+                'is_placement_test': quiz.is_placement_test,
+                'is_teacher_view': is_teacher_admin
+            })
         
-        # Calculate points
-        points_earned = answers.aggregate(total=Sum('points_earned'))['total'] or 0
-        total_possible = quiz.get_total_points()
+        # Finished attempts only change when they're graded, so the browser's copy is usually current
+        viewer = 'teacher' if is_teacher_admin else 'student'
+        etag, last_modified = get_results_validators('results', attempt, viewer)
+        not_modified = get_not_modified_response(request, etag, last_modified)
+        if not_modified:
+            return not_modified
         
-        if total_questions > 0:
-            accuracy_percentage = int((correct_answers / total_questions) * 100)
-        else:
-            accuracy_percentage = 0
+        results = get_attempt_results('results', attempt, lambda: build_results_payload(attempt))
         
-        # For placement tests, show the detailed score breakdown
-        beginner_percentage = 0
-        intermediate_percentage = 0
-        advanced_percentage = 0
-        
-        if quiz.is_placement_test:
-            try:
-                # Calculate percentages for each level
-                # This is a simplistic calculation and might need to be adjusted
-                # based on your specific requirements
-                if accuracy_percentage < 40:
-                    beginner_percentage = 100
-                elif accuracy_percentage < 75:
-                    beginner_percentage = 100
-                    intermediate_percentage = accuracy_percentage
-                else:
-                    beginner_percentage = 100
-                    intermediate_percentage = 100
-                    advanced_percentage = (accuracy_percentage - 75) * 4  # Scale to 100
-                    
-                # Update the student's proficiency level in their profile
-                if is_completed and request.user == attempt.student:
-                    student_profile = StudentProfile.objects.get(user=request.user)
-                    student_profile.proficiency_level = attempt.result  # The result is already 'beginner', 'intermediate', or 'advanced'
-                    student_profile.save()
-                    logger.debug(f"Updated student proficiency level to: {attempt.result}")
-            except Exception as e:
-                logger.error(f"Error calculating level percentages or updating profile: {str(e)}")
-        
-        return render(request, 'quizzes/quiz_results.html', {
+        response = render(request, 'quizzes/quiz_results.html', {
             'attempt': attempt,
             'quiz': quiz,
-            'answers': answers,
-            'total_questions': total_questions,
-            'correct_answers': correct_answers,
-            'accuracy_percentage': accuracy_percentage,
-            'beginner_percentage': beginner_percentage,
-            'intermediate_percentage': intermediate_percentage,
-            'advanced_percentage': advanced_percentage,
-            'points_earned': points_earned,
-            'total_possible': total_possible,
+            'answers': attempt.get_answers(),
+            **results,
             'is_placement_test': quiz.is_placement_test,
             'is_teacher_view': is_teacher_admin
         })
+        return add_results_headers(response, etag, last_modified)
     except Exception as e:
         logger.error(f"Error in quiz_results: {str(e)}", exc_info=True)
         messages.error(request, f"There was an error loading your quiz results: {str(e)}")
@@ -956,7 +1261,9 @@ def quiz_results(request, attempt_id):
 @login_required
 def quiz_review(request, attempt_id):
     """View to review a completed quiz with answers"""
-    attempt = get_object_or_404(QuizAttempt, id=attempt_id, student=request.user)
+    attempt = get_object_or_404(
+        QuizAttempt.objects.select_related('quiz'), id=attempt_id, student=request.user
+    )
     quiz = attempt.quiz
     
     # Only allow reviewing completed quizzes
@@ -965,109 +1272,158 @@ def quiz_review(request, attempt_id):
         messages.error(request, "You can only review completed quizzes.")
         return redirect('student_quiz_list')
     
+    # Graded answers only change when the attempt is graded again
+    etag, last_modified = get_results_validators('review', attempt, 'student')
+    not_modified = get_not_modified_response(request, etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    question_answers = get_attempt_results('review', attempt, lambda: build_review_payload(attempt))
+    
+    response = render(request, 'quizzes/quiz_review.html', {
+        'attempt': attempt,
+        'quiz': quiz,
+        'question_answers': question_answers
+    })
+    return add_results_headers(response, etag, last_modified)
+
+def build_review_payload(attempt):
+    """Pair every question of the attempt's quiz with the student's answer to it"""
     # Get all answers for this attempt
     answers = attempt.get_answers().select_related(
-        'question', 'selected_choice', 'quiz_question', 'file_answer', 'voice_answer'
+        'question', 'selected_choice', 'file_answer', 'voice_answer'
     ).prefetch_related('selected_choices')
     
-    # Get all questions for this quiz
-    questions = get_quiz_questions(quiz)
+    # Get the questions this attempt asked from the cached snapshot
+    questions = get_quiz_snapshot(attempt.quiz).questions_for(attempt)
     
     # Create a dictionary of answers keyed by question id
-    answer_dict = {}
-    for answer in answers:
-        question_id = answer.question_id if answer.question_id else (
-            answer.quiz_question.question_id if answer.quiz_question else None
-        )
-        if question_id:
-            answer_dict[question_id] = answer
+    answer_dict = {answer.question_id: answer for answer in answers}
     
     # Build a list of questions with their answers directly attached
-    question_answers = []
-    for question in questions:
-        question_answers.append({
-            'question': question,
-            'answer': answer_dict.get(question.id)
-        })
-    
-    return render(request, 'quizzes/quiz_review.html', {
-        'attempt': attempt,
-        'quiz': quiz,
-        'question_answers': question_answers
-    })
+    return [
+        {'question': question, 'answer': answer_dict.get(question.id)}
+        for question in questions
+    ]
 
 # AJAX Endpoints
 @login_required
 @user_passes_test(is_teacher_or_admin)
 def update_question_order(request):
-    """AJAX endpoint to update question order"""
+    """
+    AJAX endpoint to update question order.
+    The whole new order is written in one UPDATE, and only for questions that belong to the quiz.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            question_ids = data.get('question_ids', [])
+            question_ids = [int(question_id) for question_id in data.get('question_ids', [])]
+            quiz = Quiz.objects.filter(id=data.get('quiz_id')).first()
+            if quiz is None:
+                return JsonResponse({'success': False, 'error': 'Quiz not found'}, status=404)
+            
+            if len(set(question_ids)) != len(question_ids):
+                return JsonResponse({'success': False, 'error': 'Each question can only appear once'}, status=400)
+            
+            quiz_questions = QuizQuestion.objects.filter(quiz=quiz, question_id__in=question_ids)
             
             with transaction.atomic():
-                for index, question_id in enumerate(question_ids):
-                    question = Question.objects.get(id=question_id)
-                    question.order = index
-                    question.save(update_fields=['order'])
-                    
-                    # Update QuizQuestion order if it exists
-                    quiz_question = QuizQuestion.objects.filter(question_id=question_id).first()
-                    if quiz_question:
-                        quiz_question.order = index
-                        quiz_question.save(update_fields=['order'])
+                updated = quiz_questions.update(order=Case(
+                    *[When(question_id=question_id, then=Value(index)) for index, question_id in enumerate(question_ids)],
+                    default=F('order'),
+                    output_field=IntegerField()
+                )) if question_ids else 0
+                
+                if updated != len(question_ids):
+                    # Some of the IDs aren't in this quiz; undo the partial reorder
+                    transaction.set_rollback(True)
+                    return JsonResponse({'success': False, 'error': 'Some questions do not belong to this quiz'}, status=400)
+                
+                invalidate_quiz_snapshot(quiz)
                         
             return JsonResponse({'success': True})
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'Invalid request data'}, status=400)
         except Exception as e:
             logger.error(f"Error updating question order: {str(e)}")
             return JsonResponse({'success': False, 'error': str(e)})
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+@login_required
+def upload_voice_recording(request, attempt_id):
+    """
+    AJAX endpoint for uploading a voice recording in binary chunks.
+    GET returns how many bytes have been received so the client can resume after a dropped connection;
+    POST appends the request body at the Upload-Offset header, and with Upload-Complete stores the answer.
+    """
+    attempt = get_object_or_404(
+        QuizAttempt.objects.select_related('quiz'), id=attempt_id, student=request.user
+    )
+    if attempt.completed or attempt.status == 'completed':
+        return JsonResponse({'success': False, 'error': 'Quiz already completed'}, status=400)
+    
+    # Recordings can only be uploaded for the question the student is on
+    questions = get_quiz_snapshot(attempt.quiz).questions_for(attempt)
+    state = get_attempt_state(attempt)
+    position = get_attempt_position(attempt, questions)
+    if position >= len(questions):
+        return JsonResponse({'success': False, 'error': 'All questions have been answered'}, status=400)
+    question = questions[position]
+    if question.question_type != 'voice_record' or str(question.id) != request.GET.get('question_id'):
+        return JsonResponse({'success': False, 'error': 'This question does not take a voice recording'}, status=400)
+    
+    if request.method == 'GET':
+        return JsonResponse({'success': True, 'offset': get_upload_offset(attempt.id, question.id)})
+    
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    
+    try:
+        offset = int(request.headers.get('Upload-Offset', 0))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid Upload-Offset'}, status=400)
+    
+    try:
+        # Read the body straight from the request stream rather than through request.body
+        offset = append_upload_chunk(attempt.id, question.id, request, offset)
+    except UploadOffsetMismatch as e:
+        return JsonResponse({'success': False, 'error': 'Offset mismatch', 'offset': e.offset}, status=409)
+    except UploadTooLarge:
+        return JsonResponse({'success': False, 'error': 'Recording is too large'}, status=413)
+    
+    if not request.headers.get('Upload-Complete'):
+        return JsonResponse({'success': True, 'offset': offset})
+    
+    # Time taken is measured from when take_quiz first showed the question
+    start_time = start_question(state, position)
+    time_taken = min(max(int(timezone.now().timestamp() - start_time), 0), question.time_limit)
+    try:
+        duration = int(request.headers.get('Upload-Duration', 0))
+    except ValueError:
+        duration = 0
+    
+    finish_voice_upload(attempt, question, request.user, duration, time_taken)
+    return JsonResponse({
+        'success': True,
+        'offset': offset,
+        'completed': True,
+        'next_url': f"{reverse('take_quiz', args=[attempt.id])}?question={position + 2}"
+    })
+
+def get_timer_response(request, attempt_id):
+    """Helper function to answer a timer resync from the cached timer state"""
+    timer = get_attempt_timer(attempt_id)
+    if not timer or timer['student_id'] != request.user.id:
+        return JsonResponse({'success': False, 'error': 'Quiz attempt not found'})
+    return JsonResponse(get_timer_status(timer, attempt_id))
+
 @login_required
 def update_timer(request, attempt_id):
-    """AJAX endpoint to update timer for a quiz attempt"""
+    """AJAX endpoint to resync the timer for a quiz attempt"""
+    # The deadline is stored on the attempt, so there's nothing for the client to save
     if request.method == 'POST':
-        try:
-            # Get the attempt using both field patterns
-            attempt = get_quiz_attempt(attempt_id, request.user)
-            if not attempt:
-                return JsonResponse({'success': False, 'error': 'Quiz attempt not found'})
-                
-            # Only update if not completed
-            is_completed = attempt.completed or attempt.status == 'completed'
-            if is_completed:
-                return JsonResponse({'success': False, 'error': 'Quiz already completed'})
-                
-            # Check for time limit
-            if attempt.quiz.time_limit:
-                elapsed_time = timezone.now() - attempt.start_time
-                total_seconds = attempt.quiz.time_limit * 60  # Convert minutes to seconds
-                remaining_seconds = total_seconds - elapsed_time.total_seconds()
-                
-                if remaining_seconds <= 0:
-                    # Time's up
-                    attempt.status = 'timed_out'
-                    attempt.completed = True
-                    attempt.end_time = timezone.now()
-                    attempt.save()
-                    
-                    return JsonResponse({
-                        'success': True, 
-                        'timed_out': True,
-                        'redirect_url': reverse('quiz_results', args=[attempt.id])
-                    })
-                
-                return JsonResponse({
-                    'success': True,
-                    'remaining_seconds': int(remaining_seconds)
-                })
-            
-            return JsonResponse({'success': True})
-        except Exception as e:
-            logger.error(f"Error updating timer: {str(e)}")
-            return JsonResponse({'success': False, 'error': str(e)})
+        return get_timer_response(request, attempt_id)
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
@@ -1075,48 +1431,46 @@ def update_timer(request, attempt_id):
 def get_timer(request, attempt_id):
     """AJAX endpoint to get timer for a quiz attempt"""
     if request.method == 'GET':
-        try:
-            # Get the attempt using both field patterns
-            attempt = get_quiz_attempt(attempt_id, request.user)
-            if not attempt:
-                return JsonResponse({'success': False, 'error': 'Quiz attempt not found'})
-                
-            # Only update if not completed
-            is_completed = attempt.completed or attempt.status == 'completed'
-            if is_completed:
-                return JsonResponse({'success': False, 'error': 'Quiz already completed'})
-                
-            # Check for time limit
-            if attempt.quiz.time_limit:
-                elapsed_time = timezone.now() - attempt.start_time
-                total_seconds = attempt.quiz.time_limit * 60  # Convert minutes to seconds
-                remaining_seconds = total_seconds - elapsed_time.total_seconds()
-                
-                if remaining_seconds <= 0:
-                    # Time's up
-                    attempt.status = 'timed_out'
-                    attempt.completed = True
-                    attempt.end_time = timezone.now()
-                    attempt.save()
-                    
-                    return JsonResponse({
-                        'success': True, 
-                        'timed_out': True,
-                        'redirect_url': reverse('quiz_results', args=[attempt.id])
-                    })
-                
-                return JsonResponse({
-                    'success': True,
-                    'remaining_seconds': int(remaining_seconds)
-                })
-            
-            return JsonResponse({'success': True})
-        except Exception as e:
-            logger.error(f"Error getting timer: {str(e)}")
-            return JsonResponse({'success': False, 'error': str(e)})
+        return get_timer_response(request, attempt_id)
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+@login_required
+async def timer_stream(request, attempt_id):
+    """
+    Server-sent events stream of the time remaining on a quiz attempt.
+    Sends a resync every TIMER_STREAM_INTERVAL seconds and a timeout event at the deadline.
+    Only useful behind an ASGI server; under WSGI the response is buffered, so the quiz
+    pages poll get_timer instead.
+    """
+    user = await request.auser()
+    timer = await sync_to_async(get_attempt_timer)(attempt_id)
+    if not timer or timer['student_id'] != user.id:
+        return JsonResponse({'success': False, 'error': 'Quiz attempt not found'}, status=404)
+    
+    async def events():
+        while True:
+            # Re-read each time so the stream ends as soon as the attempt is finished
+            timer = await sync_to_async(get_attempt_timer)(attempt_id)
+            if timer is None:
+                return
+            status = get_timer_status(timer, attempt_id)
+            if status.get('timed_out'):
+                yield f"event: timeout\ndata: {json.dumps(status)}\n\n"
+                return
+            if 'remaining_seconds' not in status:
+                # Finished or untimed attempts have nothing to count down
+                yield f"event: end\ndata: {json.dumps(status)}\n\n"
+                return
+            
+            yield f"data: {json.dumps(status)}\n\n"
+            await asyncio.sleep(min(TIMER_STREAM_INTERVAL, status['remaining_seconds']))
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 @user_passes_test(is_teacher_or_admin)
 def grade_submissions(request, quiz_id):
@@ -1161,31 +1515,59 @@ def grade_submissions(request, quiz_id):
         Q(question__question_type__in=['short_answer', 'long_answer', 'file_upload', 'voice_record', 'star_rating'])
     ).select_related('quiz_attempt', 'question', 'quiz_attempt__student')
     
-    # Process grading form submission
+    # Process grading form submission, which carries grades for many answers at once
     if request.method == 'POST':
-        answer_id = request.POST.get('answer_id')
-        is_correct = request.POST.get('is_correct') == 'true'
-        points = int(request.POST.get('points', 0))
+        answer_ids = request.POST.getlist('answer_id')
         
-        if answer_id:
-            answer = QuizAnswer.objects.get(id=answer_id)
-            answer.is_correct = is_correct
-            answer.points_earned = points if is_correct else 0
-            answer.save()
+        # Every graded answer is checked against one prefetched set of the answers this user may grade
+        gradable = {
+            str(answer.id): answer
+            for answer in answers_needing_grading.filter(id__in=[i for i in answer_ids if i.isdigit()])
+        }
+        
+        grades = []
+        errors = []
+        for answer_id in answer_ids:
+            answer = gradable.get(answer_id)
+            if not answer:
+                errors.append(f"Answer {answer_id} can't be graded here.")
+                continue
             
-            # Recalculate attempt score
-            attempt = answer.quiz_attempt
-            attempt.score = attempt.calculate_score()
-            attempt.save()
+            is_correct = request.POST.get(f'is_correct_{answer_id}') == 'true'
+            try:
+                points = int(request.POST.get(f'points_{answer_id}', 0))
+            except ValueError:
+                points = -1
+            if not 0 <= points <= answer.question.points:
+                errors.append(f"Points for \"{answer.question.text[:30]}\" must be between 0 and {answer.question.points}.")
+                continue
+            points = points if is_correct else 0
+            feedback = request.POST.get(f'feedback_{answer_id}', '').strip()
             
-            messages.success(request, "Answer graded successfully.")
+            if (is_correct, points, feedback) == (answer.is_correct, answer.points_earned, answer.feedback or ''):
+                continue
             
-            # Check if there are more answers to grade
-            if answers_needing_grading.filter(~Q(id=answer_id)).exists():
-                return redirect('grade_submissions', quiz_id=quiz_id)
-            else:
-                messages.success(request, "All submissions for this quiz have been graded!")
-                return redirect('teacher_dashboard')
+            grades.append((answer, quiz.id, answer.question.points, answer.points_earned, answer.is_correct))
+            answer.is_correct = is_correct
+            answer.points_earned = points
+            answer.feedback = feedback
+        
+        if errors:
+            # Nothing is saved unless the whole batch is valid
+            for error in errors:
+                messages.error(request, error)
+            return redirect('grade_submissions', quiz_id=quiz_id)
+        
+        # Writes the answers and re-scores their attempts in one transaction
+        save_grades(grades, ['is_correct', 'points_earned', 'feedback'])
+        messages.success(request, f"Saved grades for {len(grades)} answer{'s' if len(grades) != 1 else ''}.")
+        
+        # Check if there are more answers to grade
+        if answers_needing_grading.exclude(id__in=gradable.keys()).exists():
+            return redirect('grade_submissions', quiz_id=quiz_id)
+        else:
+            messages.success(request, "All submissions for this quiz have been graded!")
+            return redirect('teacher_dashboard')
     
     # Group answers by attempt and student for the template
     grouped_answers = {}